@@ -0,0 +1,111 @@
+"""In-process cache tier used in front of redis by `pccommon.redis.cached_result`."""
+
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from cachetools import TTLCache
+from pydantic import BaseModel, Field
+
+
+class LocalCacheConfig(BaseModel):
+    """Limits for locally cached entries whose key starts with a given prefix.
+
+    Attributes
+    ----------
+    maxsize:
+        The maximum number of entries held for the prefix.
+    ttl:
+        Seconds an entry is served from memory before falling back to redis.
+    """
+
+    maxsize: int = Field(default=128, ge=1)
+    ttl: int = Field(default=60, ge=1)
+
+
+class LocalCache:
+    """A bounded, per-process LRU/TTL cache keyed by redis cache key.
+
+    Only keys that match one of the configured prefixes are cached; when
+    several prefixes match, the longest one wins. Values are stored in their
+    serialized form, exactly as they are stored in redis, so callers get an
+    independent copy on every read.
+
+    Keys are indexed by the tags they were set with, so that
+    `invalidate_tags` drops them whatever redis still holds.
+    """
+
+    def __init__(self, prefixes: Dict[str, LocalCacheConfig]) -> None:
+        self._caches: List[Tuple[str, TTLCache]] = [
+            (prefix, TTLCache(maxsize=config.maxsize, ttl=config.ttl))
+            for prefix, config in sorted(
+                prefixes.items(), key=lambda p: len(p[0]), reverse=True
+            )
+        ]
+        self._tagged: Dict[str, Set[str]] = {}
+        self._tagged_count = 0
+        self._max_tagged = 4 * sum(cache.maxsize for _, cache in self._caches)
+        self._lock = Lock()
+
+    def _cache_for(self, key: str) -> Optional[TTLCache]:
+        for prefix, cache in self._caches:
+            if key.startswith(prefix):
+                return cache
+        return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        cache = self._cache_for(key)
+        if cache is None:
+            return None
+        with self._lock:
+            return cache.get(key)
+
+    def set(self, key: str, value: bytes, tags: Sequence[str] = ()) -> None:
+        cache = self._cache_for(key)
+        if cache is None:
+            return
+        with self._lock:
+            cache[key] = value
+            for tag in tags:
+                keys = self._tagged.setdefault(tag, set())
+                if key not in keys:
+                    keys.add(key)
+                    self._tagged_count += 1
+            if self._tagged_count > self._max_tagged:
+                self._prune_tagged()
+
+    def delete(self, key: str) -> None:
+        cache = self._cache_for(key)
+        if cache is None:
+            return
+        with self._lock:
+            cache.pop(key, None)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """Delete the keys set with any of `tags`."""
+        with self._lock:
+            for tag in tags:
+                keys = self._tagged.pop(tag, set())
+                self._tagged_count -= len(keys)
+                for key in keys:
+                    cache = self._cache_for(key)
+                    if cache is not None:
+                        cache.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, cache in self._caches:
+                cache.clear()
+            self._tagged.clear()
+            self._tagged_count = 0
+
+    def _prune_tagged(self) -> None:
+        # Drop the evicted and expired keys from the tag index
+        for tag, keys in list(self._tagged.items()):
+            live = {key for key in keys if key in (self._cache_for(key) or ())}
+            if live:
+                self._tagged[tag] = live
+            else:
+                del self._tagged[tag]
+        self._tagged_count = sum(len(keys) for keys in self._tagged.values())
+        # Keys with many tags may fill the index with live entries
+        self._max_tagged = max(self._max_tagged, 2 * self._tagged_count)
@@ -1,23 +1,99 @@
-import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from pccommon.config.core import PCAPIsConfig
+from pccommon.constants import BLOB_HOST_SUFFIX, CDN_HOST_SUFFIX
 
-BLOB_REGEX = re.compile(r".*/([^/]+?)\.blob\.core\.windows\.net/([^/]+?).*")
+
+def split_blob_href(href: str) -> Optional[Tuple[int, int, str, str]]:
+    """Parse an href of the form `{scheme}://{account}.blob.core.windows.net/{container}/...`.
+
+    Returns the start and end index of the host, the storage account and the
+    container, or None if the href isn't for blob storage.
+    """
+    host_start = href.find("://") + 3
+    if host_start < 3:
+        return None
+    host_end = href.find("/", host_start)
+    if host_end < 0 or not href.endswith(BLOB_HOST_SUFFIX, host_start, host_end):
+        return None
+    container_end = href.find("/", host_end + 1)
+    if container_end < 0:
+        container_end = len(href)
+    storage_account = href[host_start : host_end - len(BLOB_HOST_SUFFIX)]
+    container = href[host_end + 1 : container_end]
+    return host_start, host_end, storage_account, container
+
+
+CdnHostLookup = Callable[[str, str], Optional[str]]
 
 
 class BlobCDN:
     @staticmethod
-    def transform_if_available(asset_href: str) -> str:
-        m = re.match(BLOB_REGEX, asset_href)
-        if m:
-            storage_account = m.group(1)
-            container = m.group(2)
-            config = (
-                PCAPIsConfig.from_environment()
-                .get_container_config_table()
-                .get_config(storage_account, container)
-            )
+    def cdn_host_lookup() -> CdnHostLookup:
+        """Return a function of a storage account and container that returns
+        the container's CDN host, or None if it isn't served from a CDN."""
+        settings = PCAPIsConfig.from_environment()
+        index = settings.get_container_cdn_index()
+        if index.loaded:
+            return index.get_cdn_host
+
+        # Read from the table until the index is loaded
+        table = settings.get_container_config_table()
+
+        def _get_cdn_host(storage_account: str, container: str) -> Optional[str]:
+            config = table.get_config(storage_account, container)
             if config and config.has_cdn:
-                asset_href = asset_href.replace("blob.core.windows", "azureedge")
+                return f"{storage_account}{CDN_HOST_SUFFIX}"
+            return None
+
+        return _get_cdn_host
 
-        return asset_href
+    @staticmethod
+    def _transform(asset_href: str, get_cdn_host: CdnHostLookup) -> str:
+        parts = split_blob_href(asset_href)
+        if not parts:
+            return asset_href
+        host_start, host_end, storage_account, container = parts
+        cdn_host = get_cdn_host(storage_account, container)
+        if not cdn_host:
+            return asset_href
+        return f"{asset_href[:host_start]}{cdn_host}{asset_href[host_end:]}"
+
+    @staticmethod
+    def transform_if_available(
+        asset_href: str, get_cdn_host: Optional[CdnHostLookup] = None
+    ) -> str:
+        """Rewrite an href to the CDN, if its container is served from one.
+        CDN hosts are looked up with `get_cdn_host` if given, e.g. to memoize
+        them, and with `cdn_host_lookup()` otherwise."""
+        return BlobCDN._transform(asset_href, get_cdn_host or BlobCDN.cdn_host_lookup())
+
+    @staticmethod
+    def transform_all_if_available(
+        asset_hrefs: Iterable[str], get_cdn_host: Optional[CdnHostLookup] = None
+    ) -> List[str]:
+        """Rewrite many hrefs, e.g. all assets of an item, with one index lookup."""
+        get_cdn_host = get_cdn_host or BlobCDN.cdn_host_lookup()
+        return [BlobCDN._transform(href, get_cdn_host) for href in asset_hrefs]
+
+    @staticmethod
+    def transform_items(
+        items: Iterable[Dict[str, Any]], get_cdn_host: Optional[CdnHostLookup] = None
+    ) -> List[Dict[str, Any]]:
+        """Return copies of STAC item dicts, e.g. the items of a mosaic tile,
+        with the hrefs of all their assets rewritten to the CDN if available.
+        The original items are not modified."""
+        get_cdn_host = get_cdn_host or BlobCDN.cdn_host_lookup()
+        return [
+            {
+                **item,
+                "assets": {
+                    key: {
+                        **asset,
+                        "href": BlobCDN._transform(asset["href"], get_cdn_host),
+                    }
+                    for key, asset in item.get("assets", {}).items()
+                },
+            }
+            for item in items
+        ]
@@ -63,9 +63,7 @@ def dump(account: str, table: str, type: str, **kwargs: Any) -> int:
             assert col_config
             result[id] = col_config.model_dump()
         else:
-            for _, collection_id, col_config in col_config_table.get_all():
-                assert collection_id
-                assert col_config
+            for collection_id, col_config in col_config_table.get_all().items():
                 result[collection_id] = col_config.model_dump()
 
     elif type == "container":
@@ -79,9 +77,9 @@ def dump(account: str, table: str, type: str, **kwargs: Any) -> int:
             assert con_config
             result[f"{con_account}/{id}"] = con_config.model_dump()
         else:
-            for storage_account, container, con_config in con_config_table.get_all():
-                assert con_config
-                result[f"{storage_account}/{container}"] = con_config.model_dump()
+            # get_all reads the default partition, which has no storage account
+            for container, con_config in con_config_table.get_all().items():
+                result[f"/{container}"] = con_config.model_dump()
     else:
         print(f"Unknown type: {type}")
         return 1
@@ -201,9 +199,13 @@ def parse_args(args: List[str]) -> Optional[Dict[str, Any]]:
         formatter_class=dhf,
     )
     parser.add_argument(
-        "--file", help="File that lists IPs, one per line", default=None
+        "--file",
+        help="File that lists IPs or CIDR ranges, one per line",
+        default=None,
+    )
+    parser.add_argument(
+        "--ip", help="IP or CIDR range to add as an exception", default=None
     )
-    parser.add_argument("--ip", help="IP to add as an exception", default=None)
     add_common_opts(parser, DEFAULT_IP_EXCEPTION_CONFIG_TABLE_NAME)
 
     parsed_args = {
@@ -9,7 +9,54 @@ def get_apis_config() -> PCAPIsConfig:
     return PCAPIsConfig.from_environment()
 
 
+def start_collection_config_registry() -> None:
+    """Load collection configs into memory, so that lookups in the request
+    path don't read from the table. Called at app startup."""
+    get_apis_config().get_collection_config_registry().start()
+
+
+def stop_collection_config_registry() -> None:
+    get_apis_config().get_collection_config_registry().stop()
+
+
+def start_container_cdn_index() -> None:
+    """Load the containers served through the CDN into memory, so that asset
+    hrefs are rewritten without reading the table. Called at app startup."""
+    get_apis_config().get_container_cdn_index().start()
+
+
+def stop_container_cdn_index() -> None:
+    get_apis_config().get_container_cdn_index().stop()
+
+
+def start_ip_filters() -> None:
+    """Load the IP exception and ban lists into memory, so that they are
+    matched without reading the tables. Called at app startup."""
+    config = get_apis_config()
+    config.get_ip_exception_matcher().start()
+    banned_ips = config.get_banned_ip_matcher()
+    if banned_ips:
+        banned_ips.start()
+
+
+def stop_ip_filters() -> None:
+    config = get_apis_config()
+    config.get_ip_exception_matcher().stop()
+    banned_ips = config.get_banned_ip_matcher()
+    if banned_ips:
+        banned_ips.stop()
+
+
+async def close_table_clients() -> None:
+    """Close the table clients held open for async lookups. Called at app
+    shutdown."""
+    await get_apis_config().get_async_ip_exception_list_table().close()
+
+
 def get_collection_config(collection_id: str) -> Optional[CollectionConfig]:
+    registry = get_apis_config().get_collection_config_registry()
+    if registry.loaded:
+        return registry.get(collection_id)
     table = get_apis_config().get_collection_config_table()
     return table.get_config(collection_id)
 
@@ -19,10 +66,13 @@ def get_render_config(collection_id: str) -> Optional[DefaultRenderConfig]:
 
 
 def get_all_render_configs() -> Dict[str, DefaultRenderConfig]:
+    registry = get_apis_config().get_collection_config_registry()
+    if registry.loaded:
+        return {id: coll.render_config for id, coll in registry.get_all().items()}
     return {
         id: coll.render_config
         for id, coll in get_apis_config()
         .get_collection_config_table()
-        .get_all_configs()
-        if id is not None
+        .get_all()
+        .items()
     }
@@ -1,10 +1,11 @@
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 from humps import camelize
 from pydantic import BaseModel, Field
 
-from pccommon.tables import ModelTableService
+from pccommon.tables import ModelTableService, TableSnapshot
 from pccommon.utils import get_param_str
 
 
@@ -48,6 +49,55 @@ class VectorTileset(CamelModel):
     bounds: Optional[List[float]] = None
 
 
+class ReadTuning(CamelModel):
+    """
+    GDAL settings for reading the assets of a collection, overriding the
+    tiler's global GDAL environment. Unset fields keep the global settings.
+    GDAL's block cache (GDAL_CACHEMAX) is shared by the whole process, so it
+    can't be set per collection.
+
+    vsi_cache_size:
+        Bytes of each open file kept in GDAL's VSI cache; 0 disables the cache.
+    merge_consecutive_ranges:
+        Merge consecutive HTTP range requests into a single request.
+    http_multiplex:
+        Multiplex HTTP range requests over a single HTTP/2 connection.
+    chunk_size:
+        Minimum bytes requested by each HTTP range request.
+    ingested_bytes_at_open:
+        Bytes read when opening an asset without `file:header_size`.
+    overview_bias:
+        Read tiles from overviews this many levels coarser than the tile's
+        resolution, and upsample them, to read fewer bytes for datasets that
+        don't need full resolution.
+    """
+
+    vsi_cache_size: Optional[int] = Field(default=None, ge=0)
+    merge_consecutive_ranges: Optional[bool] = None
+    http_multiplex: Optional[bool] = None
+    chunk_size: Optional[int] = Field(default=None, ge=1024, le=10485760)
+    ingested_bytes_at_open: Optional[int] = Field(default=None, ge=0)
+    overview_bias: int = Field(default=0, ge=0, le=4)
+
+    def get_gdal_env(self) -> Dict[str, str]:
+        """Return the GDAL config options for the settings that are set."""
+        env: Dict[str, str] = {}
+        if self.vsi_cache_size is not None:
+            env["VSI_CACHE"] = "TRUE" if self.vsi_cache_size else "FALSE"
+            env["VSI_CACHE_SIZE"] = str(self.vsi_cache_size)
+        if self.merge_consecutive_ranges is not None:
+            env["GDAL_HTTP_MERGE_CONSECUTIVE_RANGES"] = (
+                "YES" if self.merge_consecutive_ranges else "NO"
+            )
+        if self.http_multiplex is not None:
+            env["GDAL_HTTP_MULTIPLEX"] = "YES" if self.http_multiplex else "NO"
+        if self.chunk_size is not None:
+            env["CPL_VSIL_CURL_CHUNK_SIZE"] = str(self.chunk_size)
+        if self.ingested_bytes_at_open is not None:
+            env["GDAL_INGESTED_BYTES_AT_OPEN"] = str(self.ingested_bytes_at_open)
+        return env
+
+
 class DefaultRenderConfig(BaseModel):
     """
     A class used to represent information convenient for accessing
@@ -64,6 +114,15 @@ class DefaultRenderConfig(BaseModel):
         collection. These are used to generate VT routes included as
         collection-level assets in the STAC metadata as well as resolve paths to
         the VT storage account and container to proxy actual pbf files.
+    tile_cache_ttl:
+        Seconds rendered item and mosaic tiles of this collection are cached by
+        the tiler. Uses the tiler's RASTER_TILE_CACHE_TTL if unset; 0 disables
+        caching for the collection.
+    max_concurrent_reads:
+        Maximum number of assets of this collection each tiler process reads
+        at once for mosaic tiles. Bounded only by the tiler's read pool if unset.
+    read_tuning:
+        GDAL settings the tiler reads this collection's assets with.
     """
 
     render_params: Dict[str, Any]
@@ -78,6 +137,9 @@ class DefaultRenderConfig(BaseModel):
     max_items_per_tile: Optional[int] = None
     vector_tilesets: Optional[List[VectorTileset]] = None
     hidden: bool = False  # Hide from API
+    tile_cache_ttl: Optional[int] = Field(default=None, ge=0)
+    max_concurrent_reads: Optional[int] = Field(default=None, ge=1)
+    read_tuning: Optional[ReadTuning] = None
 
     def get_full_render_qs(self, collection: str, item: Optional[str] = None) -> str:
         """
@@ -334,10 +396,37 @@ class CollectionConfigTable(ModelTableService[CollectionConfig]):
     _model = CollectionConfig
 
     def get_config(self, collection_id: str) -> Optional[CollectionConfig]:
-        return self.get("", collection_id)
+        # Collection configs are all read together, and looked up in memory
+        return self.get_all().get(collection_id)
 
     def set_config(self, collection_id: str, config: CollectionConfig) -> None:
         self.upsert("", collection_id, config)
 
-    def get_all_configs(self) -> List[Tuple[Optional[str], CollectionConfig]]:
-        return [(config[1], config[2]) for config in self.get_all()]
+    def get_all_configs(self) -> List[Tuple[str, CollectionConfig]]:
+        return list(self.get_all().items())
+
+
+class CollectionConfigRegistry(TableSnapshot[Mapping[str, CollectionConfig]]):
+    """An in-memory snapshot of the collection config table, refreshed in the
+    background. See `TableSnapshot`."""
+
+    name = "collection configs"
+
+    def __init__(self, table: CollectionConfigTable, refresh_seconds: int) -> None:
+        super().__init__(refresh_seconds)
+        self._table = table
+
+    def _read(self) -> Mapping[str, CollectionConfig]:
+        return MappingProxyType(
+            {
+                collection_id: config
+                for _, collection_id, config in self._table._query_all()
+                if collection_id is not None
+            }
+        )
+
+    def get(self, collection_id: str) -> Optional[CollectionConfig]:
+        return self._get_snapshot().get(collection_id)
+
+    def get_all(self) -> Mapping[str, CollectionConfig]:
+        return self._get_snapshot()
@@ -1,8 +1,10 @@
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 
 from pydantic import BaseModel
 
-from pccommon.tables import ModelTableService
+from pccommon.constants import CDN_HOST_SUFFIX
+from pccommon.tables import ModelTableService, TableSnapshot
 
 
 class ContainerConfig(BaseModel):
@@ -29,3 +31,29 @@ class ContainerConfigTable(ModelTableService[ContainerConfig]):
         self, storage_account: str, container: str, config: ContainerConfig
     ) -> None:
         self.upsert(storage_account, container, config)
+
+
+class ContainerCdnIndex(TableSnapshot[Mapping[Tuple[str, str], str]]):
+    """The CDN host for each storage account and container served through the
+    CDN, read from the container config table and refreshed in the background.
+    See `TableSnapshot`."""
+
+    name = "container configs"
+
+    def __init__(self, table: ContainerConfigTable, refresh_seconds: int) -> None:
+        super().__init__(refresh_seconds)
+        self._table = table
+
+    def _read(self) -> Mapping[Tuple[str, str], str]:
+        return MappingProxyType(
+            {
+                (storage_account, container): f"{storage_account}{CDN_HOST_SUFFIX}"
+                for storage_account, container, config in self._table._query_all(
+                    partition_key=None
+                )
+                if storage_account and container and config.has_cdn
+            }
+        )
+
+    def get_cdn_host(self, storage_account: str, container: str) -> Optional[str]:
+        return self._get_snapshot().get((storage_account, container))
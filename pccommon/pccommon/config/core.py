@@ -1,5 +1,5 @@
 import logging
-from typing import Optional
+from typing import Dict, Optional
 
 from cachetools import Cache, LRUCache, cachedmethod
 from cachetools.func import lru_cache
@@ -7,10 +7,20 @@ from cachetools.keys import hashkey
 from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from pydantic_settings import BaseSettings
 
-from pccommon.config.collections import CollectionConfigTable
-from pccommon.config.containers import ContainerConfigTable
+from pccommon.cache import LocalCache, LocalCacheConfig
+from pccommon.config.collections import (
+    CollectionConfigRegistry,
+    CollectionConfigTable,
+)
+from pccommon.config.containers import ContainerCdnIndex, ContainerConfigTable
 from pccommon.constants import DEFAULT_TTL
-from pccommon.tables import IPExceptionListTable
+from pccommon.ipfilter import IPMatcherSnapshot
+from pccommon.ratelimit import LocalRateLimiter
+from pccommon.tables import (
+    AsyncIPExceptionListTable,
+    BannedIPTable,
+    IPExceptionListTable,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +46,7 @@ class TableConfig(BaseModel):
 
 
 class PCAPIsConfig(BaseSettings):
-    _cache: Cache = PrivateAttr(default_factory=lambda: LRUCache(maxsize=10))
+    _cache: Cache = PrivateAttr(default_factory=lambda: LRUCache(maxsize=32))
 
     app_insights_instrumentation_key: Optional[str] = Field(  # type: ignore
         default=None,
@@ -46,6 +56,10 @@ class PCAPIsConfig(BaseSettings):
     container_config: TableConfig
     ip_exception_config: TableConfig
 
+    # The table of IPs banned by the pcfuncs ipban function. Requests from
+    # banned IPs are rejected before any other work. Disabled when unset.
+    banned_ip_config: Optional[TableConfig] = None
+
     table_value_ttl: int = Field(default=DEFAULT_TTL)
 
     redis_hostname: str
@@ -53,6 +67,32 @@ class PCAPIsConfig(BaseSettings):
     redis_port: int
     redis_ssl: bool = True
     redis_ttl: int = Field(default=DEFAULT_TTL)
+    # Seconds after which a cached result is served stale and refreshed in the
+    # background. `redis_ttl` remains the hard expiry. Disabled when 0.
+    redis_soft_ttl: int = Field(default=0, ge=0)
+    # Seconds that errors such as not found are cached for, by callers that
+    # opt in with `negative_errors`. Disabled when 0.
+    redis_negative_ttl: int = Field(default=0, ge=0)
+    # Cached results of at least this many serialized bytes are stored gzip
+    # compressed, and served compressed to clients that accept it. Disabled when 0.
+    cache_gzip_min_size: int = Field(default=0, ge=0)
+    # Share cache entries across the hostnames the APIs are served under,
+    # rewriting request-dependent hrefs when entries are read.
+    cache_host_neutral: bool = False
+
+    # In-process cache tier in front of redis, keyed by cache key prefix,
+    # e.g. {"/collections": {"maxsize": 8, "ttl": 60}}. Disabled when empty.
+    local_cache_prefixes: Dict[str, LocalCacheConfig] = Field(default_factory=dict)
+
+    # Milliseconds a process may hold the redis lock used to fill a cache key
+    # while other processes wait for the result. Disabled when 0.
+    cache_lock_ms: int = Field(default=0, ge=0)
+
+    # Enforce rate limits and back pressure with per-process token buckets,
+    # synced with redis at this interval in milliseconds, instead of calling
+    # redis on every request. Limits are approximate across processes.
+    # Disabled when 0.
+    local_rate_limit_sync_ms: int = Field(default=0, ge=0)
 
     debug: bool = False
 
@@ -74,6 +114,14 @@ class PCAPIsConfig(BaseSettings):
             ttl=self.table_value_ttl,
         )
 
+    @cachedmethod(
+        cache=lambda self: self._cache, key=lambda _: hashkey("collection_registry")
+    )
+    def get_collection_config_registry(self) -> CollectionConfigRegistry:
+        return CollectionConfigRegistry(
+            self.get_collection_config_table(), refresh_seconds=self.table_value_ttl
+        )
+
     @cachedmethod(cache=lambda self: self._cache, key=lambda _: hashkey("container"))
     def get_container_config_table(self) -> ContainerConfigTable:
         return ContainerConfigTable.from_environment(
@@ -83,6 +131,14 @@ class PCAPIsConfig(BaseSettings):
             ttl=self.table_value_ttl,
         )
 
+    @cachedmethod(
+        cache=lambda self: self._cache, key=lambda _: hashkey("container_cdn_index")
+    )
+    def get_container_cdn_index(self) -> ContainerCdnIndex:
+        return ContainerCdnIndex(
+            self.get_container_config_table(), refresh_seconds=self.table_value_ttl
+        )
+
     @cachedmethod(cache=lambda self: self._cache, key=lambda _: hashkey("ip_whitelist"))
     def get_ip_exception_list_table(self) -> IPExceptionListTable:
         return IPExceptionListTable.from_environment(
@@ -92,6 +148,54 @@ class PCAPIsConfig(BaseSettings):
             ttl=self.table_value_ttl,
         )
 
+    @cachedmethod(
+        cache=lambda self: self._cache, key=lambda _: hashkey("async_ip_whitelist")
+    )
+    def get_async_ip_exception_list_table(self) -> AsyncIPExceptionListTable:
+        return AsyncIPExceptionListTable.from_environment(
+            account_url=self.ip_exception_config.account_url,
+            account_name=self.ip_exception_config.account_name,
+            table_name=self.ip_exception_config.table_name,
+            ttl=self.table_value_ttl,
+        )
+
+    @cachedmethod(
+        cache=lambda self: self._cache, key=lambda _: hashkey("ip_exception_matcher")
+    )
+    def get_ip_exception_matcher(self) -> IPMatcherSnapshot:
+        return IPMatcherSnapshot(
+            "ip exceptions",
+            self.get_ip_exception_list_table().read_exceptions,
+            refresh_seconds=self.table_value_ttl,
+        )
+
+    @cachedmethod(cache=lambda self: self._cache, key=lambda _: hashkey("banned_ip"))
+    def get_banned_ip_matcher(self) -> Optional[IPMatcherSnapshot]:
+        if not self.banned_ip_config:
+            return None
+        table = BannedIPTable.from_environment(
+            account_url=self.banned_ip_config.account_url,
+            account_name=self.banned_ip_config.account_name,
+            table_name=self.banned_ip_config.table_name,
+        )
+        return IPMatcherSnapshot(
+            "banned ips", table.read_banned_ips, refresh_seconds=self.table_value_ttl
+        )
+
+    @cachedmethod(cache=lambda self: self._cache, key=lambda _: hashkey("local_cache"))
+    def get_local_cache(self) -> Optional[LocalCache]:
+        if not self.local_cache_prefixes:
+            return None
+        return LocalCache(self.local_cache_prefixes)
+
+    @cachedmethod(
+        cache=lambda self: self._cache, key=lambda _: hashkey("local_rate_limiter")
+    )
+    def get_local_rate_limiter(self) -> Optional[LocalRateLimiter]:
+        if not self.local_rate_limit_sync_ms:
+            return None
+        return LocalRateLimiter(self.local_rate_limit_sync_ms)
+
     @classmethod
     @lru_cache(maxsize=1)
     def from_environment(cls) -> "PCAPIsConfig":
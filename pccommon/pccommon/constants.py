@@ -3,6 +3,11 @@ import os
 from opencensus.trace.attributes_helper import COMMON_ATTRIBUTES
 
 CACHE_KEY_ITEM = "/item"
+CACHE_KEY_TILER_PREFIX = "tiler:"
+CACHE_KEY_EMPTY_TILE = "/empty-tile"
+CACHE_KEY_VECTOR_TILE = "/vector-tile"
+CACHE_KEY_RASTER_TILE = "/raster-tile"
+CACHE_KEY_TILE_ASSETS = "/tile-assets"
 
 DEFAULT_COLLECTION_CONFIG_TABLE_NAME = "collectionconfig"
 DEFAULT_CONTAINER_CONFIG_TABLE_NAME = "containerconfig"
@@ -13,6 +18,20 @@ DEFAULT_TTL = 600  # 10 minutes
 DEFAULT_IP_EXCEPTIONS_TTL = 43200  # 12 hours
 
 RATE_LIMIT_KEY_PREFIX = "rate:"
+RATE_LIMIT_SYNC_KEY_PREFIX = "ratesync:"
+LOCAL_RATE_LIMIT_MAX_KEYS = 10000
+LOCAL_RATE_LIMIT_IDLE_SECONDS = 60
+CACHE_LOCK_KEY_PREFIX = "lock:"
+CACHE_FRESH_KEY_PREFIX = "fresh:"
+CACHE_GZIP_LEVEL = 6
+CACHE_HREF_PLACEHOLDER_SCHEME = "pc-cache-href://"
+CACHE_LOCK_POLL_SECONDS = 0.05
+CACHE_TAG_KEY_PREFIX = "ztag:"
+CACHE_TAG_COLLECTIONS = "collections"
+CACHE_TAG_ITEMS = "items"
+CACHE_TAG_SCAN_COUNT = 500
+CACHE_INVALIDATION_KEY_PREFIX = "inval:"
+CACHE_INVALIDATION_CLAIM_SECONDS = 60
 BACKPRESSURE_KEY_PREFIX = "backp:"
 
 IP_EXCEPTION_PARTITION_KEY = "ipexception"
@@ -39,3 +58,6 @@ HTTP_METHOD = COMMON_ATTRIBUTES["HTTP_METHOD"]
 # This is not a key for a real Storage Account and is publicly accessible
 # on Azurite's GitHub repo. This is used only in development.
 AZURITE_ACCOUNT_KEY: str = os.environ.get("AZURITE_ACCOUNT_KEY", "")
+
+BLOB_HOST_SUFFIX = ".blob.core.windows.net"
+CDN_HOST_SUFFIX = ".azureedge.net"
@@ -0,0 +1,51 @@
+"""Tasks computing values in this process, shared by concurrent callers."""
+
+import asyncio
+from typing import Any, Callable, Coroutine, Dict, Generic, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class InflightTasks(Generic[V]):
+    """Tasks computing a value per key, registered so that concurrent callers
+    for the same key in this process await one task rather than start their
+    own. A task is dropped once done, so later callers start a new one.
+
+    Only accessed from the event loop. Tasks left behind by another event
+    loop, e.g. in tests, are ignored.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, "asyncio.Task[V]"] = {}
+
+    def get(self, key: str) -> "Optional[asyncio.Task[V]]":
+        """Return the task in progress for `key` on the running loop, if any."""
+        task = self._tasks.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+        return None
+
+    def start(self, key: str, coro: Coroutine[Any, Any, V]) -> "asyncio.Task[V]":
+        """Run `coro` as the task for `key`. Callers should await the task
+        through `asyncio.shield`, so that it completes for the other callers
+        if one is cancelled."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._release(key, t))
+        return task
+
+    def get_or_start(
+        self, key: str, coro_fn: Callable[[], Coroutine[Any, Any, V]]
+    ) -> "asyncio.Task[V]":
+        """Return the task in progress for `key`, or start one with `coro_fn`."""
+        task = self.get(key)
+        if task is None:
+            task = self.start(key, coro_fn())
+        return task
+
+    def _release(self, key: str, task: "asyncio.Task[V]") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark any exception as retrieved when no caller is left waiting on it
+        if not task.cancelled():
+            task.exception()
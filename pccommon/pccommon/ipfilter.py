@@ -0,0 +1,74 @@
+"""In-memory matching of request IPs against IP exception and ban lists."""
+
+import ipaddress
+import logging
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from pccommon.tables import TableSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class IPMatcher:
+    """Matches IP addresses against IPv4 and IPv6 addresses and CIDR ranges.
+
+    Networks are grouped by IP version and prefix length, with a set of network
+    addresses per prefix length. A lookup masks the address once per distinct
+    prefix length in the list (usually one or two) and checks set membership,
+    so its cost doesn't grow with the number of networks.
+    """
+
+    def __init__(self, networks: Iterable[str]) -> None:
+        by_prefix: Dict[Tuple[int, int], Set[int]] = {}
+        for network in networks:
+            try:
+                net = ipaddress.ip_network(network.strip(), strict=False)
+            except ValueError:
+                logger.warning(f"Ignoring invalid IP network '{network}'")
+                continue
+            by_prefix.setdefault((net.version, net.prefixlen), set()).add(
+                int(net.network_address)
+            )
+
+        self._masks: Dict[int, List[Tuple[int, Set[int]]]] = {4: [], 6: []}
+        for (version, prefixlen), addresses in sorted(
+            by_prefix.items(), key=lambda p: -p[0][1]
+        ):
+            bits = 32 if version == 4 else 128
+            mask = ((1 << prefixlen) - 1) << (bits - prefixlen)
+            self._masks[version].append((mask, addresses))
+        self._size = sum(len(a) for a in by_prefix.values())
+
+    def __contains__(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip.strip())
+        except ValueError:
+            return False
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        for mask, addresses in self._masks[address.version]:
+            if value & mask in addresses:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class IPMatcherSnapshot(TableSnapshot[IPMatcher]):
+    """An `IPMatcher` built from a table of IPs and CIDR ranges, refreshed in
+    the background. See `TableSnapshot`."""
+
+    def __init__(
+        self, name: str, read: Callable[[], Iterable[str]], refresh_seconds: int
+    ) -> None:
+        super().__init__(refresh_seconds)
+        self.name = name
+        self._read_networks = read
+
+    def _read(self) -> IPMatcher:
+        return IPMatcher(self._read_networks())
+
+    def matches(self, ip: str) -> bool:
+        return ip in self._get_snapshot()
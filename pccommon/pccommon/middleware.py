@@ -14,10 +14,12 @@ from fastapi.dependencies.utils import (
 )
 from fastapi.responses import PlainTextResponse
 from fastapi.routing import APIRoute, request_response
-from starlette.status import HTTP_504_GATEWAY_TIMEOUT
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_504_GATEWAY_TIMEOUT
 from starlette.types import ASGIApp, Receive, Scope, Send
 
+from pccommon.config import get_apis_config
 from pccommon.tracing import trace_request
+from pccommon.utils import get_request_ip
 
 logger = logging.getLogger(__name__)
 
@@ -104,3 +106,27 @@ class TraceMiddleware:
             await trace_request(self.service_name, request)
 
         await self.app(scope, receive, send)
+
+
+class BannedIPMiddleware:
+    """Rejects requests from banned IPs with a 403, before any other work is
+    done for them. Requests are let through until the ban list is loaded."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            banned_ips = get_apis_config().get_banned_ip_matcher()
+            if (
+                banned_ips
+                and banned_ips.loaded
+                and banned_ips.matches(get_request_ip(Request(scope)))
+            ):
+                response = PlainTextResponse(
+                    "Forbidden", status_code=HTTP_403_FORBIDDEN
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
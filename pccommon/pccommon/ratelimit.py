@@ -0,0 +1,208 @@
+"""Per-process rate limiting, reconciled with redis in the background.
+
+Used by `pccommon.redis.throttle` in place of the per-request redis scripts
+when `local_rate_limit_sync_ms` is configured.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from pccommon.constants import (
+    LOCAL_RATE_LIMIT_IDLE_SECONDS,
+    LOCAL_RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_SYNC_KEY_PREFIX,
+)
+
+logger = logging.getLogger(__name__)
+
+BucketKey = Tuple[str, str]
+
+
+class _Bucket:
+    """Token buckets for the rate limit and back pressure of one route and IP."""
+
+    __slots__ = (
+        "max_req_per_sec",
+        "req_per_sec",
+        "tokens",
+        "back_pressure_tokens",
+        "updated",
+        "seen",
+        "pending",
+        "synced",
+    )
+
+    def __init__(self, max_req_per_sec: int, req_per_sec: int, now: float) -> None:
+        self.max_req_per_sec = max_req_per_sec
+        self.req_per_sec = req_per_sec
+        self.tokens = float(max_req_per_sec)
+        self.back_pressure_tokens = float(req_per_sec)
+        self.updated = now
+        # When the last request was counted
+        self.seen = now
+        # Requests served by this process that are not yet counted in redis
+        self.pending = 0
+        # The global count last read from redis
+        self.synced: Optional[int] = None
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(
+            self.max_req_per_sec, self.tokens + elapsed * self.max_req_per_sec
+        )
+        self.back_pressure_tokens = min(
+            self.req_per_sec, self.back_pressure_tokens + elapsed * self.req_per_sec
+        )
+
+    def consume(self, count: int) -> None:
+        """Take tokens for requests served by other processes. Buckets may go
+        negative, down to one second's worth of requests."""
+        self.tokens = max(-self.max_req_per_sec, self.tokens - count)
+        self.back_pressure_tokens = max(
+            -self.req_per_sec, self.back_pressure_tokens - count
+        )
+
+
+class LocalRateLimiter:
+    """Rate limits and back pressure enforced with in-process token buckets,
+    keyed by route and IP.
+
+    Each process counts the requests it serves, and periodically adds them to a
+    shared counter in redis. Requests counted by other processes since the last
+    sync are taken from the local buckets, so limits are enforced globally,
+    but only approximately: other processes' requests are seen up to one sync
+    interval late.
+
+    Buckets that have seen no requests for `LOCAL_RATE_LIMIT_IDLE_SECONDS`, or
+    the least recently used once there are `LOCAL_RATE_LIMIT_MAX_KEYS`, are
+    dropped, after their requests are added to redis.
+
+    Buckets are only accessed from the event loop.
+    """
+
+    def __init__(self, sync_ms: int) -> None:
+        self.sync_ms = sync_ms
+        self._buckets: "OrderedDict[BucketKey, _Bucket]" = OrderedDict()
+        # Dropped buckets with requests not yet added to redis
+        self._unsynced: List[Tuple[BucketKey, _Bucket]] = []
+        self._sync_task: "Optional[asyncio.Task[None]]" = None
+
+    def check(
+        self, route_key: str, ip: str, max_req_per_sec: int, req_per_sec: int
+    ) -> Tuple[int, int]:
+        """Count a request, returning `(pexpire, overage)` with the same meaning
+        as the redis throttle script: milliseconds until the request would be
+        allowed if it is over the rate limit, and otherwise the number of
+        requests over the back pressure limit."""
+        now = time.monotonic()
+        key = (route_key, ip)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(max_req_per_sec, req_per_sec, now)
+            if len(self._buckets) > LOCAL_RATE_LIMIT_MAX_KEYS:
+                self._drop(*self._buckets.popitem(last=False))
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(now)
+        bucket.seen = now
+
+        if bucket.tokens < 1:
+            return math.ceil((1 - bucket.tokens) / max_req_per_sec * 1000), 0
+
+        bucket.tokens -= 1
+        bucket.back_pressure_tokens -= 1
+        bucket.pending += 1
+        if bucket.back_pressure_tokens < 0:
+            return 0, math.ceil(-bucket.back_pressure_tokens)
+        return 0, 0
+
+    def start_sync(self, r: Redis) -> None:
+        """Start the background sync with redis on the running loop, if it is
+        not already running. Called when the app starts."""
+        loop = asyncio.get_running_loop()
+        task = self._sync_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._sync_task = loop.create_task(self._sync_forever(r))
+
+    async def stop_sync(self, r: Redis) -> None:
+        """Stop the background sync, and add the requests served since the last
+        sync to redis. Called when the app shuts down."""
+        task, self._sync_task = self._sync_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await self.sync(r)
+        except Exception as e:
+            logger.error(f"Error syncing rate limits on shutdown: {e}")
+
+    async def _sync_forever(self, r: Redis) -> None:
+        while True:
+            await asyncio.sleep(self.sync_ms / 1000)
+            try:
+                await self.sync(r)
+            except Exception as e:
+                # Keep enforcing limits locally until redis is reachable
+                logger.error(f"Error syncing rate limits: {e}")
+
+    async def sync(self, r: Redis) -> None:
+        """Add locally served requests to the shared counters, and take requests
+        counted by other processes from the local buckets."""
+        self._drop_idle(time.monotonic())
+        dropped, self._unsynced = self._unsynced, []
+        buckets = list(self._buckets.items())
+        if not buckets and not dropped:
+            return
+
+        counted = [bucket.pending for _, bucket in buckets]
+        increments = [(key, bucket.pending) for key, bucket in dropped] + [
+            (key, pending) for (key, _), pending in zip(buckets, counted)
+        ]
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                for (route_key, ip), pending in increments:
+                    key = f"{RATE_LIMIT_SYNC_KEY_PREFIX}:{route_key}:{ip}"
+                    pipe.incrby(key, pending)
+                    pipe.expire(key, LOCAL_RATE_LIMIT_IDLE_SECONDS)
+                results = await pipe.execute()
+        except Exception:
+            self._unsynced.extend(dropped)
+            raise
+
+        now = time.monotonic()
+        totals = results[2 * len(dropped) :: 2]
+        for (_, bucket), pending, total in zip(buckets, counted, totals):
+            # Nothing is known about other processes before the first sync, or
+            # when a counter expired and was recreated lower than the last count.
+            others = 0
+            if bucket.synced is not None:
+                others = max(0, total - bucket.synced - pending)
+            bucket.synced = total
+            bucket.pending -= pending
+            bucket.refill(now)
+            bucket.consume(others)
+
+    def _drop_idle(self, now: float) -> None:
+        # Buckets are in the order they were last used
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.seen < LOCAL_RATE_LIMIT_IDLE_SECONDS:
+                break
+            del self._buckets[key]
+            self._drop(key, bucket)
+
+    def _drop(self, key: BucketKey, bucket: _Bucket) -> None:
+        if bucket.pending:
+            self._unsynced.append((key, bucket))
@@ -1,23 +1,50 @@
 import asyncio
+import gzip
 import hashlib
 import logging
 import threading
 import time
-from typing import Any, Callable, Coroutine, Optional, TypeVar
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import orjson
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 from redis.exceptions import NoScriptError
 from starlette.datastructures import State
 
+from pccommon.cache import LocalCache
 from pccommon.config.core import PCAPIsConfig
 from pccommon.constants import (
     BACKPRESSURE_KEY_PREFIX,
+    CACHE_FRESH_KEY_PREFIX,
+    CACHE_GZIP_LEVEL,
+    CACHE_HREF_PLACEHOLDER_SCHEME,
     CACHE_KEY_ITEM,
+    CACHE_KEY_TILER_PREFIX,
+    CACHE_LOCK_KEY_PREFIX,
+    CACHE_LOCK_POLL_SECONDS,
+    CACHE_TAG_COLLECTIONS,
+    CACHE_TAG_ITEMS,
+    CACHE_TAG_KEY_PREFIX,
+    CACHE_TAG_SCAN_COUNT,
     HTTP_429_TOO_MANY_REQUESTS,
     RATE_LIMIT_KEY_PREFIX,
 )
+from pccommon.inflight import InflightTasks
 from pccommon.logging import get_custom_dimensions
 from pccommon.utils import get_request_ip
 
@@ -27,48 +54,51 @@ redis_script_lock = threading.Lock()
 
 T = TypeVar("T")
 
-# From fastapi-limiter
-rate_limit_lua_script = """
-local key = KEYS[1]
+# Rate limit and back pressure, adapted from fastapi-limiter, in a single call:
+# the rate limit is checked first, and back pressure is only counted for
+# requests that aren't rate limited. Returns {pexpire, overage}.
+throttle_lua_script = """
+local rate_key = KEYS[1]
+local back_pressure_key = KEYS[2]
 local limit = tonumber(ARGV[1])
-local expire_time = ARGV[2]
-local current = tonumber(redis.call('get', key) or "0")
+local back_pressure_limit = tonumber(ARGV[2])
+local expire_time = ARGV[3]
+local current = tonumber(redis.call('get', rate_key) or "0")
 if current > 0 then
     if current + 1 > limit then
-        return redis.call("PTTL",key)
+        return {redis.call("PTTL", rate_key), 0}
     else
-        redis.call("INCR", key)
-        return 0
+        redis.call("INCR", rate_key)
     end
 else
-    redis.call("SET", key, 1, "px", expire_time)
-    return 0
+    redis.call("SET", rate_key, 1, "px", expire_time)
 end
-"""
-rate_limit_lua_script_hash = hashlib.sha1(
-    rate_limit_lua_script.encode("utf-8")
-).hexdigest()
-
-back_pressure_lua_script = """
-local key = KEYS[1]
-local limit = tonumber(ARGV[1])
-local expire_time = ARGV[2]
-local current = tonumber(redis.call('get', key) or "0")
+current = tonumber(redis.call('get', back_pressure_key) or "0")
 if current > 0 then
-    redis.call("INCR", key)
-    if current + 1 > limit then
-        return (current - limit) + 1
+    redis.call("INCR", back_pressure_key)
+    if current + 1 > back_pressure_limit then
+        return {0, (current - back_pressure_limit) + 1}
     else
-        return 0
+        return {0, 0}
     end
 else
-    redis.call("SET", key, 1,"px", expire_time)
-    return 0
+    redis.call("SET", back_pressure_key, 1, "px", expire_time)
+    return {0, 0}
 end
 """
-back_pressure_lua_script_hash = hashlib.sha1(
-    back_pressure_lua_script.encode("utf-8")
-).hexdigest()
+throttle_lua_script_hash = hashlib.sha1(throttle_lua_script.encode("utf-8")).hexdigest()
+
+# Tag sets are sorted sets of cache keys scored by the time they expire. Adds
+# a key, drops the keys that have expired, and expires the set with the last
+# of its keys, so that sets of tags that are often written but rarely
+# invalidated don't grow with dead keys.
+tag_lua_script = """
+local tag_key = KEYS[1]
+redis.call("ZADD", tag_key, ARGV[2], ARGV[1])
+redis.call("ZREMRANGEBYSCORE", tag_key, "-inf", ARGV[3])
+local last = redis.call("ZRANGE", tag_key, -1, -1, "WITHSCORES")
+redis.call("EXPIREAT", tag_key, math.ceil(tonumber(last[2])))
+"""
 
 
 async def connect_to_redis(app: FastAPI) -> None:
@@ -79,13 +109,26 @@ async def connect_to_redis(app: FastAPI) -> None:
         password=settings.redis_password,
         port=settings.redis_port,
         ssl=settings.redis_ssl,
-        decode_responses=True,
     )
 
     app.state.redis = r
     await register_scripts(app.state)
 
 
+def start_rate_limit_sync(app: FastAPI) -> None:
+    """Start syncing the local rate limits with redis in the background, if
+    `local_rate_limit_sync_ms` is configured."""
+    limiter = PCAPIsConfig.from_environment().get_local_rate_limiter()
+    if limiter and app.state.redis:
+        limiter.start_sync(app.state.redis)
+
+
+async def stop_rate_limit_sync(app: FastAPI) -> None:
+    limiter = PCAPIsConfig.from_environment().get_local_rate_limiter()
+    if limiter and app.state.redis:
+        await limiter.stop_sync(app.state.redis)
+
+
 async def register_scripts(state: State) -> None:
     """Register or re-register lua scripts if they have not been previously registered
     with redis from this instance."""
@@ -93,225 +136,778 @@ async def register_scripts(state: State) -> None:
 
     # Avoid multiple threads trying to reregister scripts at once
     with redis_script_lock:
-        hashes = [rate_limit_lua_script_hash, back_pressure_lua_script_hash]
-        exists = await r.script_exists(*hashes)
-
-        state.redis_rate_limit_script_hash = (
-            hashes[0] if exists[0] else await r.script_load(rate_limit_lua_script)
+        (exists,) = await r.script_exists(throttle_lua_script_hash)
+        state.redis_throttle_script_hash = (
+            throttle_lua_script_hash
+            if exists
+            else await r.script_load(throttle_lua_script)
         )
-        state.redis_back_pressure_script_hash = (
-            hashes[1] if exists[1] else await r.script_load(back_pressure_lua_script)
+
+
+@dataclass(eq=False)
+class Throttle:
+    """A rate limit and back pressure check for a request to a route, see
+    `throttle`."""
+
+    route_key: str
+    ip: str
+    max_req_per_sec: int
+    req_per_sec: int
+    inc_ms: int
+
+
+def _pending_throttles(request: Request) -> List[Throttle]:
+    """Throttles deferred until the request's next cache read."""
+    pending: Optional[List[Throttle]] = getattr(request.state, "throttles", None)
+    if pending is None:
+        pending = request.state.throttles = []
+    return pending
+
+
+def _take_throttles(request: Request) -> List[Throttle]:
+    pending = _pending_throttles(request)
+    throttles = list(pending)
+    pending.clear()
+    return throttles
+
+
+def _queue_throttles(
+    pipe: Pipeline, request: Request, throttles: List[Throttle]
+) -> None:
+    script_hash = request.app.state.redis_throttle_script_hash
+    for t in throttles:
+        pipe.evalsha(
+            script_hash,
+            2,
+            f"{RATE_LIMIT_KEY_PREFIX}:{t.route_key}:{t.ip}",
+            f"{BACKPRESSURE_KEY_PREFIX}:{t.route_key}:{t.ip}",
+            str(t.max_req_per_sec),
+            str(t.req_per_sec),
+            "1000",
         )
 
 
-async def cached_result(
-    fn: Callable[[], Coroutine[Any, Any, T]],
+async def _check_throttles(throttles: List[Throttle], results: List[Any]) -> None:
+    """Raise a 429 if any throttle is over its rate limit, otherwise sleep
+    for any back pressure."""
+    delay_ms = 0
+    for t, (pexpire, overage) in zip(throttles, results):
+        if pexpire > 0:
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(1)},  # 1 second
+            )
+        delay_ms += overage * t.inc_ms
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000)
+
+
+# Cache fills currently in progress in this process, keyed by cache key
+_inflight: InflightTasks[Tuple[Any, bytes]] = InflightTasks()
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Prefix of cached errors, see `negative_errors` in `cached_result`
+NEGATIVE_MAGIC = b"\x00err"
+
+
+def register_cache_href(
+    app: FastAPI, name: str, get_href: Callable[[Request], str]
+) -> None:
+    """Register a request-dependent href that is replaced by a placeholder in
+    host-neutral cache entries, and restored from the request when read."""
+    hrefs: Dict[str, Callable[[Request], str]] = getattr(app.state, "cache_hrefs", {})
+    app.state.cache_hrefs = {**hrefs, name: get_href}
+
+
+def _href_placeholders(request: Request) -> List[Tuple[bytes, bytes]]:
+    """Return (href, placeholder) pairs for the request, longest href first."""
+    hrefs = {"base": str(request.base_url)}
+    for name, get_href in getattr(request.app.state, "cache_hrefs", {}).items():
+        hrefs[name] = get_href(request)
+
+    return sorted(
+        (
+            (href.encode("utf-8"), f"{CACHE_HREF_PLACEHOLDER_SCHEME}{name}/".encode())
+            for name, href in hrefs.items()
+            if href
+        ),
+        key=lambda p: len(p[0]),
+        reverse=True,
+    )
+
+
+def _encode(serialized: bytes, request: Request, settings: PCAPIsConfig) -> bytes:
+    """Return the form of a serialized result that is stored in the cache."""
+    if settings.cache_host_neutral:
+        for href, placeholder in _href_placeholders(request):
+            serialized = serialized.replace(href, placeholder)
+
+    min_size = settings.cache_gzip_min_size
+    if min_size and len(serialized) >= min_size:
+        return gzip.compress(serialized, compresslevel=CACHE_GZIP_LEVEL)
+    return serialized
+
+
+def _decode(stored: bytes, request: Request, settings: PCAPIsConfig) -> bytes:
+    """Return the serialized JSON for a value read from the cache."""
+    if stored[:2] == GZIP_MAGIC:
+        stored = gzip.decompress(stored)
+
+    if settings.cache_host_neutral:
+        for href, placeholder in _href_placeholders(request):
+            stored = stored.replace(placeholder, href)
+    return stored
+
+
+def _encode_error(error: Exception) -> bytes:
+    return NEGATIVE_MAGIC + orjson.dumps(
+        {"error": type(error).__name__, "detail": str(error)}
+    )
+
+
+def _is_error(stored: bytes) -> bool:
+    return stored[: len(NEGATIVE_MAGIC)] == NEGATIVE_MAGIC
+
+
+def _decode_error(
+    stored: bytes, errors: Sequence[Type[Exception]]
+) -> Optional[Exception]:
+    """Rebuild a cached error, if it is one of `errors`."""
+    cached = orjson.loads(stored[len(NEGATIVE_MAGIC) :])
+    for error in errors:
+        if error.__name__ == cached["error"]:
+            return error(cached["detail"])
+    return None
+
+
+def _host_cache_key(cache_key: str, request: Request, settings: PCAPIsConfig) -> str:
+    """Return the key a value is cached under in redis for the request's host."""
+    if settings.cache_host_neutral:
+        return cache_key
+    return f"{cache_key}:{request.url.hostname}"
+
+
+def _queue_write(
+    pipe: Pipeline,
     cache_key: str,
-    request: Request,
-    read_only: bool = False,
-) -> T:
-    """Either get the result from redis or run the function and cache the result.
+    stored: bytes,
+    settings: PCAPIsConfig,
+    tags: Sequence[str],
+) -> None:
+    if _is_error(stored):
+        pipe.set(cache_key, stored, settings.redis_negative_ttl)
+    else:
+        pipe.set(cache_key, stored, settings.redis_ttl)
+    if settings.redis_soft_ttl and not _is_error(stored):
+        pipe.set(f"{CACHE_FRESH_KEY_PREFIX}:{cache_key}", "1", settings.redis_soft_ttl)
+    queue_cache_tags(pipe, cache_key, tags, settings.redis_ttl)
 
-    If `read_only` is True, only attempt to read from the cache, do not write to it.
-    """
-    host = request.url.hostname
-    host_cache_key = f"{cache_key}:{host}"
-    settings = PCAPIsConfig.from_environment()
-    r: Optional[Redis] = None
-    try:
-        r = request.app.state.redis
-        if r:
-            cached = await r.get(host_cache_key)
-            if cached:
-                logger.info(
-                    "Cache result hit",
-                    extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
-                )
-                return orjson.loads(cached)
-    except Exception as e:
-        # Don't fail on redis failure
-        logger.error(
-            f"Error in cache read: {e}",
-            extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
+
+def queue_cache_tags(
+    pipe: Pipeline, cache_key: str, tags: Sequence[str], ttl: int
+) -> None:
+    """Queue adding a key to `tags`, for entries written outside of
+    `cached_result` that `invalidate_cache_tags` should delete. `ttl` must be
+    at least the TTL of the entry."""
+    now = time.time()
+    for tag in tags:
+        pipe.eval(
+            tag_lua_script,
+            1,
+            f"{CACHE_TAG_KEY_PREFIX}:{tag}",
+            cache_key,
+            str(now + ttl),
+            str(now),
         )
-        if settings.debug:
-            raise
 
+
+async def _wait_for_lock_holder(
+    r: Redis, cache_key: str, lock_ms: int
+) -> Optional[bytes]:
+    """Poll the cache while another process holds the fill lock for `cache_key`,
+    returning the cached value if it appears before the lock expires."""
+    deadline = time.monotonic() + lock_ms / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_LOCK_POLL_SECONDS)
+        cached = await r.get(cache_key)
+        if cached:
+            return cached
+        if not await r.exists(f"{CACHE_LOCK_KEY_PREFIX}:{cache_key}"):
+            break
+    return None
+
+
+async def _timed_fetch(
+    fn: Callable[[], Coroutine[Any, Any, T]], cache_key: str, request: Request
+) -> T:
     ts = time.perf_counter()
     result = await fn()
     te = time.perf_counter()
     logger.info(
         "Perf: cacheable resource fetch time",
         extra=get_custom_dimensions(
-            {"cache_key": host_cache_key, "duration": f"{te - ts:0.4f}"}, request
+            {"cache_key": cache_key, "duration": f"{te - ts:0.4f}"}, request
         ),
     )
-    if read_only:
-        return result
+    return result
+
+
+async def _fetch_and_store(
+    fn: Callable[[], Coroutine[Any, Any, T]],
+    cache_key: str,
+    request: Request,
+    r: Optional[Redis],
+    local_cache: Optional[LocalCache],
+    settings: PCAPIsConfig,
+    tags: Sequence[str] = (),
+    negative_errors: Sequence[Type[Exception]] = (),
+) -> Tuple[T, bytes]:
+    """Run the function and write its serialized result to the cache, adding
+    the cache key to the sets for `tags`. Errors in `negative_errors` are
+    cached too, and re-raised.
+
+    Returns the result along with the form it was stored in.
+
+    If a cross-process fill lock is configured, only the process holding the
+    lock runs the function; other processes wait for it to fill the cache.
+    """
+    lock_key = f"{CACHE_LOCK_KEY_PREFIX}:{cache_key}"
+    locked = False
+    cached_error: Optional[Exception] = None
+    if r and settings.cache_lock_ms:
+        try:
+            locked = bool(
+                await r.set(lock_key, "1", nx=True, px=settings.cache_lock_ms)
+            )
+            if not locked:
+                cached = await _wait_for_lock_holder(
+                    r, cache_key, settings.cache_lock_ms
+                )
+                if cached and _is_error(cached):
+                    cached_error = _decode_error(cached, negative_errors)
+                elif cached:
+                    if local_cache:
+                        local_cache.set(cache_key, cached, tags)
+                    return orjson.loads(_decode(cached, request, settings)), cached
+        except Exception as e:
+            logger.error(
+                f"Error in cache lock: {e}",
+                extra=get_custom_dimensions({"cache_key": cache_key}, request),
+            )
+            if settings.debug:
+                raise
+    if cached_error:
+        raise cached_error
 
     try:
-        if r:
-            await r.set(host_cache_key, orjson.dumps(result), settings.redis_ttl)
+        try:
+            result = await _timed_fetch(fn, cache_key, request)
+        except Exception as e:
+            if (
+                r
+                and settings.redis_negative_ttl
+                and isinstance(e, tuple(negative_errors))
+            ):
+                await _store_error(r, cache_key, e, request, settings, tags)
+            raise
+        stored = _encode(orjson.dumps(result), request, settings)
+
+        try:
+            if local_cache:
+                local_cache.set(cache_key, stored, tags)
+            if r:
+                async with r.pipeline(transaction=False) as pipe:
+                    _queue_write(pipe, cache_key, stored, settings, tags)
+                    await pipe.execute()
+        except Exception as e:
+            # Don't fail on redis failure
+            logger.error(
+                f"Error in cache write: {e}",
+                extra=get_custom_dimensions(
+                    {"cache_key": cache_key, "cache_value_type": type(result)},
+                    request,
+                ),
+            )
+            if settings.debug:
+                raise
+
+        return result, stored
+    finally:
+        if locked and r:
+            try:
+                await r.delete(lock_key)
+            except Exception:
+                # The lock expires on its own
+                pass
+
+
+async def _store_error(
+    r: Redis,
+    cache_key: str,
+    error: Exception,
+    request: Request,
+    settings: PCAPIsConfig,
+    tags: Sequence[str],
+) -> None:
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            _queue_write(pipe, cache_key, _encode_error(error), settings, tags)
+            await pipe.execute()
     except Exception as e:
         # Don't fail on redis failure
         logger.error(
             f"Error in cache write: {e}",
-            extra=get_custom_dimensions(
-                {"cache_key": host_cache_key, "cache_value_type": type(result)}, request
-            ),
+            extra=get_custom_dimensions({"cache_key": cache_key}, request),
         )
         if settings.debug:
             raise
 
-    return result
 
+async def _refresh(
+    fn: Callable[[], Coroutine[Any, Any, T]],
+    cache_key: str,
+    request: Request,
+    r: Redis,
+    local_cache: Optional[LocalCache],
+    settings: PCAPIsConfig,
+    stale: bytes,
+    tags: Sequence[str] = (),
+    negative_errors: Sequence[Type[Exception]] = (),
+) -> Tuple[Any, bytes]:
+    """Refresh a stale cache entry in the background.
+
+    Re-marking the entry as fresh claims the refresh, so only one process
+    refreshes a given stale entry. If the refresh raises one of
+    `negative_errors`, e.g. because the item was deleted, the error replaces
+    the entry.
+    """
+    try:
+        claimed = await r.set(
+            f"{CACHE_FRESH_KEY_PREFIX}:{cache_key}",
+            "1",
+            settings.redis_soft_ttl,
+            nx=True,
+        )
+        if not claimed:
+            return orjson.loads(_decode(stale, request, settings)), stale
+        logger.info(
+            "Refreshing stale cache result",
+            extra=get_custom_dimensions({"cache_key": cache_key}, request),
+        )
+        return await _fetch_and_store(
+            fn, cache_key, request, r, local_cache, settings, tags, negative_errors
+        )
+    except tuple(negative_errors):
+        raise
+    except Exception as e:
+        logger.error(
+            f"Error in cache refresh: {e}",
+            extra=get_custom_dimensions({"cache_key": cache_key}, request),
+        )
+        raise
 
-async def apply_rate_limit(
-    request: Request, route_key: str, max_req_per_sec: int
-) -> None:
+
+def _start_fill(
+    cache_key: str, coro: Coroutine[Any, Any, Tuple[Any, bytes]]
+) -> "asyncio.Task[Tuple[Any, bytes]]":
+    """Run a cache fill as its own task, registered so concurrent callers in
+    this process can await it rather than start their own."""
+    return _inflight.start(cache_key, coro)
+
+
+def _inflight_task(cache_key: str) -> "Optional[asyncio.Task[Tuple[Any, bytes]]]":
+    return _inflight.get(cache_key)
+
+
+async def _read_cache(
+    r: Redis,
+    request: Request,
+    cache_key: str,
+    settings: PCAPIsConfig,
+    throttles: List[Throttle],
+) -> Tuple[List[Any], Optional[bytes], bool]:
+    """Read a cache entry, running any pending throttles in the same round trip.
+
+    Returns the throttle results, the cached value, and whether it is fresh.
     """
-    Apply a rate limit.
+    async with r.pipeline(transaction=False) as pipe:
+        _queue_throttles(pipe, request, throttles)
+        if settings.redis_soft_ttl:
+            pipe.mget(cache_key, f"{CACHE_FRESH_KEY_PREFIX}:{cache_key}")
+        else:
+            pipe.get(cache_key)
+        try:
+            results = await pipe.execute()
+        except NoScriptError:
+            logger.error("Throttle script not registered in redis, re-registering")
+            await register_scripts(request.app.state)
+            return await _read_cache(r, request, cache_key, settings, [])
 
-    Attributes
-    ----------
-    request:
-        The request to rate limit. The IP address from the request is
-        used in the cache key.
-    route_key:
-        The key representing the route to rate limit, used in the cache key.
-    max_req_per_sec:
-        The maximum requests per second. If this rate is exceeded,
-        a 429 Too Many Requests error is raised.
+    *throttle_results, read = results
+    if settings.redis_soft_ttl:
+        cached, fresh = read
+        return throttle_results, cached, bool(fresh)
+    return throttle_results, read, True
+
+
+async def _cached(
+    fn: Callable[[], Coroutine[Any, Any, T]],
+    cache_key: str,
+    request: Request,
+    read_only: bool = False,
+    tags: Sequence[str] = (),
+    negative_errors: Sequence[Type[Exception]] = (),
+) -> Tuple[bool, Any, Optional[bytes]]:
+    """Read a value from the cache, or run the function and cache the result.
+
+    Returns a `(computed, result, stored)` tuple. If `computed` is True,
+    `result` is the value returned by `fn` for this caller, and `stored` is
+    its cached form (None if `read_only`). Otherwise `stored` holds the cached
+    value, and `result` is None.
     """
     settings = PCAPIsConfig.from_environment()
-    try:
-        ip = get_request_ip(request)
-        r: Redis = request.app.state.redis
+    host_cache_key = _host_cache_key(cache_key, request, settings)
+    local_cache = settings.get_local_cache()
+    r: Optional[Redis] = None
 
-        # Check if this ip excluded from rate limiting
-        if ip in settings.get_ip_exception_list_table().get_exceptions():
-            return
+    throttles = _take_throttles(request)
 
-        script_hash = request.app.state.redis_rate_limit_script_hash
+    if local_cache:
+        cached = local_cache.get(host_cache_key)
+        if cached is not None:
+            logger.info(
+                "Local cache result hit",
+                extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
+            )
+            await apply_throttles(request, throttles)
+            return False, None, cached
 
-        key = f"{RATE_LIMIT_KEY_PREFIX}:{route_key}:{ip}"
-        pexpire = await r.evalsha(script_hash, 1, key, str(max_req_per_sec), "1000")
-        if pexpire > 0:
-            raise HTTPException(
-                status_code=HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too Many Requests",
-                headers={"Retry-After": str(1)},  # 1 second
+    cached, fresh = None, True
+    throttle_results: List[Any] = []
+    try:
+        r = request.app.state.redis
+        if r:
+            throttle_results, cached, fresh = await _read_cache(
+                r, request, host_cache_key, settings, throttles
             )
-    except NoScriptError:
+    except Exception as e:
+        # Don't fail on redis failure
         logger.error(
-            "Rate limit script not registered in redis, re-registering",
+            f"Error in cache read: {e}",
+            extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
         )
-        await register_scripts(request.app.state)
-    except HTTPException:
-        raise
-    except Exception:
         if settings.debug:
             raise
 
+    await _check_throttles(throttles, throttle_results)
 
-def rate_limit(
-    route_key: str, max_req_per_sec: int
-) -> Callable[
-    [Callable[..., Coroutine[Any, Any, T]]], Callable[..., Coroutine[Any, Any, T]]
-]:
+    if r and cached and _is_error(cached):
+        # Errors not expected by this caller are refetched
+        error = _decode_error(cached, negative_errors)
+        if error:
+            logger.info(
+                "Cache error result hit",
+                extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
+            )
+            raise error
+    elif r and cached:
+        logger.info(
+            "Cache result hit",
+            extra=get_custom_dimensions(
+                {"cache_key": host_cache_key, "stale": not fresh}, request
+            ),
+        )
+        if isinstance(cached, str):
+            cached = cached.encode("utf-8")
+        if local_cache and not read_only:
+            local_cache.set(host_cache_key, cached, tags)
+        if not fresh and not read_only and not _inflight_task(host_cache_key):
+            _start_fill(
+                host_cache_key,
+                _refresh(
+                    fn,
+                    host_cache_key,
+                    request,
+                    r,
+                    local_cache,
+                    settings,
+                    cached,
+                    tags,
+                    negative_errors,
+                ),
+            )
+        return False, None, cached
+
+    if read_only:
+        return True, await _timed_fetch(fn, host_cache_key, request), None
+
+    task = _inflight_task(host_cache_key)
+    if task is not None:
+        logger.info(
+            "Cache fill in progress, awaiting result",
+            extra=get_custom_dimensions({"cache_key": host_cache_key}, request),
+        )
+        _, stored = await asyncio.shield(task)
+        return False, None, stored
+
+    # Shield the fill so that it completes for any waiters even if this
+    # request is cancelled.
+    task = _start_fill(
+        host_cache_key,
+        _fetch_and_store(
+            fn,
+            host_cache_key,
+            request,
+            r,
+            local_cache,
+            settings,
+            tags,
+            negative_errors,
+        ),
+    )
+    result, stored = await asyncio.shield(task)
+    return True, result, stored
+
+
+async def cached_result(
+    fn: Callable[[], Coroutine[Any, Any, T]],
+    cache_key: str,
+    request: Request,
+    read_only: bool = False,
+    tags: Sequence[str] = (),
+    negative_errors: Sequence[Type[Exception]] = (),
+) -> T:
+    """Either get the result from the cache or run the function and cache the result.
+
+    If an in-process cache is configured for the key's prefix, it is checked
+    before redis and filled from both redis hits and fresh results.
+
+    On a cache miss, concurrent calls for the same key in this process share a
+    single call to `fn`; each caller receives its own copy of the result.
+
+    If a soft TTL is configured, a cached result older than the soft TTL is
+    still returned immediately, and refreshed in the background.
+
+    If host-neutral caching is enabled, entries are shared across the hostnames
+    the API is served under: hrefs built from the request are stored as
+    placeholders and rewritten for the requesting host when read.
+
+    `tags` name groups of entries that are deleted together by
+    `invalidate_cache_tags` when the data they were built from changes.
+
+    If `fn` raises one of `negative_errors`, e.g. a not found error, the error
+    is cached for `redis_negative_ttl` seconds and raised again on later calls.
+
+    If `read_only` is True, only attempt to read from the cache, do not write to it.
     """
-    Decorator that applies a rate limit to a function.
+    computed, result, stored = await _cached(
+        fn, cache_key, request, read_only, tags, negative_errors
+    )
+    if computed:
+        return result
+    assert stored is not None
+    return orjson.loads(_decode(stored, request, PCAPIsConfig.from_environment()))
 
-    apply_rate_limit will be called before the function is executed.
 
-    Attributes
-    ----------
-    route_key:
-        The key representing the route to rate limit, used in the cache key.
-    max_req_per_sec:
-        The maximum requests per second. If this rate is exceeded,
-        a 429 Too Many Requests error is raised.
+async def cached_response(
+    fn: Callable[[], Coroutine[Any, Any, Any]],
+    cache_key: str,
+    request: Request,
+    media_type: str = "application/json",
+    tags: Sequence[str] = (),
+    negative_errors: Sequence[Type[Exception]] = (),
+) -> Response:
+    """Like `cached_result`, but return the cached JSON body as a response
+    without deserializing it.
+
+    Entries are shared with `cached_result` for the same key. If the entry was
+    stored gzip compressed and the client accepts gzip, the compressed bytes
+    are returned as-is, unless hrefs in host-neutral entries need rewriting.
     """
+    computed, result, stored = await _cached(
+        fn, cache_key, request, tags=tags, negative_errors=negative_errors
+    )
+    if stored is None:
+        return Response(content=orjson.dumps(result), media_type=media_type)
 
-    def _decorator(
-        fn: Callable[..., Coroutine[Any, Any, T]],
-    ) -> Callable[..., Coroutine[Any, Any, T]]:
-        async def _wrapper(*args: Any, **kwargs: Any) -> T:
-            request: Optional[Request] = kwargs.get("request")
-            if request:
-                await apply_rate_limit(request, route_key, max_req_per_sec)
-            else:
-                raise ValueError(f"Missing request in {fn.__name__}")
-            return await fn(*args, **kwargs)
+    settings = PCAPIsConfig.from_environment()
+    if (
+        stored[:2] == GZIP_MAGIC
+        and not settings.cache_host_neutral
+        and _accepts_gzip(request.headers.get("accept-encoding", ""))
+    ):
+        return Response(
+            content=stored,
+            media_type=media_type,
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
 
-        return _wrapper
+    return Response(content=_decode(stored, request, settings), media_type=media_type)
 
-    return _decorator
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Return whether an Accept-Encoding header accepts gzip: listed, or
+    covered by "*" when not listed, with a non-zero quality value."""
+    qualities: Dict[str, float] = {}
+    for entry in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in entry.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
 
 
-async def apply_back_pressure(
-    request: Request, route_key: str, req_per_sec: int, inc_ms: int
+async def fill_cache(
+    request: Request, entries: Iterable[Tuple[str, Any, Sequence[str]]]
 ) -> None:
-    """
-    Apply back pressure.
+    """Write results computed elsewhere to the cache in one redis round trip,
+    as `(cache_key, result, tags)` entries, so that later `cached_result` calls
+    for those keys hit the cache. Only redis is written to."""
+    settings = PCAPIsConfig.from_environment()
+    r: Optional[Redis] = request.app.state.redis
+    if not r:
+        return
 
-    Once the rate limit exceeds req_per_sec, slow down responses
-    by sleeping inc_ms milliseconds for each request over the limit.
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            for cache_key, result, tags in entries:
+                stored = _encode(orjson.dumps(result), request, settings)
+                _queue_write(
+                    pipe,
+                    _host_cache_key(cache_key, request, settings),
+                    stored,
+                    settings,
+                    tags,
+                )
+            await pipe.execute()
+    except Exception as e:
+        # Don't fail on redis failure
+        logger.error(
+            f"Error in cache fill: {e}",
+            extra=get_custom_dimensions({}, request),
+        )
+        if settings.debug:
+            raise
 
-    Attributes
-    ----------
-    request:
-        The request to apply back pressure to. The IP address from the request is
-        used in the cache key.
-    route_key:
-        The key representing the route to rate limit, used in the cache key.
-    req_per_sec:
-        After this amount of requests are detected over a second the back pressure
-        wil be applied.
-    inc_ms:
-        The amount of milliseconds to sleep for each request over req_per_sec.
-    """
+
+async def get_cached_error(
+    request: Request, cache_key: str, errors: Sequence[Type[Exception]]
+) -> Optional[Exception]:
+    """Return the error cached for `cache_key` by `cache_error`, if any."""
     settings = PCAPIsConfig.from_environment()
+    r: Optional[Redis] = request.app.state.redis
+    if not r or not settings.redis_negative_ttl:
+        return None
+
     try:
-        ip = get_request_ip(request)
-        r: Redis = request.app.state.redis
+        cached = await r.get(_host_cache_key(cache_key, request, settings))
+    except Exception as e:
+        logger.error(
+            f"Error in cache read: {e}",
+            extra=get_custom_dimensions({"cache_key": cache_key}, request),
+        )
+        if settings.debug:
+            raise
+        return None
+
+    if cached and _is_error(cached):
+        return _decode_error(cached, errors)
+    return None
+
+
+async def cache_error(
+    request: Request, cache_key: str, error: Exception, tags: Sequence[str] = ()
+) -> None:
+    """Cache an error for `redis_negative_ttl` seconds, for callers that can't
+    wrap the work in `cached_result`."""
+    settings = PCAPIsConfig.from_environment()
+    r: Optional[Redis] = request.app.state.redis
+    if r and settings.redis_negative_ttl:
+        await _store_error(
+            r,
+            _host_cache_key(cache_key, request, settings),
+            error,
+            request,
+            settings,
+            tags,
+        )
+
+
+async def _is_ip_exception(ip: str, settings: PCAPIsConfig) -> bool:
+    matcher = settings.get_ip_exception_matcher()
+    if matcher.loaded:
+        return matcher.matches(ip)
+    # Only exact IPs are matched until the IP exceptions are loaded
+    return ip in await settings.get_async_ip_exception_list_table().get_exceptions()
+
 
-        # Check if this ip excluded from rate limiting
-        if ip in settings.get_ip_exception_list_table().get_exceptions():
-            return
+async def _is_throttle_exempt(request: Request, settings: PCAPIsConfig) -> bool:
+    """Check if the request's IP is excluded from rate limiting."""
+    try:
+        return await _is_ip_exception(get_request_ip(request), settings)
+    except Exception:
+        if settings.debug:
+            raise
+        return True
 
-        script_hash = request.app.state.redis_back_pressure_script_hash
 
-        key = f"{BACKPRESSURE_KEY_PREFIX}:{route_key}:{ip}"
-        overage: int = await r.evalsha(script_hash, 1, key, str(req_per_sec), "1000")
-        print(f"overage: {overage}")
-        if overage > 0:
-            await asyncio.sleep((overage * inc_ms) / 1000)
+async def apply_throttles(request: Request, throttles: List[Throttle]) -> None:
+    """Apply rate limits and back pressure in a single redis round trip."""
+    settings = PCAPIsConfig.from_environment()
+    r: Optional[Redis] = request.app.state.redis
+    if not throttles or not r:
+        return
 
+    try:
+        async with r.pipeline(transaction=False) as pipe:
+            _queue_throttles(pipe, request, throttles)
+            results = await pipe.execute()
     except NoScriptError:
         logger.error(
-            "Back pressure script not registered in redis, re-registering",
+            "Throttle script not registered in redis, re-registering",
         )
         await register_scripts(request.app.state)
-    except HTTPException:
-        raise
+        return
     except Exception:
         if settings.debug:
             raise
+        return
+
+    await _check_throttles(throttles, results)
 
 
-def back_pressure(
-    route_key: str, req_per_sec: int, inc_ms: int
+def throttle(
+    route_key: str, max_req_per_sec: int, req_per_sec: int, inc_ms: int
 ) -> Callable[
     [Callable[..., Coroutine[Any, Any, T]]], Callable[..., Coroutine[Any, Any, T]]
 ]:
     """
-    Decorator that applies back pressure to a function.
+    Decorator that applies both a rate limit and back pressure to a function,
+    with one redis call.
+
+    The check is deferred to the function's first `cached_result` or
+    `cached_response` call, and sent to redis in the same pipeline as the cache
+    read, so it still runs before any work on a cache miss. If the function
+    returns without reading the cache, the check is applied then.
+
+    If `local_rate_limit_sync_ms` is configured, the check is made against
+    in-process token buckets instead, without calling redis.
 
     Attributes
     ----------
     route_key:
         The key representing the route to rate limit, used in the cache key.
+    max_req_per_sec:
+        The maximum requests per second. If this rate is exceeded,
+        a 429 Too Many Requests error is raised.
     req_per_sec:
         After this amount of requests are detected over a second the back pressure
         wil be applied.
@@ -324,11 +920,37 @@ def back_pressure(
     ) -> Callable[..., Coroutine[Any, Any, T]]:
         async def _wrapper(*args: Any, **kwargs: Any) -> T:
             request: Optional[Request] = kwargs.get("request")
-            if request:
-                await apply_back_pressure(request, route_key, req_per_sec, inc_ms)
-            else:
+            if not request:
                 raise ValueError(f"Missing request in {fn.__name__}")
-            return await fn(*args, **kwargs)
+
+            settings = PCAPIsConfig.from_environment()
+            if await _is_throttle_exempt(request, settings):
+                return await fn(*args, **kwargs)
+
+            t = Throttle(
+                route_key,
+                get_request_ip(request),
+                max_req_per_sec,
+                req_per_sec,
+                inc_ms,
+            )
+            limiter = settings.get_local_rate_limiter()
+            if limiter:
+                counts = limiter.check(route_key, t.ip, max_req_per_sec, req_per_sec)
+                await _check_throttles([t], [counts])
+                return await fn(*args, **kwargs)
+
+            pending = _pending_throttles(request)
+            pending.append(t)
+            try:
+                result = await fn(*args, **kwargs)
+            finally:
+                unapplied = t in pending
+                if unapplied:
+                    pending.remove(t)
+            if unapplied:
+                await apply_throttles(request, [t])
+            return result
 
         return _wrapper
 
@@ -338,3 +960,90 @@ def back_pressure(
 def stac_item_cache_key(collection: str, item: str) -> str:
     """Generate a cache key for a STAC item."""
     return f"{CACHE_KEY_ITEM}:{collection}:{item}"
+
+
+def tiler_item_cache_key(collection: str, item: str) -> str:
+    """Generate the cache key the tiler reads a STAC item from."""
+    return f"{CACHE_KEY_TILER_PREFIX}{stac_item_cache_key(collection, item)}"
+
+
+def stac_collection_tag(collection: str) -> str:
+    """Tag for cache entries built from a STAC collection."""
+    return f"collection:{collection}"
+
+
+def stac_items_tag(collection: Optional[str] = None) -> str:
+    """Tag for cache entries built from the items of a STAC collection, or
+    from items of any collection if no collection is given."""
+    return f"{CACHE_TAG_ITEMS}:{collection}" if collection else CACHE_TAG_ITEMS
+
+
+def stac_item_tag(collection: str, item: str) -> str:
+    """Tag for cache entries built from a single STAC item."""
+    return f"item:{collection}:{item}"
+
+
+def stac_change_tags(collection: str, item: Optional[str] = None) -> List[str]:
+    """Tags for the cache entries affected by a change to a STAC collection, or
+    to an item of it."""
+    if item:
+        return [
+            stac_item_tag(collection, item),
+            stac_items_tag(collection),
+            stac_items_tag(),
+        ]
+    return [
+        stac_collection_tag(collection),
+        stac_items_tag(collection),
+        stac_items_tag(),
+        CACHE_TAG_COLLECTIONS,
+    ]
+
+
+async def invalidate_cache_tags(r: Redis, tags: Sequence[str]) -> int:
+    """Delete the cache entries for `tags` from redis, and from this process's
+    local cache. Returns the number of redis keys deleted."""
+    invalidate_local_cache_tags(tags)
+    return await invalidate_redis_cache_tags(r, tags)
+
+
+def invalidate_local_cache_tags(tags: Sequence[str]) -> None:
+    """Delete the entries for `tags` from this process's local cache."""
+    local_cache = PCAPIsConfig.from_environment().get_local_cache()
+    if local_cache:
+        local_cache.invalidate_tags(tags)
+
+
+async def invalidate_redis_cache_tags(r: Redis, tags: Sequence[str]) -> int:
+    """Delete the cache entries for `tags` from redis. Returns the number of
+    keys deleted.
+
+    Tag sets are scanned and their keys unlinked in batches, so that large
+    sets don't block redis."""
+    deleted = 0
+    for tag in tags:
+        tag_key = f"{CACHE_TAG_KEY_PREFIX}:{tag}"
+        batch: List[bytes] = []
+        async for member, _ in r.zscan_iter(tag_key, count=CACHE_TAG_SCAN_COUNT):
+            batch.append(member)
+            if len(batch) >= CACHE_TAG_SCAN_COUNT:
+                deleted += await _unlink_tagged(r, tag_key, batch)
+                batch = []
+        if batch:
+            deleted += await _unlink_tagged(r, tag_key, batch)
+    return deleted
+
+
+async def _unlink_tagged(r: Redis, tag_key: str, members: List[bytes]) -> int:
+    cache_keys = [
+        key.decode("utf-8") if isinstance(key, bytes) else key for key in members
+    ]
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.unlink(
+            *cache_keys,
+            *(f"{CACHE_FRESH_KEY_PREFIX}:{key}" for key in cache_keys),
+        )
+        # Keys tagged since the set was scanned stay in it
+        pipe.zrem(tag_key, *members)
+        unlinked, _ = await pipe.execute()
+    return unlinked
@@ -1,11 +1,18 @@
+import asyncio
+import logging
 import os
-from threading import Lock
+from abc import ABC, abstractmethod
+from threading import Event, Lock, Thread
+from types import MappingProxyType
 from typing import (
     Any,
+    Awaitable,
     Callable,
     Dict,
     Generic,
     Iterable,
+    List,
+    Mapping,
     Optional,
     Set,
     Tuple,
@@ -18,7 +25,13 @@ import orjson
 from azure.core.credentials import AzureNamedKeyCredential
 from azure.core.exceptions import ResourceNotFoundError
 from azure.data.tables import TableClient, TableEntity, TableServiceClient
+from azure.data.tables.aio import TableClient as AsyncTableClient
+from azure.data.tables.aio import TableServiceClient as AsyncTableServiceClient
 from azure.identity import AzureCliCredential, ManagedIdentityCredential
+from azure.identity.aio import AzureCliCredential as AsyncAzureCliCredential
+from azure.identity.aio import (
+    ManagedIdentityCredential as AsyncManagedIdentityCredential,
+)
 from cachetools import Cache, TTLCache, cachedmethod
 from cachetools.keys import hashkey
 from pydantic import BaseModel
@@ -29,8 +42,14 @@ from pccommon.constants import (
     DEFAULT_TTL,
     IP_EXCEPTION_PARTITION_KEY,
 )
+from pccommon.inflight import InflightTasks
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar("T", bound="TableService")
+AT = TypeVar("AT", bound="AsyncTableService")
+R = TypeVar("R")
+S = TypeVar("S")
 M = TypeVar("M", bound=BaseModel)
 V = TypeVar("V", int, str, bool, float)
 
@@ -55,6 +74,49 @@ def decode_dict(s: str) -> Dict[str, Any]:
     return orjson.loads(s)
 
 
+def _table_account_url(account_name: str, account_url: Optional[str]) -> str:
+    # Check if the environment is configured to use Azurite, in which case
+    # the Azurite account key is used. Otherwise, we must use a workload identity.
+    if account_url:
+        if not account_url.startswith("http://azurite:"):
+            raise ValueError(
+                "Non-azurite account url provided. "
+                "Account keys can only be used with Azurite emulator."
+            )
+        return account_url
+    return f"https://{account_name}.table.core.windows.net"
+
+
+def _parse_model(
+    model: Type[M], entity: Dict[str, Any], partition_key: str, row_key: str
+) -> M:
+    data: Any = entity.get("Data")
+    if not data:
+        raise TableError(
+            "Data column expected but not found. "
+            f"partition_key={partition_key} row_key={row_key}"
+        )
+    if not isinstance(data, str):
+        raise TableError(
+            "Data column must be a string. "
+            f"partition_key={partition_key} row_key={row_key}"
+        )
+    return model(**decode_dict(data))
+
+
+def _parse_value(value_type: Type[V], entity: TableEntity) -> V:
+    partition_key = entity.get("PartitionKey")
+    row_key = entity.get("RowKey")
+    value = entity.get("Value")
+    if value is None:
+        raise TableError(
+            "Value column expected but not found. "
+            f"partition_key={partition_key} row_key={row_key}"
+        )
+
+    return value_type(value)
+
+
 class TableService:
     def __init__(
         self,
@@ -103,16 +165,8 @@ class TableService:
                 AzureNamedKeyCredential, ManagedIdentityCredential, AzureCliCredential
             ]
 
-            # Check if the environment is configured to use Azurite and use that key.
-            # Otherwise, we must use a workload identity.
+            url = _table_account_url(_account, _url)
             if _url:
-                if not _url.startswith("http://azurite:"):
-                    raise ValueError(
-                        "Non-azurite account url provided. "
-                        "Account keys can only be used with Azurite emulator."
-                    )
-
-                url = _url
                 credential = AzureNamedKeyCredential(
                     name=_account, key=AZURITE_ACCOUNT_KEY
                 )
@@ -124,8 +178,6 @@ class TableService:
                     else AzureCliCredential()
                 )
 
-                url = f"https://{_account}.table.core.windows.net"
-
             table_service_client = TableServiceClient(
                 endpoint=url, credential=credential
             )
@@ -138,24 +190,81 @@ class TableService:
         return cls(_get_clients, ttl=ttl)
 
 
+class TableSnapshot(ABC, Generic[S]):
+    """An in-memory snapshot built from a table.
+
+    The table is read when the snapshot is started, and re-read in a background
+    thread every `refresh_seconds`. Each read builds a new immutable snapshot
+    which replaces the previous one, so lookups never touch the network or see
+    a partially loaded table. If a refresh fails, the previous snapshot is kept;
+    until a load succeeds, `loaded` is False and callers fall back to reading
+    the table.
+    """
+
+    # Names the snapshot in logs
+    name = "table"
+
+    def __init__(self, refresh_seconds: int) -> None:
+        self._refresh_seconds = refresh_seconds
+        self._snapshot: Optional[S] = None
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @abstractmethod
+    def _read(self) -> S:
+        pass
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def load(self) -> None:
+        self._snapshot = self._read()
+
+    def start(self) -> None:
+        """Load the table, and start refreshing it in the background."""
+        if self._thread is not None:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            # Lookups read from the table until a refresh succeeds
+            logger.error(f"Error loading {self.name}: {e}")
+        self._stop.clear()
+        self._thread = Thread(
+            target=self._refresh_forever,
+            name=f"{self.name.replace(' ', '-')}-refresh",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def refresh(self) -> None:
+        """Reload the table, keeping the current snapshot on failure."""
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Error refreshing {self.name}: {e}")
+
+    def _refresh_forever(self) -> None:
+        while not self._stop.wait(self._refresh_seconds):
+            self.refresh()
+
+    def _get_snapshot(self) -> S:
+        assert self._snapshot is not None, f"{self.name} not loaded"
+        return self._snapshot
+
+
 class ModelTableService(Generic[M], TableService):
     _model: Type[M]
 
     def _parse_model(
         self, entity: Dict[str, Any], partition_key: str, row_key: str
     ) -> M:
-        data: Any = entity.get("Data")
-        if not data:
-            raise TableError(
-                "Data column expected but not found. "
-                f"partition_key={partition_key} row_key={row_key}"
-            )
-        if not isinstance(data, str):
-            raise TableError(
-                "Data column must be a string. "
-                f"partition_key={partition_key} row_key={row_key}"
-            )
-        return self._model(**decode_dict(data))
+        return _parse_model(self._model, entity, partition_key, row_key)
 
     def insert(self, partition_key: str, row_key: str, entity: M) -> None:
         with self as table_client:
@@ -208,9 +317,32 @@ class ModelTableService(Generic[M], TableService):
         lock=lambda self: self._cache_lock,
         key=lambda _: "getall",
     )
-    def get_all(self) -> Iterable[Tuple[Optional[str], Optional[str], M]]:
+    def get_all(self) -> Mapping[str, M]:
+        """All entities in the default partition, parsed and keyed by row key.
+
+        The result is cached as a read-only mapping, so it can be shared by
+        every caller until the cache expires.
+        """
+        return MappingProxyType(
+            {
+                row_key: model
+                for _, row_key, model in self._query_all()
+                if row_key is not None
+            }
+        )
+
+    def _query_all(
+        self, partition_key: Optional[str] = ""
+    ) -> Iterable[Tuple[Optional[str], Optional[str], M]]:
+        """Read all entities in a partition, or in every partition if
+        `partition_key` is None, bypassing the cache."""
         with self as table_client:
-            for entity in table_client.query_entities("PartitionKey eq ''"):
+            entities = (
+                table_client.list_entities()
+                if partition_key is None
+                else table_client.query_entities(f"PartitionKey eq '{partition_key}'")
+            )
+            for entity in entities:
                 partition_key, row_key = entity.get("PartitionKey"), entity.get(
                     "RowKey"
                 )
@@ -225,16 +357,7 @@ class ValueTableService(Generic[V], TableService):
     _type: Type[V]
 
     def _parse_value(self, entity: TableEntity) -> V:
-        partition_key = entity.get("PartitionKey")
-        row_key = entity.get("RowKey")
-        value = entity.get("Value")
-        if value is None:
-            raise TableError(
-                "Value column expected but not found. "
-                f"partition_key={partition_key} row_key={row_key}"
-            )
-
-        return self._type(value)
+        return _parse_value(self._type, entity)
 
     def insert(self, partition_key: str, row_key: str, value: V) -> None:
         self._ensure_table_client()
@@ -301,11 +424,234 @@ class IPExceptionListTable(ValueTableService[str]):
         super().__init__(get_clients, ttl)
 
     def add_exception(self, ip: str) -> None:
+        """Add an IP address or CIDR range, e.g. 10.0.0.0/24."""
+        # "/" isn't allowed in row keys; the range is read from the value
+        row_key = ip.replace("/", "_")
         with self:
-            self.upsert(partition_key=IP_EXCEPTION_PARTITION_KEY, row_key=ip, value=ip)
+            self.upsert(
+                partition_key=IP_EXCEPTION_PARTITION_KEY, row_key=row_key, value=ip
+            )
 
     @cachedmethod(lambda self: self._cache, key=lambda _: hashkey("ip_exceptions"))
     def get_exceptions(self) -> Set[str]:
         """Returns a set of IP addresses that are not subject to rate limiting."""
+        return self.read_exceptions()
+
+    def read_exceptions(self) -> Set[str]:
+        """Returns the IP addresses and CIDR ranges that are not subject to rate
+        limiting, bypassing the cache."""
         with self:
             return set(self.get_all_values())
+
+
+class BannedIPTable(TableService):
+    """The IPs banned for excessive reads, maintained by the pcfuncs ipban
+    function. Each IP is stored as both the partition and row key."""
+
+    def read_banned_ips(self) -> Set[str]:
+        with self as table_client:
+            return {
+                entity["RowKey"]
+                for entity in table_client.list_entities(select=["RowKey"])
+            }
+
+
+AsyncCredential = Union[
+    AzureNamedKeyCredential, AsyncManagedIdentityCredential, AsyncAzureCliCredential
+]
+AsyncClients = Tuple[AsyncTableServiceClient, AsyncTableClient, AsyncCredential]
+
+
+async def _close_clients(clients: AsyncClients) -> None:
+    service_client, table_client, credential = clients
+    await table_client.close()
+    await service_client.close()
+    if not isinstance(credential, AzureNamedKeyCredential):
+        await credential.close()
+
+
+async def _close_stale(clients: AsyncClients) -> None:
+    try:
+        await _close_clients(clients)
+    except Exception as e:
+        logger.warning(f"Error closing table clients of a previous loop: {e}")
+
+
+class AsyncTableService:
+    """Read-only access to a table from the event loop.
+
+    Unlike `TableService`, which opens new clients for every use, the service
+    client and its credential are created on first use and kept open, so
+    lookups reuse pooled connections and access tokens. The clients are bound
+    to the event loop they were created on, and are recreated when used from
+    another loop, closing the previous ones. Call `close` on shutdown.
+    """
+
+    def __init__(
+        self,
+        get_clients: Callable[[], AsyncClients],
+        ttl: Optional[int] = None,
+    ) -> None:
+        self._get_clients = get_clients
+        self._clients: Optional[AsyncClients] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: "Optional[asyncio.Future[None]]" = None
+        self._cache: Cache = TTLCache(maxsize=1024, ttl=ttl or DEFAULT_TTL)
+        self._inflight: InflightTasks[Any] = InflightTasks()
+
+    def _table_client(self) -> AsyncTableClient:
+        loop = asyncio.get_running_loop()
+        if self._clients is None or self._loop is not loop:
+            previous, previous_loop = self._clients, self._loop
+            self._clients = self._get_clients()
+            self._loop = loop
+            if previous is not None:
+                self._close_previous(previous, previous_loop)
+        return self._clients[1]
+
+    def _close_previous(
+        self, clients: AsyncClients, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """Close clients left behind by another loop, on that loop if it's
+        still running, so their connections aren't leaked."""
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(_close_stale(clients), loop)
+        else:
+            self._closing = asyncio.ensure_future(_close_stale(clients))
+
+    async def _cached(self, key: str, fn: Callable[[], Awaitable[R]]) -> R:
+        """Return the cached value for `key`, or read it with `fn`. Concurrent
+        misses for the same key share a single read."""
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        task = self._inflight.get_or_start(key, lambda: self._fill(key, fn))
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, fn: Callable[[], Awaitable[R]]) -> R:
+        value = await fn()
+        self._cache[key] = value
+        return value
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, None
+        if clients is None:
+            return
+        await _close_clients(clients)
+
+    @classmethod
+    def from_environment(
+        cls: Type[AT],
+        account_name: str,
+        table_name: str,
+        account_url: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> AT:
+        def _get_clients(
+            _account: str = account_name,
+            _table: str = table_name,
+            _url: Optional[str] = account_url,
+        ) -> AsyncClients:
+            credential: AsyncCredential
+
+            url = _table_account_url(_account, _url)
+            if _url:
+                credential = AzureNamedKeyCredential(
+                    name=_account, key=AZURITE_ACCOUNT_KEY
+                )
+            else:
+                client_id = os.environ.get("AZURE_CLIENT_ID")
+                credential = (
+                    AsyncManagedIdentityCredential(client_id=client_id)
+                    if client_id
+                    else AsyncAzureCliCredential()
+                )
+
+            table_service_client = AsyncTableServiceClient(
+                endpoint=url, credential=credential
+            )
+
+            return (
+                table_service_client,
+                table_service_client.get_table_client(table_name=_table),
+                credential,
+            )
+
+        return cls(_get_clients, ttl=ttl)
+
+
+class AsyncModelTableService(Generic[M], AsyncTableService):
+    _model: Type[M]
+
+    async def get(self, partition_key: str, row_key: str) -> Optional[M]:
+        async def _get() -> Optional[M]:
+            try:
+                entity = await self._table_client().get_entity(
+                    partition_key=partition_key, row_key=row_key
+                )
+            except ResourceNotFoundError:
+                return None
+            return _parse_model(self._model, entity, partition_key, row_key)
+
+        return await self._cached(f"get_{partition_key}_{row_key}", _get)
+
+    async def get_all(self) -> Mapping[str, M]:
+        """All entities in the default partition, parsed and keyed by row key."""
+
+        async def _get_all() -> Mapping[str, M]:
+            models: Dict[str, M] = {}
+            async for entity in self._table_client().query_entities(
+                "PartitionKey eq ''"
+            ):
+                row_key = entity.get("RowKey")
+                if row_key is not None:
+                    models[row_key] = _parse_model(self._model, entity, "", row_key)
+            return MappingProxyType(models)
+
+        return await self._cached("getall", _get_all)
+
+
+class AsyncValueTableService(Generic[V], AsyncTableService):
+    _type: Type[V]
+
+    async def get(self, partition_key: str, row_key: str) -> Optional[V]:
+        async def _get() -> Optional[V]:
+            try:
+                entity = await self._table_client().get_entity(
+                    partition_key=partition_key, row_key=row_key
+                )
+            except ResourceNotFoundError:
+                return None
+            return _parse_value(self._type, entity)
+
+        return await self._cached(f"get_{partition_key}_{row_key}", _get)
+
+    async def get_all_values(self) -> List[V]:
+        async def _get_all_values() -> List[V]:
+            return [
+                _parse_value(self._type, entity)
+                async for entity in self._table_client().list_entities()
+            ]
+
+        return await self._cached("getall", _get_all_values)
+
+
+class AsyncIPExceptionListTable(AsyncValueTableService[str]):
+    _type = str
+
+    def __init__(
+        self,
+        get_clients: Callable[[], AsyncClients],
+        ttl: Optional[int] = None,
+    ) -> None:
+        super().__init__(get_clients, ttl)
+        self._cache = TTLCache(maxsize=10, ttl=ttl or DEFAULT_IP_EXCEPTIONS_TTL)
+
+    async def get_exceptions(self) -> Set[str]:
+        """Returns a set of IP addresses that are not subject to rate limiting."""
+
+        async def _get_exceptions() -> Set[str]:
+            return set(await self.get_all_values())
+
+        return await self._cached("ip_exceptions", _get_exceptions)
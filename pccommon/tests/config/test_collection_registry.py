@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import Any, Iterable
+
+import orjson
+
+from pccommon.config.collections import CollectionConfig, CollectionConfigRegistry
+
+from ..conftest import FakeTable
+
+CONFIG_FILE = Path(__file__).parent.parent / "data-files" / "collection_config.json"
+
+
+def make_table() -> FakeTable:
+    configs = orjson.loads(CONFIG_FILE.read_bytes())
+    return FakeTable(
+        ("", id, CollectionConfig(**config)) for id, config in configs.items()
+    )
+
+
+def test_registry_serves_snapshot() -> None:
+    table = make_table()
+    registry = CollectionConfigRegistry(table, refresh_seconds=60)  # type: ignore
+    assert not registry.loaded
+
+    registry.load()
+    assert registry.get("3dep-seamless") is not None
+    assert registry.get("missing") is None
+    assert len(registry.get_all()) == len(table.rows)
+    assert table.reads == 1
+
+
+def test_registry_keeps_snapshot_on_failed_refresh() -> None:
+    table = make_table()
+    registry = CollectionConfigRegistry(table, refresh_seconds=60)  # type: ignore
+    registry.load()
+    snapshot = registry.get_all()
+
+    def _fail() -> Iterable[Any]:
+        raise ConnectionError("table unavailable")
+
+    table._query_all = _fail  # type: ignore
+    registry.refresh()
+    assert registry.get_all() is snapshot
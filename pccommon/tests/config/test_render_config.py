@@ -118,3 +118,27 @@ def test_render_config_defaults_format_png() -> None:
 
     parsed = config.get_render_params()
     assert "format=png" in parsed
+
+
+def test_read_tuning_gdal_env() -> None:
+    config = DefaultRenderConfig.model_validate(
+        {
+            "render_params": {},
+            "minzoom": 8,
+            "read_tuning": {
+                "vsiCacheSize": 0,
+                "httpMultiplex": False,
+                "chunkSize": 65536,
+                "overviewBias": 1,
+            },
+        }
+    )
+
+    assert config.read_tuning is not None
+    assert config.read_tuning.overview_bias == 1
+    assert config.read_tuning.get_gdal_env() == {
+        "VSI_CACHE": "FALSE",
+        "VSI_CACHE_SIZE": "0",
+        "GDAL_HTTP_MULTIPLEX": "NO",
+        "CPL_VSIL_CURL_CHUNK_SIZE": "65536",
+    }
@@ -0,0 +1,136 @@
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import pytest
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis client methods used by the
+    caches and rate limits."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.gets: List[str] = []
+        self.pipelined: List[List[str]] = []
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.gets.append(key)
+        return self.data.get(key)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+    ) -> Optional[bool]:
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def mget(self, *keys: str) -> List[Optional[Any]]:
+        self.gets.extend(keys)
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def evalsha(
+        self,
+        sha: str,
+        numkeys: int,
+        rate_key: str,
+        back_pressure_key: str,
+        limit: str,
+        back_pressure_limit: str,
+        expire_time: str,
+    ) -> List[int]:
+        current = self.data.get(rate_key, 0)
+        if current + 1 > int(limit):
+            return [int(expire_time), 0]
+        self.data[rate_key] = current + 1
+        self.data[back_pressure_key] = self.data.get(back_pressure_key, 0) + 1
+        return [0, max(0, self.data[back_pressure_key] - int(back_pressure_limit))]
+
+    async def incrby(self, key: str, amount: int) -> int:
+        self.data[key] = self.data.get(key, 0) + amount
+        return self.data[key]
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return key in self.data
+
+    async def eval(
+        self, script: str, numkeys: int, key: str, member: str, expires: str, now: str
+    ) -> None:
+        # The tag script: a sorted set of keys scored by expiry
+        tagged: Dict[bytes, float] = self.data.setdefault(key, {})
+        tagged[member.encode()] = float(expires)
+        for expired in [m for m, score in tagged.items() if score <= float(now)]:
+            del tagged[expired]
+
+    async def zscan_iter(
+        self, key: str, count: int
+    ) -> AsyncIterator[Tuple[bytes, float]]:
+        for item in list(self.data.get(key, {}).items()):
+            yield item
+
+    async def zrem(self, key: str, *members: bytes) -> int:
+        tagged = self.data.get(key, {})
+        return sum(1 for m in members if tagged.pop(m, None) is not None)
+
+    async def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if key in self.data)
+
+    async def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    unlink = delete
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: List[Any] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        def _queue(*args: Any, **kwargs: Any) -> "FakePipeline":
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self) -> List[Any]:
+        self.redis.pipelined.append([name for name, _, _ in self.commands])
+        return [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
+class FakeTable:
+    """Stand-in for the table a `TableSnapshot` is read from."""
+
+    def __init__(
+        self, rows: Iterable[Tuple[Optional[str], Optional[str], Any]]
+    ) -> None:
+        self.rows = list(rows)
+        self.reads = 0
+
+    def _query_all(
+        self, partition_key: Optional[str] = None
+    ) -> Iterable[Tuple[Optional[str], Optional[str], Any]]:
+        assert partition_key is None
+        self.reads += 1
+        yield from self.rows
+
+
+@pytest.fixture
+def redis() -> FakeRedis:
+    return FakeRedis()
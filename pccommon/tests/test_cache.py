@@ -0,0 +1,66 @@
+import time
+
+from pccommon.cache import LocalCache, LocalCacheConfig
+
+
+def test_local_cache_only_caches_configured_prefixes() -> None:
+    cache = LocalCache({"/collections": LocalCacheConfig(maxsize=2, ttl=60)})
+
+    cache.set("/collections:test", b"{}")
+    cache.set("/search:abc:test", b"{}")
+
+    assert cache.get("/collections:test") == b"{}"
+    assert cache.get("/search:abc:test") is None
+
+
+def test_local_cache_uses_longest_matching_prefix() -> None:
+    cache = LocalCache(
+        {
+            "/collection": LocalCacheConfig(maxsize=1, ttl=60),
+            "/collections": LocalCacheConfig(maxsize=2, ttl=60),
+        }
+    )
+
+    cache.set("/collections:a", b"1")
+    cache.set("/collections:b", b"2")
+    cache.set("/collection:naip:a", b"3")
+    cache.set("/collection:landsat:a", b"4")
+
+    # Both /collections entries fit, only one /collection entry does
+    assert cache.get("/collections:a") == b"1"
+    assert cache.get("/collections:b") == b"2"
+    assert cache.get("/collection:naip:a") is None
+    assert cache.get("/collection:landsat:a") == b"4"
+
+
+def test_local_cache_expires_entries() -> None:
+    cache = LocalCache({"/collections": LocalCacheConfig(maxsize=2, ttl=1)})
+    cache.set("/collections:test", b"{}")
+    time.sleep(1.1)
+    assert cache.get("/collections:test") is None
+
+
+def test_local_cache_delete() -> None:
+    cache = LocalCache({"/collections": LocalCacheConfig()})
+    cache.set("/collections:test", b"{}")
+    cache.delete("/collections:test")
+    assert cache.get("/collections:test") is None
+
+
+def test_local_cache_invalidate_tags() -> None:
+    cache = LocalCache({"/collections": LocalCacheConfig(maxsize=3, ttl=60)})
+    cache.set("/collections:a", b"1", ["a"])
+    cache.set("/collections:b", b"2", ["a", "b"])
+    cache.set("/collections:c", b"3", ["b"])
+
+    cache.invalidate_tags(["b"])
+    assert cache.get("/collections:a") == b"1"
+    assert cache.get("/collections:b") is None
+    assert cache.get("/collections:c") is None
+
+
+def test_local_cache_prunes_evicted_tagged_keys() -> None:
+    cache = LocalCache({"/collections": LocalCacheConfig(maxsize=2, ttl=60)})
+    for i in range(100):
+        cache.set(f"/collections:{i}", b"{}", ["a"])
+    assert cache._tagged_count <= cache._max_tagged == 8
@@ -0,0 +1,74 @@
+from typing import List, Optional, Tuple
+
+import pytest
+
+from pccommon.cdn import BlobCDN, split_blob_href
+from pccommon.config.containers import ContainerCdnIndex, ContainerConfig
+from pccommon.config.core import PCAPIsConfig
+
+from .conftest import FakeTable
+
+HREF = "https://naipeuwest.blob.core.windows.net/naip/v002/al/2019/image.tif"
+CDN_HREF = "https://naipeuwest.azureedge.net/naip/v002/al/2019/image.tif"
+
+
+@pytest.fixture
+def cdn_index(monkeypatch: pytest.MonkeyPatch) -> ContainerCdnIndex:
+    table = FakeTable(
+        [
+            ("naipeuwest", "naip", ContainerConfig(has_cdn=True)),
+            ("naipeuwest", "naip-index", ContainerConfig(has_cdn=False)),
+        ]
+    )
+    index = ContainerCdnIndex(table, refresh_seconds=60)  # type: ignore
+    index.load()
+    monkeypatch.setattr(PCAPIsConfig, "get_container_cdn_index", lambda self: index)
+    return index
+
+
+def test_split_blob_href() -> None:
+    parts = split_blob_href(HREF)
+    assert parts is not None
+    host_start, host_end, storage_account, container = parts
+    assert HREF[host_start:host_end] == "naipeuwest.blob.core.windows.net"
+    assert (storage_account, container) == ("naipeuwest", "naip")
+
+    assert split_blob_href("https://example.com/naip/image.tif") is None
+    assert split_blob_href("s3://bucket/image.tif") is None
+    assert split_blob_href("image.tif") is None
+
+
+def test_cdn_host_lookup(cdn_index: ContainerCdnIndex) -> None:
+    get_cdn_host = BlobCDN.cdn_host_lookup()
+    assert get_cdn_host("naipeuwest", "naip") == "naipeuwest.azureedge.net"
+    assert get_cdn_host("naipeuwest", "naip-index") is None
+    assert get_cdn_host("other", "naip") is None
+
+
+def test_transform_if_available(cdn_index: ContainerCdnIndex) -> None:
+    assert BlobCDN.transform_if_available(HREF) == CDN_HREF
+    no_cdn = "https://naipeuwest.blob.core.windows.net/naip-index/a.parquet"
+    assert BlobCDN.transform_if_available(no_cdn) == no_cdn
+    other = "https://example.com/naip/image.tif"
+    assert BlobCDN.transform_if_available(other) == other
+
+
+def test_transform_with_host_lookup() -> None:
+    lookups: List[Tuple[str, str]] = []
+
+    def get_cdn_host(storage_account: str, container: str) -> Optional[str]:
+        lookups.append((storage_account, container))
+        return "cdn.example.com"
+
+    assert BlobCDN.transform_all_if_available([HREF], get_cdn_host) == [
+        "https://cdn.example.com/naip/v002/al/2019/image.tif"
+    ]
+    assert lookups == [("naipeuwest", "naip")]
+
+
+def test_transform_items(cdn_index: ContainerCdnIndex) -> None:
+    item = {"id": "a", "assets": {"image": {"href": HREF, "type": "image/tiff"}}}
+
+    [transformed] = BlobCDN.transform_items([item])
+    assert transformed["assets"]["image"] == {"href": CDN_HREF, "type": "image/tiff"}
+    assert item["assets"]["image"]["href"] == HREF  # type: ignore
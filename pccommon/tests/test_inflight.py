@@ -0,0 +1,35 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from pccommon.inflight import InflightTasks
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_task() -> None:
+    inflight: InflightTasks[int] = InflightTasks()
+    calls: List[int] = []
+
+    async def compute() -> int:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    tasks = [inflight.get_or_start("k", compute) for _ in range(3)]
+    assert await asyncio.gather(*tasks) == [1, 1, 1]
+    assert inflight.get("k") is None
+
+    assert await inflight.get_or_start("k", compute) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_task_is_released() -> None:
+    inflight: InflightTasks[int] = InflightTasks()
+
+    async def fail() -> int:
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await inflight.start("k", fail())
+    assert inflight.get("k") is None
@@ -0,0 +1,77 @@
+from typing import Iterable
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pccommon.config.core import PCAPIsConfig
+from pccommon.ipfilter import IPMatcher, IPMatcherSnapshot
+from pccommon.middleware import BannedIPMiddleware
+
+
+def test_matches_exact_ips() -> None:
+    matcher = IPMatcher(["10.0.0.1", "2001:db8::1"])
+    assert "10.0.0.1" in matcher
+    assert "2001:db8::1" in matcher
+    assert "10.0.0.2" not in matcher
+    assert "2001:db8::2" not in matcher
+    assert len(matcher) == 2
+
+
+def test_matches_cidr_ranges() -> None:
+    matcher = IPMatcher(["192.168.0.0/16", "10.1.2.0/24", "2001:db8::/32"])
+    assert "192.168.255.1" in matcher
+    assert "10.1.2.200" in matcher
+    assert "10.1.3.1" not in matcher
+    assert "2001:db8:1234::1" in matcher
+    assert "2001:db9::1" not in matcher
+
+
+def test_matches_ipv4_mapped_addresses() -> None:
+    matcher = IPMatcher(["10.0.0.0/8"])
+    assert "::ffff:10.1.2.3" in matcher
+
+
+def test_ignores_invalid_entries() -> None:
+    matcher = IPMatcher(["not-an-ip", "10.0.0.1"])
+    assert len(matcher) == 1
+    assert "10.0.0.1" in matcher
+    assert "" not in matcher
+    assert "not-an-ip" not in matcher
+
+
+def test_snapshot_keeps_matcher_on_failed_refresh() -> None:
+    networks = ["10.0.0.0/8"]
+
+    def _read() -> Iterable[str]:
+        if not networks:
+            raise ConnectionError("table unavailable")
+        return networks
+
+    snapshot = IPMatcherSnapshot("test ips", _read, refresh_seconds=60)
+    assert not snapshot.loaded
+    snapshot.load()
+    assert snapshot.matches("10.2.3.4")
+
+    networks.clear()
+    snapshot.refresh()
+    assert snapshot.matches("10.2.3.4")
+
+
+def test_banned_ips_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    banned_ips = IPMatcherSnapshot(
+        "banned ips", lambda: ["10.0.0.1"], refresh_seconds=60
+    )
+    banned_ips.load()
+    monkeypatch.setattr(PCAPIsConfig, "get_banned_ip_matcher", lambda self: banned_ips)
+
+    app = FastAPI()
+    app.add_middleware(BannedIPMiddleware)
+
+    @app.get("/")
+    def _root() -> str:
+        return "ok"
+
+    client = TestClient(app)
+    assert client.get("/", headers={"X-Forwarded-For": "10.0.0.1"}).status_code == 403
+    assert client.get("/", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
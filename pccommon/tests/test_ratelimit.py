@@ -0,0 +1,81 @@
+import pytest
+
+from pccommon import ratelimit
+from pccommon.constants import LOCAL_RATE_LIMIT_IDLE_SECONDS
+from pccommon.ratelimit import LocalRateLimiter
+
+from .conftest import FakeRedis
+
+
+def test_local_rate_limit() -> None:
+    limiter = LocalRateLimiter(sync_ms=1000)
+
+    assert limiter.check("/search", "10.0.0.1", 2, 1) == (0, 0)
+    assert limiter.check("/search", "10.0.0.1", 2, 1) == (0, 1)
+    pexpire, _ = limiter.check("/search", "10.0.0.1", 2, 1)
+    assert pexpire > 0
+
+    # Limits are per route and IP
+    assert limiter.check("/search", "10.0.0.2", 2, 1) == (0, 0)
+    assert limiter.check("/collections", "10.0.0.1", 2, 1) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_local_rate_limit_sync(redis: FakeRedis) -> None:
+    a = LocalRateLimiter(sync_ms=1000)
+    b = LocalRateLimiter(sync_ms=1000)
+
+    a.check("/search", "10.0.0.1", 10, 10)
+    b.check("/search", "10.0.0.1", 10, 10)
+    await a.sync(redis)  # type: ignore
+    await b.sync(redis)  # type: ignore
+    assert redis.data["ratesync::/search:10.0.0.1"] == 2
+
+    # Requests served by other processes are taken from the local bucket
+    for _ in range(8):
+        b.check("/search", "10.0.0.1", 10, 10)
+    await b.sync(redis)  # type: ignore
+    await a.sync(redis)  # type: ignore
+    assert redis.data["ratesync::/search:10.0.0.1"] == 10
+    pexpire, _ = a.check("/search", "10.0.0.1", 10, 10)
+    assert pexpire > 0
+
+
+@pytest.mark.asyncio
+async def test_local_rate_limit_drops_idle_buckets(
+    monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now)
+    limiter = LocalRateLimiter(sync_ms=1000)
+
+    # A bucket in steady use outlives the idle timeout
+    for _ in range(3 * LOCAL_RATE_LIMIT_IDLE_SECONDS):
+        now += 1
+        assert limiter.check("/search", "10.0.0.1", 1, 1) == (0, 0)
+        pexpire, _ = limiter.check("/search", "10.0.0.1", 1, 1)
+        assert pexpire > 0
+    limiter.check("/search", "10.0.0.2", 10, 10)
+
+    # Idle buckets are dropped, once their requests are added to redis
+    now += LOCAL_RATE_LIMIT_IDLE_SECONDS
+    await limiter.sync(redis)  # type: ignore
+    assert redis.data["ratesync::/search:10.0.0.1"] == 3 * LOCAL_RATE_LIMIT_IDLE_SECONDS
+    assert redis.data["ratesync::/search:10.0.0.2"] == 1
+    assert not limiter._buckets
+    assert limiter.check("/search", "10.0.0.1", 1, 1) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_local_rate_limit_stop_sync(redis: FakeRedis) -> None:
+    limiter = LocalRateLimiter(sync_ms=60000)
+    limiter.start_sync(redis)  # type: ignore
+    task = limiter._sync_task
+    assert task is not None
+
+    # Requests served since the last sync are added to redis on shutdown
+    limiter.check("/search", "10.0.0.1", 10, 10)
+    await limiter.stop_sync(redis)  # type: ignore
+    assert task.cancelled()
+    assert limiter._sync_task is None
+    assert redis.data["ratesync::/search:10.0.0.1"] == 1
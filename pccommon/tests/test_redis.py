@@ -0,0 +1,564 @@
+import asyncio
+import gzip
+from typing import Any, Dict, Optional, Set
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+
+import pccommon.redis
+from pccommon.cache import LocalCache, LocalCacheConfig
+from pccommon.config.core import PCAPIsConfig
+from pccommon.redis import (
+    _accepts_gzip,
+    _refresh,
+    cache_error,
+    cached_response,
+    cached_result,
+    fill_cache,
+    get_cached_error,
+    invalidate_cache_tags,
+    queue_cache_tags,
+    register_cache_href,
+    stac_change_tags,
+    stac_collection_tag,
+    stac_item_tag,
+    throttle,
+    tiler_item_cache_key,
+)
+
+from .conftest import FakeRedis
+
+
+def make_request(
+    redis: Optional[FakeRedis],
+    host: str = "test",
+    headers: Optional[Dict[str, str]] = None,
+) -> Request:
+    headers = {"x-forwarded-for": "10.0.0.1", **(headers or {})}
+    app = FastAPI()
+    app.state.redis = redis
+    app.state.service_name = "test"
+    app.state.redis_throttle_script_hash = "throttle"
+    return Request(
+        {
+            "type": "http",
+            "app": app,
+            "method": "GET",
+            "scheme": "http",
+            "server": (host, 80),
+            "path": "/",
+            "query_string": b"",
+            "headers": [(b"host", host.encode())]
+            + [(k.encode(), v.encode()) for k, v in headers.items()],
+        }
+    )
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def fetch(self) -> Dict[str, Any]:
+        self.calls += 1
+        return {"calls": self.calls}
+
+    async def slow_fetch(self) -> Dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"calls": self.calls}
+
+
+@pytest.fixture
+def local_cache(monkeypatch: pytest.MonkeyPatch) -> LocalCache:
+    cache = LocalCache({"/collections": LocalCacheConfig(maxsize=8, ttl=60)})
+    monkeypatch.setattr(PCAPIsConfig, "get_local_cache", lambda self: cache)
+    return cache
+
+
+@pytest.fixture
+def no_local_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(PCAPIsConfig, "get_local_cache", lambda self: None)
+
+
+@pytest.mark.asyncio
+async def test_cached_result_reads_from_redis(
+    no_local_cache: None, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 1}
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 1}
+    assert counter.calls == 1
+    assert "/collections:test" in redis.data
+
+
+@pytest.mark.asyncio
+async def test_cached_result_local_cache_skips_redis(
+    local_cache: LocalCache, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    await cached_result(counter.fetch, "/collections", request)
+    redis.gets.clear()
+
+    result = await cached_result(counter.fetch, "/collections", request)
+    assert result == {"calls": 1}
+    assert redis.gets == []
+
+    # Each hit is an independent copy of the cached value
+    result["calls"] = 100
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 1}
+
+
+@pytest.mark.asyncio
+async def test_cached_result_local_cache_filled_from_redis(
+    local_cache: LocalCache, redis: FakeRedis
+) -> None:
+    redis.data["/collections:test"] = b'{"calls": 0}'
+    request = make_request(redis)
+    counter = Counter()
+
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 0}
+    assert local_cache.get("/collections:test") == b'{"calls": 0}'
+    assert counter.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_result_read_only(
+    local_cache: LocalCache, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    await cached_result(counter.fetch, "/collections", request, read_only=True)
+    assert redis.data == {}
+    assert local_cache.get("/collections:test") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_result_coalesces_concurrent_misses(
+    no_local_cache: None, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    results = await asyncio.gather(
+        *[cached_result(counter.slow_fetch, "/collections", request) for _ in range(5)]
+    )
+
+    assert counter.calls == 1
+    assert all(r == {"calls": 1} for r in results)
+    # Callers don't share the same object
+    assert len({id(r) for r in results}) == 5
+
+
+@pytest.mark.asyncio
+async def test_cached_result_coalesced_errors_propagate(
+    no_local_cache: None, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    calls = 0
+
+    async def _fail() -> Dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        raise ValueError("not found")
+
+    results = await asyncio.gather(
+        *[cached_result(_fail, "/collections", request) for _ in range(3)],
+        return_exceptions=True,
+    )
+
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cached_result_waits_for_lock_holder(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    monkeypatch.setattr(PCAPIsConfig.from_environment(), "cache_lock_ms", 1000)
+    request = make_request(redis)
+    counter = Counter()
+
+    # Another process holds the lock and fills the cache shortly after
+    redis.data["lock::/collections:test"] = "1"
+
+    async def _other_process() -> None:
+        await asyncio.sleep(0.1)
+        redis.data["/collections:test"] = b'{"calls": 0}'
+        del redis.data["lock::/collections:test"]
+
+    result, _ = await asyncio.gather(
+        cached_result(counter.fetch, "/collections", request), _other_process()
+    )
+
+    assert result == {"calls": 0}
+    assert counter.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_result_serves_stale_and_refreshes(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    monkeypatch.setattr(PCAPIsConfig.from_environment(), "redis_soft_ttl", 60)
+    request = make_request(redis)
+    counter = Counter()
+
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 1}
+    assert "fresh::/collections:test" in redis.data
+
+    # Fresh hits don't refresh
+    await cached_result(counter.fetch, "/collections", request)
+    assert counter.calls == 1
+
+    # Stale hits return the stale value and refresh in the background
+    del redis.data["fresh::/collections:test"]
+    assert await cached_result(counter.slow_fetch, "/collections", request) == {
+        "calls": 1
+    }
+    await asyncio.sleep(0.1)
+    assert counter.calls == 2
+    assert await cached_result(counter.fetch, "/collections", request) == {"calls": 2}
+
+
+@pytest.mark.asyncio
+async def test_refresh_skipped_when_claimed_elsewhere(
+    monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    settings = PCAPIsConfig.from_environment()
+    monkeypatch.setattr(settings, "redis_soft_ttl", 60)
+    request = make_request(redis)
+    counter = Counter()
+
+    # Another process re-marked the entry as fresh and is refreshing it
+    redis.data["fresh::/collections:test"] = "1"
+    result = await _refresh(
+        counter.fetch,
+        "/collections:test",
+        request,
+        redis,  # type: ignore
+        None,
+        settings,
+        b'{"calls": 0}',
+    )
+    assert result == ({"calls": 0}, b'{"calls": 0}')
+    assert counter.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_response_returns_cached_bytes(
+    no_local_cache: None, redis: FakeRedis
+) -> None:
+    redis.data["/collections:test"] = b'{"calls":0}'
+    request = make_request(redis)
+    counter = Counter()
+
+    response = await cached_response(counter.fetch, "/collections", request)
+    assert response.body == b'{"calls":0}'
+    assert response.media_type == "application/json"
+    assert counter.calls == 0
+
+    # Misses serialize the result once and share the entry with cached_result
+    response = await cached_response(counter.fetch, "/collection:naip", request)
+    assert response.body == b'{"calls":1}'
+    assert await cached_result(counter.fetch, "/collection:naip", request) == {
+        "calls": 1
+    }
+
+
+@pytest.mark.asyncio
+async def test_cached_response_gzip_passthrough(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    monkeypatch.setattr(PCAPIsConfig.from_environment(), "cache_gzip_min_size", 1)
+    counter = Counter()
+
+    gzip_request = make_request(redis, headers={"accept-encoding": "gzip, br"})
+    response = await cached_response(counter.fetch, "/collections", gzip_request)
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == b'{"calls":1}'
+    assert redis.data["/collections:test"] == response.body
+
+    plain_request = make_request(redis)
+    response = await cached_response(counter.fetch, "/collections", plain_request)
+    assert "content-encoding" not in response.headers
+    assert response.body == b'{"calls":1}'
+
+    assert await cached_result(counter.fetch, "/collections", plain_request) == {
+        "calls": 1
+    }
+    assert counter.calls == 1
+
+
+def test_accepts_gzip() -> None:
+    assert _accepts_gzip("gzip")
+    assert _accepts_gzip("br;q=1.0, GZIP;q=0.5")
+    assert _accepts_gzip("*")
+    assert not _accepts_gzip("")
+    assert not _accepts_gzip("gzip;q=0")
+    assert not _accepts_gzip("gzip; q=0.000, *")
+    assert not _accepts_gzip("x-gzip, br")
+    assert not _accepts_gzip("*, gzip;q=0")
+
+
+@pytest.mark.asyncio
+async def test_cached_result_host_neutral(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    monkeypatch.setattr(PCAPIsConfig.from_environment(), "cache_host_neutral", True)
+    calls = 0
+
+    def _fetch_for(request: Request) -> Any:
+        async def _fetch() -> Dict[str, Any]:
+            nonlocal calls
+            calls += 1
+            return {
+                "links": [{"href": f"{request.base_url}collections/naip"}],
+                "assets": {"tilejson": {"href": f"http://{request.url.netloc}/data/"}},
+            }
+
+        return _fetch
+
+    public = make_request(redis, host="public.example.com")
+    internal = make_request(redis, host="stac")
+    for request in (public, internal):
+        register_cache_href(
+            request.app, "tiler", lambda r: f"http://{r.url.netloc}/data/"
+        )
+
+    await cached_result(_fetch_for(public), "/collection:naip", public)
+    assert list(redis.data) == ["/collection:naip"]
+    assert b"public.example.com" not in redis.data["/collection:naip"]
+
+    result = await cached_result(_fetch_for(internal), "/collection:naip", internal)
+    assert calls == 1
+    assert result == {
+        "links": [{"href": "http://stac/collections/naip"}],
+        "assets": {"tilejson": {"href": "http://stac/data/"}},
+    }
+
+    response = await cached_response(_fetch_for(public), "/collection:naip", public)
+    assert b"http://public.example.com/collections/naip" in response.body
+
+
+class NoIPExceptions:
+    async def get_exceptions(self) -> Set[str]:
+        return set()
+
+
+@pytest.fixture
+def no_ip_exceptions(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        PCAPIsConfig, "get_async_ip_exception_list_table", lambda self: NoIPExceptions()
+    )
+
+
+@throttle("/collections", max_req_per_sec=2, req_per_sec=100, inc_ms=1)
+async def _throttled_collections(request: Request, counter: Counter) -> Any:
+    return await cached_result(counter.fetch, "/collections", request)
+
+
+@pytest.mark.asyncio
+async def test_throttle_shares_round_trip_with_cache_read(
+    no_local_cache: None, no_ip_exceptions: None, redis: FakeRedis
+) -> None:
+    redis.data["/collections:test"] = b'{"calls": 0}'
+    counter = Counter()
+
+    result = await _throttled_collections(request=make_request(redis), counter=counter)
+    assert result == {"calls": 0}
+    assert redis.pipelined == [["evalsha", "get"]]
+    assert redis.data["rate::/collections:10.0.0.1"] == 1
+
+    await _throttled_collections(request=make_request(redis), counter=counter)
+    with pytest.raises(HTTPException) as exc_info:
+        await _throttled_collections(request=make_request(redis), counter=counter)
+    assert exc_info.value.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_throttle_checked_before_fetch(
+    no_local_cache: None, no_ip_exceptions: None, redis: FakeRedis
+) -> None:
+    redis.data["rate::/collections:10.0.0.1"] = 2
+    counter = Counter()
+
+    with pytest.raises(HTTPException):
+        await _throttled_collections(request=make_request(redis), counter=counter)
+    assert counter.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_throttle_applied_without_cache_read(
+    no_ip_exceptions: None, redis: FakeRedis
+) -> None:
+
+    @throttle("/search", max_req_per_sec=1, req_per_sec=100, inc_ms=1)
+    async def _uncached(request: Request) -> str:
+        return "ok"
+
+    assert await _uncached(request=make_request(redis)) == "ok"
+    assert redis.pipelined == [["evalsha"]]
+    with pytest.raises(HTTPException):
+        await _uncached(request=make_request(redis))
+
+
+@pytest.mark.asyncio
+async def test_invalidate_cache_tags(local_cache: LocalCache, redis: FakeRedis) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    await cached_result(
+        counter.fetch,
+        "/collections:naip",
+        request,
+        tags=[stac_collection_tag("naip")],
+    )
+    await cached_result(
+        counter.fetch, "/item:naip:a", request, tags=[stac_item_tag("naip", "a")]
+    )
+    await cached_result(
+        counter.fetch, "/item:naip:b", request, tags=[stac_item_tag("naip", "b")]
+    )
+
+    assert await invalidate_cache_tags(redis, stac_change_tags("naip", "a")) == 1  # type: ignore
+    assert "/item:naip:a:test" not in redis.data
+    assert "/item:naip:b:test" in redis.data
+    assert "/collections:naip:test" in redis.data
+
+    await invalidate_cache_tags(redis, stac_change_tags("naip"))  # type: ignore
+    assert "/collections:naip:test" not in redis.data
+    assert local_cache.get("/collections:naip:test") is None
+    assert await cached_result(counter.fetch, "/collections:naip", request) == {
+        "calls": 4
+    }
+
+
+@pytest.mark.asyncio
+async def test_invalidate_cache_tags_evicts_local_without_redis_keys(
+    local_cache: LocalCache, redis: FakeRedis
+) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    await cached_result(
+        counter.fetch,
+        "/collections:naip",
+        request,
+        tags=[stac_collection_tag("naip")],
+    )
+    # Another worker invalidated the tag in redis first
+    redis.data.clear()
+
+    assert await invalidate_cache_tags(redis, stac_change_tags("naip")) == 0  # type: ignore
+    assert local_cache.get("/collections:naip:test") is None
+
+
+@pytest.mark.asyncio
+async def test_fill_cache(no_local_cache: None, redis: FakeRedis) -> None:
+    request = make_request(redis)
+    counter = Counter()
+
+    await fill_cache(
+        request,
+        [
+            (
+                tiler_item_cache_key("naip", "a"),
+                {"id": "a"},
+                [stac_item_tag("naip", "a")],
+            )
+        ],
+    )
+    assert await cached_result(
+        counter.fetch, tiler_item_cache_key("naip", "a"), request
+    ) == {"id": "a"}
+    assert counter.calls == 0
+    assert set(redis.data["ztag::item:naip:a"]) == {b"tiler:/item:naip:a:test"}
+
+
+@pytest.mark.asyncio
+async def test_tag_sets_drop_expired_keys(
+    monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr(pccommon.redis.time, "time", lambda: now)
+
+    async with redis.pipeline() as pipe:
+        queue_cache_tags(pipe, "a", ["items:naip"], 60)  # type: ignore
+        await pipe.execute()
+    now += 61
+    async with redis.pipeline() as pipe:
+        queue_cache_tags(pipe, "b", ["items:naip"], 60)  # type: ignore
+        await pipe.execute()
+
+    assert redis.data["ztag::items:naip"] == {b"b": now + 60}
+
+
+class NotFound(Exception):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_cached_result_caches_negative_errors(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    monkeypatch.setattr(PCAPIsConfig.from_environment(), "redis_negative_ttl", 30)
+    request = make_request(redis)
+    calls = 0
+
+    async def _missing() -> Dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        raise NotFound("No item 'a'")
+
+    for _ in range(2):
+        with pytest.raises(NotFound, match="No item 'a'"):
+            await cached_result(
+                _missing, "/item:naip:a", request, negative_errors=[NotFound]
+            )
+    assert calls == 1
+
+    # Other errors aren't cached, and callers not expecting the cached error
+    # run the function
+    with pytest.raises(NotFound):
+        await cached_result(
+            _missing, "/item:naip:b", request, negative_errors=[ValueError]
+        )
+    assert "/item:naip:b:test" not in redis.data
+    with pytest.raises(NotFound):
+        await cached_result(_missing, "/item:naip:a", request)
+    assert calls == 3
+
+    await cache_error(request, "/empty-tile:1", NotFound("empty"))
+    assert isinstance(
+        await get_cached_error(request, "/empty-tile:1", [NotFound]), NotFound
+    )
+
+
+@pytest.mark.asyncio
+async def test_refresh_caches_negative_errors(
+    no_local_cache: None, monkeypatch: pytest.MonkeyPatch, redis: FakeRedis
+) -> None:
+    settings = PCAPIsConfig.from_environment()
+    monkeypatch.setattr(settings, "redis_soft_ttl", 60)
+    monkeypatch.setattr(settings, "redis_negative_ttl", 30)
+    request = make_request(redis)
+    redis.data["/item:naip:a:test"] = b'{"id": "a"}'
+
+    async def _deleted() -> Dict[str, Any]:
+        raise NotFound("No item 'a'")
+
+    # The stale entry is served while the item's deletion is found
+    assert await cached_result(
+        _deleted, "/item:naip:a", request, negative_errors=[NotFound]
+    ) == {"id": "a"}
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(NotFound, match="No item 'a'"):
+        await cached_result(
+            _deleted, "/item:naip:a", request, negative_errors=[NotFound]
+        )
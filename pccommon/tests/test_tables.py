@@ -0,0 +1,146 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import pytest
+
+from pccommon.config.containers import ContainerConfig, ContainerConfigTable
+from pccommon.tables import AsyncIPExceptionListTable, TableError
+
+
+class FakeTableClient:
+    def __init__(self, entities: List[Dict[str, Any]]) -> None:
+        self.entities = entities
+        self.queries = 0
+
+    def query_entities(self, query: str) -> List[Dict[str, Any]]:
+        self.queries += 1
+        return self.entities
+
+    def close(self) -> None:
+        pass
+
+
+def make_table(entities: List[Dict[str, Any]]) -> Tuple[ContainerConfigTable, Any]:
+    client = FakeTableClient(entities)
+
+    def _get_clients() -> Tuple[Optional[Any], Any]:
+        return None, client
+
+    return ContainerConfigTable(_get_clients), client
+
+
+def test_get_all_is_materialized_and_cached() -> None:
+    table, client = make_table(
+        [
+            {"PartitionKey": "", "RowKey": "a", "Data": '{"has_cdn": true}'},
+            {"PartitionKey": "", "RowKey": "b", "Data": '{"has_cdn": false}'},
+        ]
+    )
+
+    expected = {"a": ContainerConfig(has_cdn=True), "b": ContainerConfig(has_cdn=False)}
+    assert dict(table.get_all()) == expected
+    # Later callers see the full result, without another query
+    assert dict(table.get_all()) == expected
+    assert client.queries == 1
+
+
+def test_get_all_is_read_only() -> None:
+    table, _ = make_table([])
+    with pytest.raises(TypeError):
+        table.get_all()["a"] = ContainerConfig()  # type: ignore
+
+
+def test_get_all_raises_on_missing_data() -> None:
+    table, _ = make_table([{"PartitionKey": "", "RowKey": "a"}])
+    with pytest.raises(TableError):
+        table.get_all()
+
+
+class FakeAsyncTableClient:
+    def __init__(self, entities: List[Dict[str, Any]]) -> None:
+        self.entities = entities
+        self.queries = 0
+        self.closed = False
+
+    async def list_entities(self) -> AsyncIterator[Dict[str, Any]]:
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        for entity in self.entities:
+            yield entity
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def make_async_ip_table(
+    ips: List[str],
+) -> Tuple[AsyncIPExceptionListTable, List[FakeAsyncTableClient]]:
+    clients: List[FakeAsyncTableClient] = []
+
+    def _get_clients() -> Tuple[Any, Any, Any]:
+        client = FakeAsyncTableClient(
+            [{"PartitionKey": "ip", "RowKey": ip, "Value": ip} for ip in ips]
+        )
+        clients.append(client)
+        return client, client, client
+
+    return AsyncIPExceptionListTable(_get_clients), clients
+
+
+@pytest.mark.asyncio
+async def test_async_table_reuses_clients() -> None:
+    table, clients = make_async_ip_table(["10.0.0.1"])
+
+    assert await table.get_exceptions() == {"10.0.0.1"}
+    table._cache.clear()
+    assert await table.get_exceptions() == {"10.0.0.1"}
+    assert len(clients) == 1
+    assert clients[0].queries == 2
+
+
+@pytest.mark.asyncio
+async def test_async_table_caches_results() -> None:
+    table, clients = make_async_ip_table(["10.0.0.1", "10.0.0.2"])
+
+    assert await table.get_exceptions() == {"10.0.0.1", "10.0.0.2"}
+    assert await table.get_exceptions() == {"10.0.0.1", "10.0.0.2"}
+    assert clients[0].queries == 1
+
+
+@pytest.mark.asyncio
+async def test_async_table_coalesces_concurrent_misses() -> None:
+    table, clients = make_async_ip_table(["10.0.0.1"])
+
+    results = await asyncio.gather(*[table.get_exceptions() for _ in range(5)])
+    assert results == [{"10.0.0.1"}] * 5
+    assert clients[0].queries == 1
+
+
+@pytest.mark.asyncio
+async def test_async_table_close() -> None:
+    table, clients = make_async_ip_table([])
+
+    await table.close()
+    await table.get_exceptions()
+    await table.close()
+    assert clients[0].closed
+    # Clients are reopened on use after close
+    table._cache.clear()
+    await table.get_exceptions()
+    assert len(clients) == 2
+
+
+def test_async_table_closes_clients_of_previous_loop() -> None:
+    table, clients = make_async_ip_table(["10.0.0.1"])
+
+    asyncio.run(table.get_exceptions())
+    table._cache.clear()
+
+    async def _get_and_close() -> None:
+        await table.get_exceptions()
+        await table._closing  # type: ignore
+        await table.close()
+
+    asyncio.run(_get_and_close())
+    assert len(clients) == 2
+    assert all(client.closed for client in clients)
@@ -3,7 +3,8 @@ from typing import Any, Dict, Optional
 from stac_fastapi.api.app import StacApi
 
 from pccommon.openapi import fixup_schema
-from pcstac.config import STAC_API_VERSION
+from pccommon.redis import register_cache_href
+from pcstac.config import STAC_API_VERSION, get_settings
 
 STAC_API_OPENAPI_TAG = f"STAC API {STAC_API_VERSION}"
 
@@ -19,6 +20,11 @@ class PCStacApi(StacApi):
     See related, upstream issue here: https://github.com/tiangolo/fastapi/pull/3038
     """
 
+    def __attrs_post_init__(self) -> None:
+        super().__attrs_post_init__()
+        # Tiler links are injected into cached collections and items
+        register_cache_href(self.app, "tiler", get_settings().get_tiler_href)
+
     def customize_openapi(self) -> Optional[Dict[str, Any]]:
         """Customize openapi schema."""
         schema = super().customize_openapi()
@@ -5,7 +5,8 @@ from urllib.parse import urljoin
 
 import attr
 import orjson
-from fastapi import HTTPException, Request
+from fastapi import HTTPException, Request, Response
+from stac_fastapi.api.models import GeoJSONResponse
 from stac_fastapi.pgstac.core import CoreCrudClient
 from stac_fastapi.types.errors import NotFoundError
 from stac_fastapi.types.stac import (
@@ -18,9 +19,23 @@ from stac_fastapi.types.stac import (
 
 from pccommon.config import get_all_render_configs, get_render_config
 from pccommon.config.collections import DefaultRenderConfig
-from pccommon.constants import CACHE_KEY_ITEM, DEFAULT_COLLECTION_REGION
+from pccommon.constants import (
+    CACHE_KEY_ITEM,
+    CACHE_TAG_COLLECTIONS,
+    DEFAULT_COLLECTION_REGION,
+)
 from pccommon.logging import get_custom_dimensions
-from pccommon.redis import back_pressure, cached_result, rate_limit, stac_item_cache_key
+from pccommon.redis import (
+    cached_response,
+    cached_result,
+    fill_cache,
+    stac_collection_tag,
+    stac_item_cache_key,
+    stac_item_tag,
+    stac_items_tag,
+    throttle,
+    tiler_item_cache_key,
+)
 from pccommon.tracing import add_stac_attributes_from_search
 from pcstac.config import API_DESCRIPTION, API_LANDING_PAGE_ID, API_TITLE, get_settings
 from pcstac.contants import (
@@ -30,7 +45,7 @@ from pcstac.contants import (
     CACHE_KEY_LANDING_PAGE,
     CACHE_KEY_SEARCH,
 )
-from pcstac.search import PCSearch
+from pcstac.search import PCSearch, search_cache_key
 from pcstac.tiles import TileInfo
 
 settings = get_settings()
@@ -90,9 +105,9 @@ class PCClient(CoreCrudClient):
 
         return item
 
-    @rate_limit(CACHE_KEY_COLLECTIONS, settings.rate_limits.collections)
-    @back_pressure(
+    @throttle(
         CACHE_KEY_COLLECTIONS,
+        settings.rate_limits.collections,
         settings.back_pressures.collections.req_per_sec,
         settings.back_pressures.collections.inc_ms,
     )
@@ -129,17 +144,19 @@ class PCClient(CoreCrudClient):
             collections["collections"] = modified_collections
             return collections
 
-        return await cached_result(_fetch, CACHE_KEY_COLLECTIONS, request)
+        return await cached_result(
+            _fetch, CACHE_KEY_COLLECTIONS, request, tags=[CACHE_TAG_COLLECTIONS]
+        )
 
-    @rate_limit(CACHE_KEY_COLLECTION, settings.rate_limits.collection)
-    @back_pressure(
+    @throttle(
         CACHE_KEY_COLLECTION,
+        settings.rate_limits.collection,
         settings.back_pressures.collection.req_per_sec,
         settings.back_pressures.collection.inc_ms,
     )
-    async def get_collection(
+    async def get_collection(  # type: ignore[override]
         self, collection_id: str, request: Request, **kwargs: Any
-    ) -> Collection:
+    ) -> Response:
         """Get collection by id and inject PQE links.
         Called with `GET /collections/{collection_id}`.
 
@@ -149,7 +166,7 @@ class PCClient(CoreCrudClient):
         Args:
             collection_id: Id of the collection.
         Returns:
-            Collection.
+            Response containing the Collection.
         """
         _super: CoreCrudClient = super()
 
@@ -170,51 +187,77 @@ class PCClient(CoreCrudClient):
             return self.inject_collection_extras(result, request, render_config)
 
         cache_key = f"{CACHE_KEY_COLLECTION}:{collection_id}"
-        return await cached_result(_fetch, cache_key, request)
+        return await cached_response(
+            _fetch,
+            cache_key,
+            request,
+            tags=[stac_collection_tag(collection_id)],
+            negative_errors=[NotFoundError],
+        )
 
-    @rate_limit(CACHE_KEY_SEARCH, settings.rate_limits.search)
-    @back_pressure(
-        CACHE_KEY_SEARCH,
-        settings.back_pressures.search.req_per_sec,
-        settings.back_pressures.search.inc_ms,
-    )
-    async def _search_base(
+    async def _fetch_search(
         self, search_request: PCSearch, request: Request, **kwargs: Any
     ) -> ItemCollection:
-        """Cross catalog search (POST).
-        Called with `POST /search`.
-        Args:
-            search_request: search request parameters.
-        Returns:
-            ItemCollection containing items which match the search criteria.
-        """
+        """Run a search against pgstac and inject links into the results."""
         _super: CoreCrudClient = super()
+        result = await _super._search_base(search_request, request=request, **kwargs)
+
+        # Remove context extension until we fully support it.
+        result.pop("context", None)
+
+        if settings.tiler_item_cache_fill:
+            await self._fill_tiler_item_cache(search_request, result, request)
+
+        ts = time.perf_counter()
+        item_collection = ItemCollection(
+            **{
+                **result,
+                "features": [
+                    self.inject_item_links(i, request)
+                    for i in result.get("features", [])
+                ],
+            }
+        )
+        te = time.perf_counter()
+        logger.info(
+            "Perf: item search result post processing",
+            extra=get_custom_dimensions({"duration": f"{te - ts:0.4f}"}, request),
+        )
+        return item_collection
 
-        async def _fetch() -> ItemCollection:
-            result = await _super._search_base(
-                search_request, request=request, **kwargs
-            )
+    async def _fill_tiler_item_cache(
+        self, search_request: PCSearch, result: ItemCollection, request: Request
+    ) -> None:
+        """Write the items in a search result to the tiler's item cache.
 
-            # Remove context extension until we fully support it.
-            result.pop("context", None)
-
-            ts = time.perf_counter()
-            item_collection = ItemCollection(
-                **{
-                    **result,
-                    "features": [
-                        self.inject_item_links(i, request)
-                        for i in result.get("features", [])
-                    ],
-                }
-            )
-            te = time.perf_counter()
-            logger.info(
-                "Perf: item search result post processing",
-                extra=get_custom_dimensions({"duration": f"{te - ts:0.4f}"}, request),
-            )
-            return item_collection
+        Search results carry links built from the STAC API's base URL, which
+        are dropped: the tiler doesn't read item links, and would otherwise
+        serve them as its own. Unless host-neutral caching is enabled, entries
+        are keyed by this request's hostname, so they are only read by tiler
+        requests served under the same hostname.
+
+        Results limited by the fields extension don't hold whole items, and
+        are skipped.
+        """
+        fields = getattr(search_request, "fields", None)
+        if fields and (fields.include or fields.exclude):
+            return
+
+        await fill_cache(
+            request,
+            (
+                (
+                    tiler_item_cache_key(item["collection"], item["id"]),
+                    {**item, "links": []},
+                    [stac_item_tag(item["collection"], item["id"])],
+                )
+                for item in result.get("features", [])
+                if item.get("collection") and item.get("id")
+            ),
+        )
 
+    def _search_cache_key(self, search_request: PCSearch, request: Request) -> str:
+        """Validate a search and return the key its results are cached under."""
         # Block searches that don't specify a collection
         if (
             search_request.collections is None
@@ -233,9 +276,70 @@ class PCClient(CoreCrudClient):
             extra=get_custom_dimensions({"search_body": search_json}, request),
         )
 
-        hashed_search = hash(search_json)
-        cache_key = f"{CACHE_KEY_SEARCH}:{hashed_search}"
-        return await cached_result(_fetch, cache_key, request)
+        return f"{CACHE_KEY_SEARCH}:{search_cache_key(search_request)}"
+
+    def _search_tags(self, search_request: PCSearch) -> List[str]:
+        """Tags for the cached results of a search, see `stac_items_tag`."""
+        if not search_request.collections:
+            return [stac_items_tag()]
+        return [stac_items_tag(c) for c in search_request.collections]
+
+    @throttle(
+        CACHE_KEY_SEARCH,
+        settings.rate_limits.search,
+        settings.back_pressures.search.req_per_sec,
+        settings.back_pressures.search.inc_ms,
+    )
+    async def _search_base(
+        self, search_request: PCSearch, request: Request, **kwargs: Any
+    ) -> ItemCollection:
+        """Search, caching the results. Used by the item and item collection
+        endpoints.
+        Args:
+            search_request: search request parameters.
+        Returns:
+            ItemCollection containing items which match the search criteria.
+        """
+
+        async def _fetch() -> ItemCollection:
+            return await self._fetch_search(search_request, request, **kwargs)
+
+        cache_key = self._search_cache_key(search_request, request)
+        return await cached_result(
+            _fetch, cache_key, request, tags=self._search_tags(search_request)
+        )
+
+    @throttle(
+        CACHE_KEY_SEARCH,
+        settings.rate_limits.search,
+        settings.back_pressures.search.req_per_sec,
+        settings.back_pressures.search.inc_ms,
+    )
+    async def post_search(  # type: ignore[override]
+        self, search_request: PCSearch, request: Request, **kwargs: Any
+    ) -> Response:
+        """Cross catalog search (POST).
+        Called with `POST /search`, and `GET /search` via `get_search`.
+
+        Cached results are returned as the serialized response body.
+        Args:
+            search_request: search request parameters.
+        Returns:
+            Response containing the ItemCollection which matches the search
+            criteria.
+        """
+
+        async def _fetch() -> ItemCollection:
+            return await self._fetch_search(search_request, request, **kwargs)
+
+        cache_key = self._search_cache_key(search_request, request)
+        return await cached_response(
+            _fetch,
+            cache_key,
+            request,
+            media_type=GeoJSONResponse.media_type,
+            tags=self._search_tags(search_request),
+        )
 
     async def landing_page(self, request: Request, **kwargs: Any) -> LandingPage:
         _super: CoreCrudClient = super()
@@ -244,22 +348,24 @@ class PCClient(CoreCrudClient):
             landing = await _super.landing_page(request=request, **kwargs)
             return landing
 
-        return await cached_result(_fetch, CACHE_KEY_LANDING_PAGE, request)
+        return await cached_result(
+            _fetch, CACHE_KEY_LANDING_PAGE, request, tags=[CACHE_TAG_COLLECTIONS]
+        )
 
-    @rate_limit(CACHE_KEY_ITEMS, settings.rate_limits.items)
-    @back_pressure(
+    @throttle(
         CACHE_KEY_ITEMS,
+        settings.rate_limits.items,
         settings.back_pressures.items.req_per_sec,
         settings.back_pressures.items.inc_ms,
     )
-    async def item_collection(
+    async def item_collection(  # type: ignore[override]
         self,
         collection_id: str,
         request: Request,
         limit: Optional[int] = None,
         token: Optional[str] = None,
         **kwargs: Any,
-    ) -> ItemCollection:
+    ) -> Response:
         _super: CoreCrudClient = super()
 
         async def _fetch() -> ItemCollection:
@@ -268,17 +374,23 @@ class PCClient(CoreCrudClient):
             )
 
         cache_key = f"{CACHE_KEY_ITEMS}:{collection_id}:limit:{limit}:token:{token}"
-        return await cached_result(_fetch, cache_key, request)
+        return await cached_response(
+            _fetch,
+            cache_key,
+            request,
+            media_type=GeoJSONResponse.media_type,
+            tags=[stac_items_tag(collection_id)],
+        )
 
-    @rate_limit(CACHE_KEY_ITEM, settings.rate_limits.item)
-    @back_pressure(
+    @throttle(
         CACHE_KEY_ITEM,
+        settings.rate_limits.item,
         settings.back_pressures.item.req_per_sec,
         settings.back_pressures.item.inc_ms,
     )
-    async def get_item(
+    async def get_item(  # type: ignore[override]
         self, item_id: str, collection_id: str, request: Request, **kwargs: Any
-    ) -> Item:
+    ) -> Response:
         _super: CoreCrudClient = super()
 
         async def _fetch() -> Item:
@@ -288,7 +400,14 @@ class PCClient(CoreCrudClient):
             return item
 
         cache_key = stac_item_cache_key(collection_id, item_id)
-        return await cached_result(_fetch, cache_key, request)
+        return await cached_response(
+            _fetch,
+            cache_key,
+            request,
+            media_type=GeoJSONResponse.media_type,
+            tags=[stac_item_tag(collection_id, item_id)],
+            negative_errors=[NotFoundError],
+        )
 
     @classmethod
     def create(
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Optional
 from urllib.parse import urljoin
 
 from fastapi import Request
@@ -87,6 +88,14 @@ class Settings(BaseSettings):
         flag directing the application to operate in debugging mode
     api_version : str
         version of application
+    cache_invalidation_channel : str
+        postgres channel to listen on for pgstac changes that invalidate cache
+        entries. Must match the channel the triggers installed by
+        pgstac/cache_invalidation.sql notify on, "pgstac_cache" by default
+    tiler_item_cache_fill : bool
+        flag directing search results to fill the tiler's item cache. Unless
+        cache_host_neutral is set, the tiler must be served under the same
+        hostname as the STAC API to read the filled entries
     """
 
     api: PCAPIsConfig = PCAPIsConfig.from_environment()
@@ -112,6 +121,16 @@ class Settings(BaseSettings):
         default=30,
         validation_alias=REQUEST_TIMEOUT_ENV_VAR,
     )
+    # Postgres channel that pgstac item and collection changes are notified on,
+    # used to invalidate cached responses. Disabled when unset. The triggers in
+    # pgstac/cache_invalidation.sql notify on "pgstac_cache", unless the
+    # cache_invalidation_channel pgstac setting names another channel.
+    cache_invalidation_channel: Optional[str] = None
+    # Write the items in search results to the cache keys the tiler reads
+    # them from, so tiler requests for those items don't query pgstac. Entries
+    # are keyed by the STAC request's hostname unless PCAPIS_CACHE_HOST_NEUTRAL
+    # is set, so the tiler only reads them when served under the same hostname.
+    tiler_item_cache_fill: bool = False
 
     model_config = {
         "env_prefix": ENV_VAR_PCAPIS_PREFIX,
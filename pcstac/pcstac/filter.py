@@ -1,18 +1,20 @@
 from typing import Any, Dict, Optional
 
 from buildpg import render
-from fastapi import Request
+from fastapi import Request, Response
+from stac_fastapi.extensions.core.filter.filter import JSONSchemaResponse
 from stac_fastapi.pgstac.extensions.filter import FiltersClient
 from stac_fastapi.types.errors import NotFoundError
 
-from pccommon.redis import cached_result
+from pccommon.constants import CACHE_TAG_COLLECTIONS
+from pccommon.redis import cached_response, stac_collection_tag
 from pcstac.contants import CACHE_KEY_QUERYABLES
 
 
 class PCFiltersClient(FiltersClient):
-    async def get_queryables(
+    async def get_queryables(  # type: ignore[override]
         self, request: Request, collection_id: Optional[str] = None, **kwargs: Any
-    ) -> Dict[str, Any]:
+    ) -> Response:
         """Override pgstac backend get_queryables to make use of cached results"""
 
         async def _fetch() -> Dict:
@@ -33,4 +35,17 @@ class PCFiltersClient(FiltersClient):
                 return queryables
 
         cache_key = f"{CACHE_KEY_QUERYABLES}:{collection_id}"
-        return await cached_result(_fetch, cache_key, request)
+        return await cached_response(
+            _fetch,
+            cache_key,
+            request,
+            media_type=JSONSchemaResponse.media_type,
+            tags=[
+                (
+                    stac_collection_tag(collection_id)
+                    if collection_id
+                    else CACHE_TAG_COLLECTIONS
+                )
+            ],
+            negative_errors=[NotFoundError],
+        )
@@ -0,0 +1,140 @@
+"""Invalidate cached STAC responses when pgstac collections or items change."""
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+import asyncpg
+import orjson
+from fastapi import FastAPI
+
+from pccommon.constants import (
+    CACHE_INVALIDATION_CLAIM_SECONDS,
+    CACHE_INVALIDATION_KEY_PREFIX,
+)
+from pccommon.redis import (
+    invalidate_local_cache_tags,
+    invalidate_redis_cache_tags,
+    stac_change_tags,
+)
+
+logger = logging.getLogger(__name__)
+
+# Notifications received within this many seconds are invalidated together
+INVALIDATION_BATCH_SECONDS = 0.1
+RECONNECT_DELAY_SECONDS = 5
+
+
+class CacheInvalidator:
+    """Listens for pgstac change notifications on a postgres channel, and
+    deletes the cache entries tagged with the changed collections and items.
+
+    Notifications are JSON objects with a "collection", and the changed "items"
+    for item changes, as sent by the triggers in pgstac/cache_invalidation.sql.
+    Changes are batched, so bulk loads don't make a redis call per item.
+
+    Every API process receives every notification and evicts its own local
+    cache, but only the first to claim a notification in redis deletes its
+    redis entries.
+    """
+
+    def __init__(self, app: FastAPI, channel: str) -> None:
+        self.app = app
+        self.channel = channel
+        self._conn: Optional[asyncpg.Connection] = None
+        # Tags of the pending notifications, by their claim key
+        self._pending: Dict[str, Set[str]] = {}
+        self._flush_task: "Optional[asyncio.Task[None]]" = None
+        self._closed = False
+
+    async def start(self) -> None:
+        # LISTEN needs its own connection to the primary, held open
+        conn = await asyncpg.connect(self.app.state.settings.writer_connection_string)
+        conn.add_termination_listener(self._on_termination)
+        await conn.add_listener(self.channel, self._on_notification)
+        self._conn = conn
+        logger.info(f"Listening for cache invalidations on '{self.channel}'")
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def _on_termination(self, conn: asyncpg.Connection) -> None:
+        if not self._closed:
+            logger.error("Cache invalidation connection lost, reconnecting")
+            asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            try:
+                await self.start()
+                return
+            except Exception as e:
+                logger.error(f"Error reconnecting for cache invalidations: {e}")
+
+    def _on_notification(
+        self, conn: asyncpg.Connection, pid: int, channel: str, payload: Any
+    ) -> None:
+        try:
+            change = orjson.loads(payload)
+            collection = change["collection"]
+            items: List[Optional[str]] = change.get("items") or [change.get("item")]
+            tags = {tag for item in items for tag in stac_change_tags(collection, item)}
+        except Exception as e:
+            logger.error(f"Invalid cache invalidation notification {payload}: {e}")
+            return
+
+        # Payloads carry the sending transaction's id, so they are unique per
+        # change, and the same across API processes
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        claim_key = f"{CACHE_INVALIDATION_KEY_PREFIX}:{digest}"
+        self._pending.setdefault(claim_key, set()).update(tags)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self) -> None:
+        await asyncio.sleep(INVALIDATION_BATCH_SECONDS)
+        pending = self._pending
+        self._pending = {}
+        invalidate_local_cache_tags(list(set().union(*pending.values())))
+        try:
+            r = self.app.state.redis
+            async with r.pipeline(transaction=False) as pipe:
+                for claim_key in pending:
+                    pipe.set(claim_key, 1, nx=True, ex=CACHE_INVALIDATION_CLAIM_SECONDS)
+                claimed = await pipe.execute()
+            tags = list(
+                set().union(
+                    *(tags for tags, ok in zip(pending.values(), claimed) if ok)
+                )
+            )
+            if tags:
+                deleted = await invalidate_redis_cache_tags(r, tags)
+                logger.info(
+                    f"Invalidated {deleted} cache keys for {len(tags)} tags",
+                )
+        except Exception as e:
+            # Entries expire with redis_ttl
+            logger.error(f"Error invalidating cache tags: {e}")
+
+
+async def start_cache_invalidation(app: FastAPI, channel: Optional[str]) -> None:
+    """Start invalidating cache entries on pgstac changes, if a channel is
+    configured."""
+    if not channel:
+        return
+    invalidator = CacheInvalidator(app, channel)
+    await invalidator.start()
+    app.state.cache_invalidator = invalidator
+
+
+async def stop_cache_invalidation(app: FastAPI) -> None:
+    invalidator: Optional[CacheInvalidator] = getattr(
+        app.state, "cache_invalidator", None
+    )
+    if invalidator:
+        await invalidator.close()
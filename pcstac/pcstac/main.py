@@ -21,14 +21,31 @@ from stac_fastapi.extensions.core import TokenPaginationExtension
 from stac_fastapi.pgstac.config import Settings
 from stac_fastapi.pgstac.db import close_db_connection, connect_to_db
 from stac_fastapi.types.search import APIRequest
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import PlainTextResponse
 
+from pccommon.config import (
+    close_table_clients,
+    start_collection_config_registry,
+    start_ip_filters,
+    stop_collection_config_registry,
+    stop_ip_filters,
+)
 from pccommon.logging import ServiceName, init_logging
-from pccommon.middleware import TraceMiddleware, add_timeout, http_exception_handler
+from pccommon.middleware import (
+    BannedIPMiddleware,
+    TraceMiddleware,
+    add_timeout,
+    http_exception_handler,
+)
 from pccommon.openapi import fixup_schema
-from pccommon.redis import connect_to_redis
+from pccommon.redis import (
+    connect_to_redis,
+    start_rate_limit_sync,
+    stop_rate_limit_sync,
+)
 from pcstac.api import PCStacApi
 from pcstac.client import PCClient
 from pcstac.config import (
@@ -39,6 +56,7 @@ from pcstac.config import (
     get_settings,
 )
 from pcstac.errors import PC_DEFAULT_STATUS_CODES
+from pcstac.invalidation import start_cache_invalidation, stop_cache_invalidation
 from pcstac.search import (
     PCItemCollectionUri,
     PCSearch,
@@ -79,7 +97,16 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     """FastAPI Lifespan."""
     await connect_to_db(app)
     await connect_to_redis(app)
+    start_rate_limit_sync(app)
+    await run_in_threadpool(start_collection_config_registry)
+    await run_in_threadpool(start_ip_filters)
+    await start_cache_invalidation(app, app_settings.cache_invalidation_channel)
     yield
+    await stop_rate_limit_sync(app)
+    stop_collection_config_registry()
+    stop_ip_filters()
+    await close_table_clients()
+    await stop_cache_invalidation(app)
     await close_db_connection(app)
 
 
@@ -109,6 +136,7 @@ api = PCStacApi(
         Middleware(BrotliMiddleware),
         Middleware(ProxyHeaderMiddleware),
         Middleware(TraceMiddleware, service_name=ServiceName.STAC),
+        Middleware(BannedIPMiddleware),
         # Note: If requests are being sent through an application gateway like
         # nginx-ingress, you may need to configure CORS through that system.
         Middleware(
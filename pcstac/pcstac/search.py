@@ -1,8 +1,11 @@
+import hashlib
 import logging
 import re
-from typing import Any, Callable, Coroutine, Dict, Optional
+from datetime import datetime, timezone
+from typing import Any, Callable, Coroutine, Dict, List, Optional
 
 import attr
+import orjson
 from fastapi import Query
 from pydantic import Field, field_validator
 from stac_fastapi.api.models import BaseSearchGetRequest, ItemCollectionUri
@@ -12,7 +15,7 @@ from stac_fastapi.types.rfc3339 import DateTimeType, str_to_interval
 from starlette.requests import Request
 from typing_extensions import Annotated
 
-from pccommon.redis import cached_result
+from pccommon.redis import cached_result, stac_collection_tag
 from pcstac.contants import CACHE_KEY_BASE_ITEM
 
 DEFAULT_LIMIT: int = 250
@@ -41,6 +44,75 @@ class PCSearch(PgstacSearch):
         return _patch_datetime(value)
 
 
+def _normalize_datetime(value: str) -> str:
+    """Render a datetime or interval string as UTC, with open ends as `..`."""
+    try:
+        interval = str_to_interval(value)
+    except Exception:
+        return value.strip()
+
+    def _fmt(dt: Optional[datetime]) -> str:
+        if dt is None:
+            return ".."
+        return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    if isinstance(interval, tuple):
+        return "/".join(_fmt(dt) for dt in interval)
+    return _fmt(interval)
+
+
+def _normalize_cql2(node: Any) -> Any:
+    """Order the arguments of commutative CQL2 logical operators so that
+    equivalent filters produce the same serialization."""
+    if isinstance(node, list):
+        return [_normalize_cql2(n) for n in node]
+    if not isinstance(node, dict):
+        return node
+
+    normalized = {k: _normalize_cql2(v) for k, v in node.items()}
+    if normalized.get("op") in ("and", "or") and isinstance(
+        normalized.get("args"), list
+    ):
+        normalized["args"] = sorted(
+            normalized["args"],
+            key=lambda a: orjson.dumps(a, option=orjson.OPT_SORT_KEYS),
+        )
+    return normalized
+
+
+def _sorted_unique(values: Optional[List[str]]) -> Optional[List[str]]:
+    return sorted(set(values)) if values else values
+
+
+def search_cache_key(search_request: PgstacSearch) -> str:
+    """Generate a stable fingerprint of a search request for use in cache keys.
+
+    Unlike the builtin `hash`, the digest is identical across processes and
+    restarts, so every replica reads and writes the same cache entry. Requests
+    that only differ in key order, collection/id order, datetime formatting or
+    the order of `and`/`or` arguments map to the same key.
+    """
+    search = search_request.model_dump(mode="json", exclude_none=True)
+
+    for key in ("collections", "ids"):
+        search[key] = _sorted_unique(search.get(key))
+
+    if isinstance(search.get("datetime"), str):
+        search["datetime"] = _normalize_datetime(search["datetime"])
+
+    fields = search.get("fields")
+    if isinstance(fields, dict):
+        search["fields"] = {k: _sorted_unique(v) for k, v in fields.items()}
+
+    if isinstance(search.get("filter"), dict):
+        search["filter"] = _normalize_cql2(search["filter"])
+    elif isinstance(search.get("filter"), str):
+        search["filter"] = " ".join(search["filter"].split())
+
+    canonical = orjson.dumps(search, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
 class RedisBaseItemCache(BaseItemCache):
     """
     Return the base item for the collection and cache by collection id.
@@ -63,7 +135,10 @@ class RedisBaseItemCache(BaseItemCache):
         if collection_id not in self._base_items:
             cache_key = f"{CACHE_KEY_BASE_ITEM}:{collection_id}"
             self._base_items[collection_id] = await cached_result(
-                _fetch, cache_key, self._request
+                _fetch,
+                cache_key,
+                self._request,
+                tags=[stac_collection_tag(collection_id)],
             )
 
         return self._base_items[collection_id]
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytest
+from fastapi import FastAPI
+
+from pcstac import invalidation
+from pcstac.invalidation import CacheInvalidator
+
+
+class ClaimRedis:
+    """Stand-in for the redis pipeline used to claim notifications."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.commands: List[Any] = []
+
+    def pipeline(self, transaction: bool = True) -> "ClaimRedis":
+        return self
+
+    async def __aenter__(self) -> "ClaimRedis":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def set(self, key: str, value: Any, nx: bool = False, ex: int = 0) -> None:
+        self.commands.append(key)
+
+    async def execute(self) -> List[Optional[bool]]:
+        results: List[Optional[bool]] = []
+        for key in self.commands:
+            results.append(None if key in self.data else True)
+            self.data[key] = 1
+        self.commands = []
+        return results
+
+
+@pytest.mark.asyncio
+async def test_invalidation_batches_notifications(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    local: List[Sequence[str]] = []
+    batches: List[Sequence[str]] = []
+
+    async def _invalidate(r: Any, tags: Sequence[str]) -> int:
+        batches.append(tags)
+        return 0
+
+    monkeypatch.setattr(invalidation, "invalidate_local_cache_tags", local.append)
+    monkeypatch.setattr(invalidation, "invalidate_redis_cache_tags", _invalidate)
+    app = FastAPI()
+    app.state.redis = ClaimRedis()
+    # Two API processes, receiving the same notifications
+    invalidators = [CacheInvalidator(app, "pgstac_cache") for _ in range(2)]
+
+    for invalidator in invalidators:
+        invalidator._on_notification(
+            None,
+            0,
+            "pgstac_cache",
+            '{"txid": 1, "collection": "naip", "items": ["a", "b"]}',
+        )
+        invalidator._on_notification(
+            None, 0, "pgstac_cache", '{"txid": 2, "collection": "naip", "item": "c"}'
+        )
+        invalidator._on_notification(None, 0, "pgstac_cache", "not json")
+    await asyncio.sleep(invalidation.INVALIDATION_BATCH_SECONDS * 2)
+
+    tags = {"item:naip:a", "item:naip:b", "item:naip:c", "items:naip", "items"}
+    assert len(local) == 2
+    assert all(set(evicted) == tags for evicted in local)
+    assert len(batches) == 1
+    assert set(batches[0]) == tags
+
+
+@pytest.mark.asyncio
+async def test_collection_notification_tags() -> None:
+    app = FastAPI()
+    invalidator = CacheInvalidator(app, "pgstac_cache")
+    invalidator._on_notification(
+        None, 0, "pgstac_cache", '{"txid": 1, "collection": "naip"}'
+    )
+    assert invalidator._flush_task is not None
+    invalidator._flush_task.cancel()
+
+    (tags,) = invalidator._pending.values()
+    assert tags == {"collection:naip", "items:naip", "items", "collections"}
@@ -49,7 +49,7 @@ async def test_reregistering_rate_limit_script(app: FastAPI, app_client: AsyncCl
 
         async def _hash_exists():
             exists = await app.state.redis.script_exists(
-                app.state.redis_rate_limit_script_hash
+                app.state.redis_throttle_script_hash
             )
             return exists[0]
 
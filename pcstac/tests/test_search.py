@@ -0,0 +1,47 @@
+from stac_fastapi.api.models import create_post_request_model
+
+from pcstac.config import EXTENSIONS
+from pcstac.search import PCSearch, search_cache_key
+
+SearchModel = create_post_request_model(EXTENSIONS, base_model=PCSearch)
+
+
+def test_search_cache_key_is_stable() -> None:
+    search = SearchModel(collections=["naip"], bbox=[-87.5, 30.0, -87.0, 30.5])
+    assert search_cache_key(search) == search_cache_key(search.model_copy())
+    assert len(search_cache_key(search)) == 64
+
+
+def test_search_cache_key_normalizes_equivalent_searches() -> None:
+    a = SearchModel(
+        collections=["naip", "landsat-c2-l2"],
+        datetime="2020-01-01/2020-02-01",
+        filter={
+            "op": "and",
+            "args": [
+                {"op": "=", "args": [{"property": "naip:state"}, "al"]},
+                {"op": "<", "args": [{"property": "eo:cloud_cover"}, 10]},
+            ],
+        },
+    )
+    b = SearchModel(
+        collections=["landsat-c2-l2", "naip"],
+        datetime="2020-01-01T00:00:00+00:00/2020-02-01T00:00:00Z",
+        filter={
+            "args": [
+                {"args": [{"property": "eo:cloud_cover"}, 10], "op": "<"},
+                {"args": [{"property": "naip:state"}, "al"], "op": "="},
+            ],
+            "op": "and",
+        },
+    )
+    assert search_cache_key(a) == search_cache_key(b)
+
+
+def test_search_cache_key_distinguishes_searches() -> None:
+    a = SearchModel(collections=["naip"], limit=10)
+    b = SearchModel(collections=["naip"], limit=11)
+    c = SearchModel(collections=["naip"], sortby=[{"field": "id", "direction": "asc"}])
+    d = SearchModel(collections=["naip"], sortby=[{"field": "id", "direction": "desc"}])
+    assert search_cache_key(a) != search_cache_key(b)
+    assert search_cache_key(c) != search_cache_key(d)
@@ -6,6 +6,7 @@ from urllib.parse import urljoin
 from fastapi import Request
 from pydantic import Field
 from pydantic_settings import BaseSettings
+from rio_tiler.constants import MAX_THREADS
 
 # Hostname to fetch STAC information from
 STAC_API_URL_ENV_VAR = "STAC_API_URL"
@@ -15,6 +16,21 @@ STAC_API_HREF_ENV_VAR = "STAC_API_HREF"
 DEFAULT_MAX_ITEMS_PER_TILE_ENV_VAR = "DEFAULT_MAX_ITEMS_PER_TILE"
 REQUEST_TIMEOUT_ENV_VAR = "REQUEST_TIMEOUT"
 VECTORTILE_SA_BASE_URL_ENV_VAR = "VECTORTILE_SA_BASE_URL"
+SAS_TOKEN_RENEW_BEFORE_SECONDS_ENV_VAR = "SAS_TOKEN_RENEW_BEFORE_SECONDS"
+VECTORTILE_MAX_CONNECTIONS_ENV_VAR = "VECTORTILE_MAX_CONNECTIONS"
+VECTORTILE_RETRIES_ENV_VAR = "VECTORTILE_RETRIES"
+VECTORTILE_CACHE_LOCAL_MB_ENV_VAR = "VECTORTILE_CACHE_LOCAL_MB"
+VECTORTILE_CACHE_LOCAL_MAXZOOM_ENV_VAR = "VECTORTILE_CACHE_LOCAL_MAXZOOM"
+VECTORTILE_CACHE_TTL_ENV_VAR = "VECTORTILE_CACHE_TTL"
+VECTORTILE_CACHE_NOT_FOUND_TTL_ENV_VAR = "VECTORTILE_CACHE_NOT_FOUND_TTL"
+RASTER_TILE_CACHE_TTL_ENV_VAR = "RASTER_TILE_CACHE_TTL"
+RASTER_TILE_CACHE_LOCAL_MB_ENV_VAR = "RASTER_TILE_CACHE_LOCAL_MB"
+TILE_ASSETS_CACHE_TTL_ENV_VAR = "TILE_ASSETS_CACHE_TTL"
+TILE_ASSETS_CACHE_LOCAL_SIZE_ENV_VAR = "TILE_ASSETS_CACHE_LOCAL_SIZE"
+TILE_ASSETS_CACHE_PARENT_LEVELS_ENV_VAR = "TILE_ASSETS_CACHE_PARENT_LEVELS"
+MOSAIC_READ_THREADS_ENV_VAR = "MOSAIC_READ_THREADS"
+COG_DATASET_CACHE_SIZE_ENV_VAR = "COG_DATASET_CACHE_SIZE"
+COG_DATASET_CACHE_TTL_ENV_VAR = "COG_DATASET_CACHE_TTL"
 
 
 @dataclass
@@ -44,6 +60,86 @@ class Settings(BaseSettings):
         default="",
         validation_alias=VECTORTILE_SA_BASE_URL_ENV_VAR,
     )
+    vector_tile_max_connections: int = Field(
+        default=100,
+        validation_alias=VECTORTILE_MAX_CONNECTIONS_ENV_VAR,
+    )
+    """Maximum concurrent connections to the vector tile storage account.
+    Requests over the limit wait for a free connection."""
+    vector_tile_retries: int = Field(
+        default=2,
+        validation_alias=VECTORTILE_RETRIES_ENV_VAR,
+    )
+    """Retries for vector tile requests that fail to connect or get a 5xx."""
+    vector_tile_cache_local_mb: int = Field(
+        default=64,
+        validation_alias=VECTORTILE_CACHE_LOCAL_MB_ENV_VAR,
+    )
+    """Size of the in-process vector tile cache in MB. Disabled when 0."""
+    vector_tile_cache_local_maxzoom: int = Field(
+        default=8,
+        validation_alias=VECTORTILE_CACHE_LOCAL_MAXZOOM_ENV_VAR,
+    )
+    """Highest zoom of the vector tiles cached in process."""
+    vector_tile_cache_ttl: int = Field(
+        default=86400,
+        validation_alias=VECTORTILE_CACHE_TTL_ENV_VAR,
+    )
+    """Seconds vector tiles are cached in redis. Disabled when 0."""
+    vector_tile_cache_not_found_ttl: int = Field(
+        default=3600,
+        validation_alias=VECTORTILE_CACHE_NOT_FOUND_TTL_ENV_VAR,
+    )
+    """Seconds missing vector tiles are cached in redis. Disabled when 0."""
+    raster_tile_cache_ttl: int = Field(
+        default=0,
+        validation_alias=RASTER_TILE_CACHE_TTL_ENV_VAR,
+    )
+    """Seconds rendered item and mosaic tiles are cached, for collections
+    without a `tile_cache_ttl` in their render config. Disabled when 0."""
+    raster_tile_cache_local_mb: int = Field(
+        default=128,
+        validation_alias=RASTER_TILE_CACHE_LOCAL_MB_ENV_VAR,
+    )
+    """Size of the in-process rendered tile cache in MB. Disabled when 0."""
+    tile_assets_cache_ttl: int = Field(
+        default=0,
+        validation_alias=TILE_ASSETS_CACHE_TTL_ENV_VAR,
+    )
+    """Seconds the assets found for a mosaic tile are cached. Disabled when 0."""
+    tile_assets_cache_local_size: int = Field(
+        default=10000,
+        validation_alias=TILE_ASSETS_CACHE_LOCAL_SIZE_ENV_VAR,
+    )
+    """Number of tiles whose assets are cached in process. Disabled when 0."""
+    tile_assets_cache_parent_levels: int = Field(
+        default=3,
+        validation_alias=TILE_ASSETS_CACHE_PARENT_LEVELS_ENV_VAR,
+    )
+    """Number of zoom levels up to look for a cached tile whose assets can be
+    filtered for a tile that isn't cached. Only searches with skipcovered=false
+    are cached for use by other tiles, since pgstac's default of skipping
+    covered items hides whether a search hit its scan limit. Unless
+    exitwhenfull=false, cached ancestors are only used for the "first" pixel
+    selection."""
+    mosaic_read_threads: int = Field(
+        default=MAX_THREADS,
+        validation_alias=MOSAIC_READ_THREADS_ENV_VAR,
+    )
+    """Size of the thread pool the assets of all mosaic tiles are read in."""
+    cog_dataset_cache_size: int = Field(
+        default=0,
+        validation_alias=COG_DATASET_CACHE_SIZE_ENV_VAR,
+    )
+    """Number of idle COG datasets kept open to be reused by later reads of
+    the same asset. Disabled when 0."""
+    cog_dataset_cache_ttl: int = Field(
+        default=300,
+        validation_alias=COG_DATASET_CACHE_TTL_ENV_VAR,
+    )
+    """Seconds a COG dataset is reused for after it's opened. Must be less
+    than SAS_TOKEN_RENEW_BEFORE_SECONDS, so datasets are closed before the
+    token in their href expires."""
 
     debug: bool = os.getenv("TILER_DEBUG", "False").lower() == "true"
     api_version: str = "1.0"
@@ -55,6 +151,11 @@ class Settings(BaseSettings):
         default=30,
         validation_alias=REQUEST_TIMEOUT_ENV_VAR,
     )
+    sas_token_renew_before_seconds: int = Field(
+        default=600,
+        validation_alias=SAS_TOKEN_RENEW_BEFORE_SECONDS_ENV_VAR,
+    )
+    """Renew SAS tokens used to sign asset hrefs this long before they expire."""
 
     feature_flags: FeatureFlags = FeatureFlags()
 
@@ -0,0 +1,102 @@
+"""Open COG datasets kept across tile requests."""
+
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import List, NamedTuple
+
+import rasterio
+from rasterio.io import DatasetReader
+
+from pctiler.config import get_settings
+
+
+class CachedDataset(NamedTuple):
+    dataset: DatasetReader
+    # Monotonic time after which the dataset is closed rather than reused
+    expires: float
+
+
+class DatasetCache:
+    """Keeps rasterio datasets open after a read, to be reused by later reads
+    of the same href.
+
+    Opening a COG fetches and parses its header: IFDs, overviews, nodata,
+    data type and georeferencing. A reused dataset only makes the range
+    requests for the data read.
+
+    A dataset can only be used by one reader at a time, so readers check a
+    dataset out and back in, and popular hrefs may have several datasets
+    open. At most `max_size` idle datasets are kept, least recently used
+    first to be closed. Each dataset is closed `ttl` seconds after it was
+    opened, so that datasets opened with a signed href don't outlive its
+    token, and changed blobs are picked up.
+    """
+
+    def __init__(self, max_size: int, ttl: int) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._idle: "OrderedDict[str, List[CachedDataset]]" = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def checkout(self, href: str) -> CachedDataset:
+        """Return an idle dataset for `href`, or open one. Must be called in
+        the GDAL environment the dataset should be opened in."""
+        now = time.monotonic()
+        expired: List[CachedDataset] = []
+        cached = None
+        with self._lock:
+            idle = self._idle.get(href, [])
+            while idle and cached is None:
+                entry = idle.pop()
+                self._size -= 1
+                if entry.expires > now:
+                    cached = entry
+                else:
+                    expired.append(entry)
+            if href in self._idle and not idle:
+                del self._idle[href]
+
+        _close(expired)
+        if cached is None:
+            cached = CachedDataset(rasterio.open(href), now + self.ttl)
+        return cached
+
+    def checkin(self, href: str, cached: CachedDataset) -> None:
+        """Return a dataset checked out for `href`, once it's no longer used."""
+        if cached.expires <= time.monotonic():
+            _close([cached])
+            return
+
+        evicted: List[CachedDataset] = []
+        with self._lock:
+            self._idle.setdefault(href, []).append(cached)
+            self._idle.move_to_end(href)
+            self._size += 1
+            while self._size > self.max_size:
+                oldest_href, oldest = next(iter(self._idle.items()))
+                evicted.append(oldest.pop(0))
+                self._size -= 1
+                if not oldest:
+                    del self._idle[oldest_href]
+        _close(evicted)
+
+
+def _close(entries: List[CachedDataset]) -> None:
+    for entry in entries:
+        entry.dataset.close()
+
+
+@lru_cache
+def get_dataset_cache() -> DatasetCache:
+    settings = get_settings()
+    return DatasetCache(
+        max_size=settings.cog_dataset_cache_size,
+        ttl=settings.cog_dataset_cache_ttl,
+    )
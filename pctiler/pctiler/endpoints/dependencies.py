@@ -1,9 +1,11 @@
 import logging
-from typing import Callable
+from typing import Callable, Dict
 
 import fastapi
 import starlette
 
+from pccommon.config import get_render_config
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,3 +21,13 @@ def get_endpoint_function(
 
     logger.warning(f"Could not find endpoint. method={method} path={path}")
     raise fastapi.HTTPException(detail="Internal system error", status_code=500)
+
+
+def collection_environment(request: fastapi.Request) -> Dict[str, str]:
+    """GDAL environment for the request's `collection`, from the read tuning
+    of its render config."""
+    collection = request.query_params.get("collection")
+    render_config = get_render_config(collection) if collection else None
+    if not render_config or not render_config.read_tuning:
+        return {}
+    return render_config.read_tuning.get_gdal_env()
@@ -1,5 +1,7 @@
 from fastapi import APIRouter
 
+from pctiler.read_pool import get_read_pool
+
 health_router = APIRouter()
 
 
@@ -7,3 +9,9 @@ health_router = APIRouter()
 async def ping() -> dict:
     """Liveliness/readiness probe, matching spec used in stac-fastapi"""
     return {"message": "PONG"}
+
+
+@health_router.get("/_mgmt/read-pool")
+async def read_pool() -> dict:
+    """Number of mosaic asset reads queued and in progress in this process"""
+    return get_read_pool().stats()
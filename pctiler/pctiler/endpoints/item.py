@@ -16,10 +16,13 @@ from titiler.core.resources.enums import ImageType
 from titiler.pgstac.dependencies import get_stac_item
 
 from pccommon.config import get_render_config
-from pccommon.redis import cached_result, stac_item_cache_key
+from pccommon.redis import cached_result, stac_item_tag, tiler_item_cache_key
 from pctiler.colormaps import PCColorMapParams
 from pctiler.config import get_settings
-from pctiler.endpoints.dependencies import get_endpoint_function
+from pctiler.endpoints.dependencies import (
+    collection_environment,
+    get_endpoint_function,
+)
 from pctiler.reader import ItemSTACReader, ReaderParams
 
 try:
@@ -73,8 +76,15 @@ async def ItemPathParams(
     # It remains to be seen how we will handle this situation in general,
     # but for now we will make the STAC service and the tiler use different
     # keys in the cache, so they can individually fill their own caches.
+    # With PCAPIS_TILER_ITEM_CACHE_FILL, the STAC service also writes the items
+    # from its search results, without their links, to the tiler's keys. They
+    # are read here if this request's hostname is the STAC request's, or if
+    # PCAPIS_CACHE_HOST_NEUTRAL is set.
     _item = await cached_result(
-        _fetch, f"tiler:{stac_item_cache_key(collection, item)}", request
+        _fetch,
+        tiler_item_cache_key(collection, item),
+        request,
+        tags=[stac_item_tag(collection, item)],
     )
     return pystac.Item.from_dict(_item)
 
@@ -91,6 +101,7 @@ pc_tile_factory = MultiBaseTilerFactory(
     colormap_dependency=PCColorMapParams,
     reader_dependency=ReaderParams,
     router_prefix=get_settings().item_endpoint_prefix,
+    environment_dependency=collection_environment,
     # We remove the titiler default `/map` viewer
     add_viewer=False,
 )
@@ -17,7 +17,10 @@ from pccommon.config import get_collection_config
 from pccommon.config.collections import MosaicInfo
 from pctiler.colormaps import PCColorMapParams
 from pctiler.config import get_settings
-from pctiler.endpoints.dependencies import get_endpoint_function
+from pctiler.endpoints.dependencies import (
+    collection_environment,
+    get_endpoint_function,
+)
 from pctiler.reader import PGSTACBackend, ReaderParams
 
 
@@ -48,6 +51,7 @@ pgstac_mosaic_factory = MosaicTilerFactory(
     router_prefix=get_settings().mosaic_endpoint_prefix
     + "/{search_id}",  # reverts /searches back to /mosaic
     backend_dependency=BackendParams,
+    environment_dependency=collection_environment,
     add_statistics=False,
     extensions=[searchInfoExtension()],
 )
@@ -1,7 +1,9 @@
 import logging
+from typing import AsyncIterator, Optional, Union
 
+import httpx
 from fastapi import APIRouter, HTTPException, Path
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from starlette.requests import Request
 from titiler.core.models.mapbox import TileJSON
 
@@ -10,6 +12,7 @@ from pccommon.config.collections import VectorTileset
 from pctiler.config import get_settings
 from pctiler.errors import VectorTileError, VectorTileNotFoundError
 from pctiler.reader_vector_tile import VectorTileReader
+from pctiler.vector_tile_cache import get_vector_tile_cache, vector_tile_cache_key
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -82,8 +85,18 @@ async def get_tile(
 
     reader = VectorTileReader(collection_id, tileset, request)
 
+    cache = get_vector_tile_cache()
+    tile: Optional[Union[bytes, httpx.Response]]
     try:
-        pbf = reader.get_tile(z, x, y)
+        if cache.enabled:
+            tile = await cache.get_tile(
+                vector_tile_cache_key(collection_id, tileset_id, z, x, y),
+                z,
+                lambda: reader.get_tile(z, x, y),
+                request.app.state.redis,
+            )
+        else:
+            tile = await reader.open_tile(z, x, y)
     except Exception as e:
         logger.exception(e)
         raise VectorTileError(
@@ -94,18 +107,38 @@ async def get_tile(
             y=y,
         )
 
-    if not pbf:
+    if tile is None:
         raise VectorTileNotFoundError(
             collection=collection_id, tileset_id=tileset_id, z=z, x=x, y=y
         )
 
-    return Response(
-        content=pbf,
+    headers = {"content-encoding": "gzip"}
+    if isinstance(tile, bytes):
+        return Response(
+            content=tile, media_type="application/x-protobuf", headers=headers
+        )
+
+    # Stream the stored (gzipped) bytes through without buffering them
+    if "content-length" in tile.headers:
+        headers["content-length"] = tile.headers["content-length"]
+    return StreamingResponse(
+        _stream_upstream(tile),
         media_type="application/x-protobuf",
-        headers={"content-encoding": "gzip"},
+        headers=headers,
     )
 
 
+async def _stream_upstream(response: httpx.Response) -> AsyncIterator[bytes]:
+    """Stream an upstream response's raw bytes, and release its connection
+    when streaming ends, including when the client disconnects or the upstream
+    read fails."""
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    finally:
+        await response.aclose()
+
+
 def _get_tileset_config(collection_id: str, tileset_id: str) -> VectorTileset:
     """Get the render configuration for a given collection."""
     config = get_render_config(collection_id)
@@ -8,6 +8,7 @@ from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
 from morecantile.defaults import tms as defaultTileMatrices
 from morecantile.models import TileMatrixSet
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from titiler.core.errors import DEFAULT_STATUS_CODES, add_exception_handlers
 from titiler.core.middleware import (
@@ -19,14 +20,37 @@ from titiler.mosaic.errors import MOSAIC_STATUS_CODES
 from titiler.pgstac.db import close_db_connection, connect_to_db
 from titiler.pgstac.factory import add_search_register_route
 
+from pccommon.config import (
+    close_table_clients,
+    start_collection_config_registry,
+    start_container_cdn_index,
+    start_ip_filters,
+    stop_collection_config_registry,
+    stop_container_cdn_index,
+    stop_ip_filters,
+)
 from pccommon.constants import X_REQUEST_ENTITY
 from pccommon.logging import ServiceName, init_logging
-from pccommon.middleware import TraceMiddleware, add_timeout, http_exception_handler
+from pccommon.middleware import (
+    BannedIPMiddleware,
+    TraceMiddleware,
+    add_timeout,
+    http_exception_handler,
+)
 from pccommon.openapi import fixup_schema
-from pccommon.redis import connect_to_redis
+from pccommon.redis import (
+    connect_to_redis,
+    start_rate_limit_sync,
+    stop_rate_limit_sync,
+)
 from pctiler.config import get_settings
 from pctiler.endpoints import health, item, legend, pg_mosaic, vector_tiles
-from pctiler.middleware import ModifyResponseMiddleware
+from pctiler.middleware import ModifyResponseMiddleware, RasterTileCacheMiddleware
+from pctiler.reader_vector_tile import (
+    close_vector_tile_client,
+    connect_vector_tile_client,
+)
+from pctiler.tokens import get_token_cache
 
 # Get the root path if set in the environment
 APP_ROOT_PATH = os.environ.get("APP_ROOT_PATH", "")
@@ -42,7 +66,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     """FastAPI Lifespan."""
     await connect_to_db(app)
     await connect_to_redis(app)
+    start_rate_limit_sync(app)
+    await run_in_threadpool(start_collection_config_registry)
+    await run_in_threadpool(start_container_cdn_index)
+    await run_in_threadpool(start_ip_filters)
+    get_token_cache().start()
+    await connect_vector_tile_client(app)
     yield
+    await stop_rate_limit_sync(app)
+    get_token_cache().stop()
+    await close_vector_tile_client(app)
+    stop_collection_config_registry()
+    stop_container_cdn_index()
+    stop_ip_filters()
+    await close_table_clients()
     await close_db_connection(app)
 
 
@@ -117,7 +154,16 @@ add_exception_handlers(app, MOSAIC_STATUS_CODES)
 app.add_exception_handler(Exception, http_exception_handler)
 
 
+# Innermost, so cached tiles get the same headers from the other middleware
+app.add_middleware(
+    RasterTileCacheMiddleware,
+    prefixes=[
+        f"{APP_ROOT_PATH}{settings.item_endpoint_prefix}/",
+        f"{APP_ROOT_PATH}{settings.mosaic_endpoint_prefix}/",
+    ],
+)
 app.add_middleware(ModifyResponseMiddleware, route=f"{APP_ROOT_PATH}/mosaic/register")
+app.add_middleware(BannedIPMiddleware)
 app.add_middleware(TraceMiddleware, service_name=app.state.service_name)
 app.add_middleware(CacheControlMiddleware, cachecontrol="public, max-age=3600")
 app.add_middleware(TotalTimeMiddleware)
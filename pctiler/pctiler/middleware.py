@@ -1,8 +1,20 @@
 import json
+from typing import List, Optional, Sequence
 
 from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from pctiler.tile_cache import (
+    Headers,
+    decode_tile,
+    encode_tile,
+    get_raster_tile_cache,
+    get_tile_cache_ttl,
+    raster_tile_cache_key,
+)
+
 
 class ModifyResponseMiddleware:
     def __init__(self, app: ASGIApp, route: str) -> None:
@@ -46,3 +58,69 @@ class ModifyResponseMiddleware:
                 await send(message)
 
         await self.app(scope, receive, send_with_searchid)
+
+
+class RasterTileCacheMiddleware:
+    """Serves rendered tiles of the item and mosaic tile endpoints from the
+    raster tile cache, and caches successfully rendered tiles.
+
+    Tiles are cached for the TTL of the `collection` query parameter's render
+    config, and not at all if it is 0.
+    """
+
+    def __init__(self, app: ASGIApp, prefixes: Sequence[str]) -> None:
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    def _is_tile_request(self, scope: Scope) -> bool:
+        path: str = scope["path"]
+        return (
+            scope["method"] == "GET"
+            and path.startswith(self.prefixes)
+            and "/tiles/" in path
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_tile_request(scope):
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        ttl = get_tile_cache_ttl(request.query_params.get("collection"))
+        if ttl <= 0:
+            return await self.app(scope, receive, send)
+
+        cache = get_raster_tile_cache()
+        r = getattr(request.app.state, "redis", None)
+        cache_key = raster_tile_cache_key(
+            scope["path"], scope.get("query_string", b"").decode("latin-1")
+        )
+        stored = await cache.get(cache_key, r)
+        if stored is not None:
+            headers, body = decode_tile(stored)
+            response = Response(body, headers=dict(headers))
+            return await response(scope, receive, send)
+
+        status: Optional[int] = None
+        response_headers: Headers = []
+        chunks: List[bytes] = []
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.extend(
+                    (k.decode("latin-1"), v.decode("latin-1"))
+                    for k, v in message.get("headers", [])
+                    if k.lower() != b"content-length"
+                )
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+        content_type = dict(response_headers).get("content-type", "")
+        if status == 200 and content_type.startswith("image/"):
+            await cache.set(
+                cache_key, encode_tile(response_headers, b"".join(chunks)), ttl, r
+            )
@@ -0,0 +1,171 @@
+"""Thread pool shared by the asset reads of all mosaic tiles."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from rio_tiler.models import ImageData
+
+from pctiler.config import get_settings
+
+Read = Callable[..., ImageData]
+
+
+class ReadPool:
+    """Reads the assets of mosaic tiles in one thread pool per process, so the
+    number of concurrent COG reads is bounded by `max_workers` however many
+    tiles are rendered at once.
+
+    A collection's concurrent reads can be capped further with
+    `max_concurrent_reads` in its render config, so that one slow collection
+    can't hold every thread.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mosaic-read"
+        )
+        self._lock = Lock()
+        self._queued = 0
+        self._active = 0
+        self._collection_reads: Dict[str, int] = {}
+        self._collection_limits: Dict[str, Tuple[int, BoundedSemaphore]] = {}
+
+    def reads(
+        self, read: Read, assets: Sequence[Any], collection: str, limit: Optional[int]
+    ) -> "TileReads":
+        """Return a reader function for `mosaic_reader` that reads `assets`
+        in this pool, for a tile of `collection`."""
+        semaphore = self._collection_semaphore(collection, limit)
+        window = min(self.max_workers, limit or self.max_workers)
+        return TileReads(self, read, assets, collection, window, semaphore)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of reads waiting for a thread and being read,
+        and the number of reads in flight per collection."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "active": self._active,
+                "collections": dict(self._collection_reads),
+            }
+
+    def _collection_semaphore(
+        self, collection: str, limit: Optional[int]
+    ) -> Optional[BoundedSemaphore]:
+        if not limit:
+            return None
+        with self._lock:
+            current = self._collection_limits.get(collection)
+            # Render configs are reloaded, so the limit may have changed
+            if current is None or current[0] != limit:
+                current = self._collection_limits[collection] = (
+                    limit,
+                    BoundedSemaphore(limit),
+                )
+            return current[1]
+
+    def submit(
+        self, collection: str, read: Read, *args: Any, **kwargs: Any
+    ) -> "Future[ImageData]":
+        with self._lock:
+            self._queued += 1
+            self._collection_reads[collection] = (
+                self._collection_reads.get(collection, 0) + 1
+            )
+        started = False
+
+        def _run() -> ImageData:
+            nonlocal started
+            with self._lock:
+                started = True
+                self._queued -= 1
+                self._active += 1
+            try:
+                return read(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        def _done(_: Future) -> None:
+            with self._lock:
+                # Cancelled before it started
+                if not started:
+                    self._queued -= 1
+                self._collection_reads[collection] -= 1
+                if not self._collection_reads[collection]:
+                    del self._collection_reads[collection]
+
+        future = self._executor.submit(_run)
+        future.add_done_callback(_done)
+        return future
+
+
+class TileReads:
+    """Reader function for `mosaic_reader` that reads the assets of a tile in
+    a `ReadPool`.
+
+    Like `mosaic_reader` with `threads`, up to `window` assets are read ahead
+    in order, and no more reads are scheduled once the tile is filled.
+    `mosaic_reader` must be called with `threads=1`, so it calls this for
+    each asset in turn, then `cancel` must be called to drop the reads ahead
+    that weren't used.
+    """
+
+    def __init__(
+        self,
+        pool: ReadPool,
+        read: Read,
+        assets: Sequence[Any],
+        collection: str,
+        window: int,
+        semaphore: Optional[BoundedSemaphore],
+    ) -> None:
+        self._pool = pool
+        self._read = read
+        self._assets = assets
+        self._positions = {id(asset): i for i, asset in enumerate(assets)}
+        self._collection = collection
+        self._window = window
+        self._semaphore = semaphore
+        self._futures: Dict[int, "Future[ImageData]"] = {}
+        self._next = 0
+
+    def __call__(self, asset: Any, *args: Any, **kwargs: Any) -> ImageData:
+        position = self._positions[id(asset)]
+        while self._next <= position:
+            self._submit(args, kwargs, blocking=True)
+        # Read ahead, without waiting for the collection's other reads
+        while self._next < min(position + self._window, len(self._assets)):
+            if not self._submit(args, kwargs, blocking=False):
+                break
+        return self._futures.pop(position).result()
+
+    def cancel(self) -> None:
+        futures: List[Future] = list(self._futures.values())
+        self._futures.clear()
+        for future in futures:
+            future.cancel()
+
+    def _submit(
+        self, args: Tuple[Any, ...], kwargs: Dict[str, Any], blocking: bool
+    ) -> bool:
+        semaphore = self._semaphore
+        if semaphore is not None and not semaphore.acquire(blocking=blocking):
+            return False
+        future = self._pool.submit(
+            self._collection, self._read, self._assets[self._next], *args, **kwargs
+        )
+        if semaphore is not None:
+            future.add_done_callback(lambda _: semaphore.release())
+        self._futures[self._next] = future
+        self._next += 1
+        return True
+
+
+@lru_cache
+def get_read_pool() -> ReadPool:
+    return ReadPool(get_settings().mosaic_read_threads)
@@ -1,15 +1,17 @@
 import logging
 import time
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple, Type
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
 import attr
 import morecantile
-import planetary_computer as pc
+from anyio import from_thread
 from cogeo_mosaic.errors import NoAssetFoundError
 from fastapi import HTTPException
 from geojson_pydantic import Polygon
+from rasterio.errors import RasterioIOError
 from rio_tiler.errors import InvalidAssetName, MissingAssets, TileOutsideBounds
+from rio_tiler.io import BaseReader, MultiBaseReader, Reader
 from rio_tiler.models import ImageData
 from rio_tiler.mosaic import mosaic_reader
 from rio_tiler.types import AssetInfo
@@ -20,14 +22,31 @@ from titiler.pgstac.reader import PgSTACReader
 from titiler.pgstac.settings import CacheSettings
 
 from pccommon.cdn import BlobCDN
-from pccommon.config import get_render_config
+from pccommon.config import get_apis_config, get_render_config
+from pccommon.constants import CACHE_KEY_EMPTY_TILE, CACHE_KEY_TILER_PREFIX
 from pccommon.logging import get_custom_dimensions
+from pccommon.redis import cache_error, get_cached_error, stac_items_tag
+from pccommon.utils import map_opt
 from pctiler.config import get_settings
+from pctiler.dataset_cache import CachedDataset, get_dataset_cache
+from pctiler.read_pool import get_read_pool
+from pctiler.tile_assets_cache import (
+    TileAssets,
+    ancestor_tiles,
+    ancestors_render_alike,
+    assets_within,
+    get_tile_assets_cache,
+    search_complete,
+    tile_assets_cache_key,
+)
+from pctiler.tokens import get_token_cache
 
 logger = logging.getLogger(__name__)
 
 cache_config = CacheSettings()
 
+T = TypeVar("T")
+
 
 @dataclass(init=False)
 class ReaderParams(DefaultDependency):
@@ -40,6 +59,125 @@ class ReaderParams(DefaultDependency):
         self.request = request
 
 
+class AssetUrlResolver:
+    """Resolves the URLs the assets of a collection are read from: hrefs are
+    rewritten to the CDN if available, and signed otherwise if the render
+    config of the item's collection requires a token.
+
+    Render configs are looked up once per collection, and CDN hosts once per
+    storage account and container, so one resolver is shared by the readers
+    of all the items of a tile. The GDAL environment and reader options of the
+    collection's read tuning are also resolved once.
+    """
+
+    def __init__(self, collection: Optional[str]) -> None:
+        self.collection = collection
+        self.render_config = get_render_config(collection) if collection else None
+        read_tuning = self.render_config.read_tuning if self.render_config else None
+        self.gdal_env: Dict[str, str] = (
+            read_tuning.get_gdal_env() if read_tuning else {}
+        )
+        self.reader_options: Dict[str, Any] = (
+            {"overview_bias": read_tuning.overview_bias}
+            if read_tuning and read_tuning.overview_bias
+            else {}
+        )
+        self._get_cdn_host = BlobCDN.cdn_host_lookup()
+        self._cdn_hosts: Dict[Tuple[str, str], Optional[str]] = {}
+        self._requires_token: Dict[str, bool] = {}
+        if collection:
+            self._requires_token[collection] = bool(
+                self.render_config and self.render_config.requires_token
+            )
+
+    def __call__(self, href: str, collection: Optional[str] = None) -> str:
+        """Resolve the href of an asset of an item of `collection`, or of the
+        resolver's collection if not given."""
+        cdn_href = BlobCDN.transform_if_available(href, self._cdn_host)
+        if cdn_href != href:
+            return cdn_href
+        if self.requires_token(collection or self.collection):
+            return get_token_cache().sign(href)
+        return href
+
+    def requires_token(self, collection: Optional[str]) -> bool:
+        if not collection:
+            return False
+        if collection not in self._requires_token:
+            render_config = get_render_config(collection)
+            self._requires_token[collection] = bool(
+                render_config and render_config.requires_token
+            )
+        return self._requires_token[collection]
+
+    def _cdn_host(self, storage_account: str, container: str) -> Optional[str]:
+        key = (storage_account, container)
+        if key not in self._cdn_hosts:
+            self._cdn_hosts[key] = self._get_cdn_host(*key)
+        return self._cdn_hosts[key]
+
+
+@attr.s
+class COGReader(Reader):
+    """Reader that reuses a dataset left open by an earlier read of the same
+    href, if the dataset cache is enabled, and keeps its dataset open for
+    later reads when closed.
+
+    Tiles are read from overviews `overview_bias` levels coarser than the
+    tile's resolution, and upsampled, if set.
+    """
+
+    overview_bias: int = attr.ib(default=0)
+
+    _cached: Optional[CachedDataset] = attr.ib(init=False, default=None)
+
+    def __attrs_post_init__(self) -> None:
+        cache = get_dataset_cache()
+        if self.dataset is None and cache.enabled:
+            self._cached = cache.checkout(self.input)
+            self.dataset = self._cached.dataset
+        try:
+            super().__attrs_post_init__()
+        except Exception:
+            self._discard()
+            raise
+
+    def tile(  # type: ignore
+        self, tile_x: int, tile_y: int, tile_z: int, tilesize: int = 256, **kwargs: Any
+    ) -> ImageData:
+        # Buffers are in pixels of the output tile
+        if not self.overview_bias or kwargs.get("buffer"):
+            return super().tile(tile_x, tile_y, tile_z, tilesize=tilesize, **kwargs)
+
+        # GDAL picks the overview closest to the resolution read
+        read_size = max(tilesize >> self.overview_bias, 1)
+        img = super().tile(tile_x, tile_y, tile_z, tilesize=read_size, **kwargs)
+        return img.resize(
+            tilesize,
+            tilesize,
+            resampling_method=kwargs.get("resampling_method", "nearest"),
+        )
+
+    def close(self) -> None:
+        super().close()
+        if self._cached is not None:
+            get_dataset_cache().checkin(self.input, self._cached)
+            self._cached = None
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        # Don't reuse a dataset that failed to read, e.g. with an expired token
+        if isinstance(exc_value, RasterioIOError):
+            self._discard()
+        self.close()
+
+    def _discard(self) -> None:
+        # Close anything wrapping the dataset first
+        super().close()
+        if self._cached is not None:
+            self._cached.dataset.close()
+            self._cached = None
+
+
 @attr.s
 class ItemSTACReader(PgSTACReader):
 
@@ -47,17 +185,17 @@ class ItemSTACReader(PgSTACReader):
     # the whole list of attribute
     request: Optional[Request] = attr.ib(default=None)
 
+    reader: Type[BaseReader] = attr.ib(default=COGReader)
+
+    _url_resolver: Optional[AssetUrlResolver] = attr.ib(init=False, default=None)
+
     def _get_asset_info(self, asset: str) -> AssetInfo:
         """return asset's url."""
         info = super()._get_asset_info(asset)
-        asset_url = BlobCDN.transform_if_available(info["url"])
-
-        if self.input.collection_id:
-            render_config = get_render_config(self.input.collection_id)
-            if render_config and render_config.requires_token:
-                asset_url = pc.sign(asset_url)
-
-        info["url"] = asset_url
+        if self._url_resolver is None:
+            self._url_resolver = AssetUrlResolver(self.input.collection_id)
+        info["url"] = self._url_resolver(info["url"])
+        _apply_read_tuning(self, info, self._url_resolver)
         return info
 
 
@@ -69,6 +207,11 @@ class MosaicSTACReader(pgstac_mosaic.CustomSTACReader):
     # the whole list of attribute
     request: Optional[Request] = attr.ib(default=None)
 
+    reader: Type[BaseReader] = attr.ib(default=COGReader)
+
+    # Shared by the readers of all the items of a mosaic tile
+    url_resolver: Optional[AssetUrlResolver] = attr.ib(default=None)
+
     def _get_asset_info(self, asset: str) -> AssetInfo:
         """Validate asset names and return asset's info.
 
@@ -82,13 +225,10 @@ class MosaicSTACReader(pgstac_mosaic.CustomSTACReader):
         if asset not in self.assets:
             raise InvalidAssetName(f"{asset} is not valid")
 
-        asset_url = BlobCDN.transform_if_available(self.input["assets"][asset]["href"])
-
         collection = self.input.get("collection", None)
-        if collection:
-            render_config = get_render_config(collection)
-            if render_config and render_config.requires_token:
-                asset_url = pc.sign(asset_url)
+        if self.url_resolver is None:
+            self.url_resolver = AssetUrlResolver(collection)
+        asset_url = self.url_resolver(self.input["assets"][asset]["href"], collection)
 
         info = AssetInfo(url=asset_url)
         if "file:header_size" in self.input["assets"][asset]:
@@ -97,10 +237,25 @@ class MosaicSTACReader(pgstac_mosaic.CustomSTACReader):
                     "file:header_size"
                 ]
             }
+        _apply_read_tuning(self, info, self.url_resolver)
 
         return info
 
 
+def _apply_read_tuning(
+    stac_reader: MultiBaseReader, info: AssetInfo, url_resolver: AssetUrlResolver
+) -> None:
+    """Read an asset with the GDAL environment and reader options of its
+    collection's read tuning. The asset's own settings take precedence."""
+    if url_resolver.gdal_env:
+        info["env"] = {**url_resolver.gdal_env, **(info.get("env") or {})}
+    if url_resolver.reader_options:
+        stac_reader.reader_options = {
+            **url_resolver.reader_options,
+            **stac_reader.reader_options,
+        }
+
+
 @attr.s
 class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
     """PgSTAC Mosaic Backend."""
@@ -113,7 +268,13 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
 
     # Override from PGSTACBackend to use collection
     def assets_for_tile(  # type: ignore
-        self, x: int, y: int, z: int, collection: Optional[str] = None, **kwargs: Any
+        self,
+        x: int,
+        y: int,
+        z: int,
+        collection: Optional[str] = None,
+        ancestors: bool = True,
+        **kwargs: Any,
     ) -> List[Dict]:
         settings = get_settings()
 
@@ -141,8 +302,9 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
         )
         asset_kwargs = {**kwargs, "items_limit": max_items}
 
-        bbox = self.tms.bounds(morecantile.Tile(x, y, z))
-        assets = self.get_assets(Polygon.from_bounds(*bbox), **asset_kwargs)
+        assets, source = self._get_tile_assets(
+            morecantile.Tile(x, y, z), collection, ancestors, **asset_kwargs
+        )
 
         logger.info(
             "Perf: Mosaic get assets for tile.",
@@ -152,12 +314,95 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
                     "collection": collection,
                     "zxy": f"{z}/{x}/{y}",
                     "count": len(assets),
+                    "source": source,
                 },
                 self.request,  # type: ignore
             ),
         )
         return assets
 
+    def _get_tile_assets(
+        self,
+        tile: morecantile.Tile,
+        collection: str,
+        ancestors: bool,
+        **search_kwargs: Any,
+    ) -> Tuple[List[Dict], str]:
+        """Return the assets of a tile, and whether they were found by a
+        "search", are cached for the tile ("cache") or are filtered from those
+        cached for an ancestor tile ("ancestor"), if `ancestors` is True."""
+        cache = get_tile_assets_cache()
+        bbox = self.tms.bounds(tile)
+        if not cache.enabled:
+            return (
+                self.get_assets(Polygon.from_bounds(*bbox), **search_kwargs),
+                "search",
+            )
+
+        levels = cache.parent_levels if ancestors else 0
+        tiles = [tile, *ancestor_tiles(self.tms, tile, levels)]
+        keys = [
+            tile_assets_cache_key(
+                self.input, collection, self.tms.id, t, **search_kwargs
+            )
+            for t in tiles
+        ]
+
+        cached = cache.get_local(keys)
+        redis = getattr(self.request.app.state, "redis", None) if self.request else None
+        if cached[0] is None and redis is not None:
+            # Look up the tile and its ancestors in one round trip
+            missing = [i for i, entry in enumerate(cached) if entry is None]
+            found = self._from_thread(
+                cache.get_redis, redis, [keys[i] for i in missing]
+            )
+            for i, entry in zip(missing, found or []):
+                cached[i] = entry
+            if cached[0] is not None:
+                cache.set_local(keys[0], cached[0])
+
+        if cached[0] is not None:
+            return cached[0].assets, "cache"
+
+        for ancestor in cached[1:]:
+            if ancestor is None:
+                continue
+            assets = assets_within(ancestor, bbox)
+            if assets is not None:
+                cache.set_local(keys[0], TileAssets(assets, complete=True))
+                return assets, "ancestor"
+
+        ts = time.perf_counter()
+        assets = self.get_assets(Polygon.from_bounds(*bbox), **search_kwargs)
+        entry = TileAssets(
+            assets,
+            complete=search_complete(assets, time.perf_counter() - ts, **search_kwargs),
+        )
+        cache.set_local(keys[0], entry)
+        if redis is not None:
+            self._from_thread(
+                cache.set_redis, redis, keys[0], entry, [stac_items_tag(collection)]
+            )
+        return assets, "search"
+
+    def _empty_tile_cache_key(self, x: int, y: int, z: int, **kwargs: Any) -> str:
+        params = ":".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+        return (
+            f"{CACHE_KEY_TILER_PREFIX}{CACHE_KEY_EMPTY_TILE}:"
+            f"{self.input}:{self.tms.id}:{z}:{x}:{y}:{params}"
+        )
+
+    def _from_thread(self, fn: Callable[..., Awaitable[T]], *args: Any) -> Optional[T]:
+        """Run a cache call on the event loop from the worker thread tiles are
+        read in. Returns None if the call can't be made."""
+        if not self.request:
+            return None
+        try:
+            return from_thread.run(fn, *args)
+        except Exception as e:
+            logger.warning(f"Cache call {fn.__name__} skipped: {e}")
+            return None
+
     # override from PGSTACBackend to pass through collection
     def tile(  # type: ignore
         self,
@@ -173,10 +418,7 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
         **kwargs: Any,
     ) -> Tuple[ImageData, List[str]]:
         """Get Tile from multiple observation."""
-        mosaic_assets = self.assets_for_tile(
-            tile_x,
-            tile_y,
-            tile_z,
+        search_kwargs = dict(
             collection=collection,
             scan_limit=scan_limit,
             items_limit=items_limit,
@@ -185,10 +427,45 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
             skipcovered=skipcovered,
         )
 
+        # Tiles without assets, e.g. over the ocean, are cached as errors
+        cache_empty_tiles = get_apis_config().redis_negative_ttl > 0
+        empty_tile_key = self._empty_tile_cache_key(
+            tile_x, tile_y, tile_z, **search_kwargs
+        )
+        if cache_empty_tiles:
+            cached_error = self._from_thread(
+                get_cached_error, self.request, empty_tile_key, [NoAssetFoundError]
+            )
+            if cached_error:
+                raise cached_error
+
+        mosaic_assets = self.assets_for_tile(
+            tile_x,
+            tile_y,
+            tile_z,
+            ancestors=ancestors_render_alike(
+                kwargs.get("pixel_selection"), exitwhenfull
+            ),
+            **search_kwargs,  # type: ignore
+        )
+
         if not mosaic_assets:
-            raise NoAssetFoundError(
+            error = NoAssetFoundError(
                 f"No assets found for tile {tile_z}-{tile_x}-{tile_y}"
             )
+            if collection and cache_empty_tiles:
+                self._from_thread(
+                    cache_error,
+                    self.request,
+                    empty_tile_key,
+                    error,
+                    [stac_items_tag(collection)],
+                )
+            raise error
+
+        # Resolve the render config, CDN hosts and SAS tokens once for all
+        # the items of the tile
+        url_resolver = AssetUrlResolver(collection)
 
         ts = time.perf_counter()
 
@@ -196,20 +473,40 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
             item: Dict[str, Any], x: int, y: int, z: int, **kwargs: Any
         ) -> ImageData:
             with self.reader(
-                item, tms=self.tms, **self.reader_options  # type: ignore
+                item,
+                tms=self.tms,
+                url_resolver=url_resolver,
+                **self.reader_options,  # type: ignore
             ) as src_dst:
                 return src_dst.tile(x, y, z, **kwargs)
 
-        tile = mosaic_reader(
-            mosaic_assets,
+        # Read in the process's shared pool rather than a pool per tile
+        read_pool = get_read_pool()
+        reads = read_pool.reads(
             _reader,
-            tile_x,
-            tile_y,
-            tile_z,
-            allowed_exceptions=(TileOutsideBounds, MissingAssets, InvalidAssetName),
-            **kwargs,
+            mosaic_assets,
+            collection or "",
+            map_opt(lambda c: c.max_concurrent_reads, url_resolver.render_config),
         )
+        try:
+            tile = mosaic_reader(
+                mosaic_assets,
+                reads,
+                tile_x,
+                tile_y,
+                tile_z,
+                threads=1,
+                allowed_exceptions=(
+                    TileOutsideBounds,
+                    MissingAssets,
+                    InvalidAssetName,
+                ),
+                **kwargs,
+            )
+        finally:
+            reads.cancel()
 
+        pool_stats = read_pool.stats()
         logger.info(
             "Perf: Mosaic read tile.",
             extra=get_custom_dimensions(
@@ -218,6 +515,8 @@ class PGSTACBackend(pgstac_mosaic.PGSTACBackend):
                     "collection": collection,
                     "zxy": f"{tile_z}/{tile_x}/{tile_y}",
                     "count": len(mosaic_assets),
+                    "read_pool_queued": pool_stats["queued"],
+                    "read_pool_active": pool_stats["active"],
                 },
                 self.request,  # type: ignore
             ),
@@ -1,19 +1,44 @@
+import asyncio
 import logging
 import time
 from typing import Optional
 
-import planetary_computer as pc
-import requests
+import httpx
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 
 from pccommon.config.collections import VectorTileset
 from pccommon.logging import get_custom_dimensions
 from pctiler.config import get_settings
+from pctiler.tokens import get_token_cache
 
 settings = get_settings()
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before the first retry of a failed connection or a 5xx
+# response, doubled for each further retry
+RETRY_BACKOFF_SECONDS = 0.1
+
+
+async def connect_vector_tile_client(app: FastAPI) -> None:
+    """Create the HTTP client used to fetch vector tiles, with a connection
+    pool shared by all requests."""
+    app.state.vector_tile_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.vector_tile_max_connections,
+            max_keepalive_connections=settings.vector_tile_max_connections,
+        ),
+        timeout=httpx.Timeout(settings.request_timeout, connect=5.0),
+    )
+
+
+async def close_vector_tile_client(app: FastAPI) -> None:
+    client: Optional[httpx.AsyncClient] = getattr(app.state, "vector_tile_client", None)
+    if client:
+        await client.aclose()
+
 
 class VectorTileReader:
     """
@@ -25,14 +50,31 @@ class VectorTileReader:
         self.tileset = tileset
         self.collection = collection
 
-    def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+    async def open_tile(self, z: int, x: int, y: int) -> Optional[httpx.Response]:
         """
-        Get a vector tile from a storage account container
+        Request a vector tile from a storage account container. Returns the
+        response with its body unread, to be streamed with `aiter_raw` and
+        closed by the caller, or None if the tile doesn't exist.
         """
-        blob_url = self._blob_url_for_tile(z, x, y)
+        client: httpx.AsyncClient = self.request.app.state.vector_tile_client
+        blob_url = await self._blob_url_for_tile(z, x, y)
 
         ts = time.perf_counter()
-        response = requests.get(blob_url, stream=True)
+        for attempt in range(settings.vector_tile_retries + 1):
+            last_attempt = attempt == settings.vector_tile_retries
+            try:
+                response = await client.send(
+                    client.build_request("GET", blob_url), stream=True
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # Nothing was sent, so the request is safe to retry
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code < 500 or last_attempt:
+                    break
+                await response.aclose()
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2**attempt)
         logger.info(
             "Perf: PBF upsteam load time",
             extra=get_custom_dimensions(
@@ -41,13 +83,30 @@ class VectorTileReader:
         )
 
         if response.status_code == 404:
+            await response.aclose()
             return None
 
         if response.status_code != 200:
-            raise Exception(f"Error loading tile {blob_url}")
+            await response.aclose()
+            raise Exception(
+                f"Error loading tile {z}/{x}/{y}, status {response.status_code}"
+            )
+
+        return response
+
+    async def get_tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """
+        Get a vector tile from a storage account container, as stored
+        """
+        response = await self.open_tile(z, x, y)
+        if response is None:
+            return None
 
         ts = time.perf_counter()
-        b = response.raw.read()
+        try:
+            b = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
         logger.info(
             "Perf: PBF raw bytes read",
             extra=get_custom_dimensions(
@@ -56,7 +115,7 @@ class VectorTileReader:
         )
         return b
 
-    def _blob_url_for_tile(self, z: int, x: int, y: int) -> str:
+    async def _blob_url_for_tile(self, z: int, x: int, y: int) -> str:
         """
         Get the URL to the storage account container and blob
         """
@@ -66,4 +125,9 @@ class VectorTileReader:
             f"/{self.tileset.id}/{z}/{x}/{y}.pbf"
         )
 
-        return pc.sign_url(tile_url)
+        token_cache = get_token_cache()
+        signed_url = token_cache.sign_cached(tile_url)
+        if signed_url is None:
+            # Don't block the event loop requesting a token
+            signed_url = await run_in_threadpool(token_cache.sign, tile_url)
+        return signed_url
@@ -0,0 +1,214 @@
+"""Cache for the assets a mosaic search returns for tiles."""
+
+import logging
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import morecantile
+import orjson
+from cachetools import TTLCache
+from redis.asyncio import Redis
+
+from pccommon.config import get_apis_config
+from pccommon.constants import CACHE_KEY_TILE_ASSETS, CACHE_KEY_TILER_PREFIX
+from pccommon.redis import queue_cache_tags
+from pctiler.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+Assets = List[Dict[str, Any]]
+
+# titiler.pgstac's defaults for mosaic searches
+DEFAULT_SCAN_LIMIT = 10000
+DEFAULT_ITEMS_LIMIT = 100
+DEFAULT_TIME_LIMIT = 5
+
+
+class TileAssets(NamedTuple):
+    assets: Assets
+    # Whether the search ran to completion, rather than stopping at one of
+    # its limits
+    complete: bool
+
+
+def search_complete(
+    assets: Assets,
+    elapsed: float,
+    scan_limit: Optional[int] = None,
+    items_limit: Optional[int] = None,
+    time_limit: Optional[int] = None,
+    skipcovered: Optional[bool] = None,
+    **kwargs: Any,
+) -> bool:
+    """Return whether a mosaic search that returned `assets` in `elapsed`
+    seconds can't have been stopped by its items, scan or time limit.
+
+    Items skipped as covered by `skipcovered` count towards the scan limit but
+    aren't returned, so those searches can't be told to have stayed under it.
+    pgstac skips covered items unless `skipcovered` is False, so only searches
+    that explicitly disable it can be complete. Stopping because the searched
+    area is covered (`exitwhenfull`) is not a limit, see
+    `ancestors_render_alike`.
+    """
+    if len(assets) >= (items_limit or DEFAULT_ITEMS_LIMIT):
+        return False
+    if elapsed >= (time_limit or DEFAULT_TIME_LIMIT):
+        return False
+    if skipcovered is None or skipcovered:
+        return False
+    return len(assets) < (scan_limit or DEFAULT_SCAN_LIMIT)
+
+
+def ancestors_render_alike(
+    pixel_selection: Any = None, exitwhenfull: Optional[bool] = None
+) -> bool:
+    """Return whether the assets filtered from an ancestor tile's complete
+    search render the same tile as the tile's own search.
+
+    They include the assets a search of the tile returns, in the same order.
+    When searches stop once their area is covered (`exitwhenfull`, pgstac's
+    default), they can also include assets after the point the tile's own
+    search would have stopped. Those are never read with a pixel selection
+    that stops at the first asset covering each pixel, like "first", but
+    change the tile for others, like "mean" or "median".
+    """
+    if exitwhenfull is False:
+        return True
+    return bool(getattr(pixel_selection, "exit_when_filled", True))
+
+
+def tile_assets_cache_key(
+    search_id: str,
+    collection: str,
+    tms_id: Optional[str],
+    tile: morecantile.Tile,
+    **search_kwargs: Any,
+) -> str:
+    params = ":".join(f"{k}={v}" for k, v in sorted(search_kwargs.items()))
+    return (
+        f"{CACHE_KEY_TILER_PREFIX}{CACHE_KEY_TILE_ASSETS}:{search_id}:"
+        f"{collection}:{tms_id}:{tile.z}:{tile.x}:{tile.y}:{params}"
+    )
+
+
+def ancestor_tiles(
+    tms: morecantile.TileMatrixSet, tile: morecantile.Tile, levels: int
+) -> List[morecantile.Tile]:
+    """Return the ancestors of a tile up to `levels` zooms up, nearest first.
+    Only tile matrix sets where each tile has a single parent are supported."""
+    ancestors: List[morecantile.Tile] = []
+    for zoom in range(tile.z - 1, max(tile.z - levels, 0) - 1, -1):
+        parents = tms.parent(tile, zoom=zoom)
+        if len(parents) != 1:
+            break
+        ancestors.append(parents[0])
+    return ancestors
+
+
+def _intersects(asset: Dict[str, Any], bbox: Sequence[float]) -> bool:
+    item_bbox = asset.get("bbox")
+    if not item_bbox:
+        return True
+    # 2D or 3D bbox
+    half = len(item_bbox) // 2
+    minx, miny = item_bbox[0], item_bbox[1]
+    maxx, maxy = item_bbox[half], item_bbox[half + 1]
+    if miny > bbox[3] or maxy < bbox[1]:
+        return False
+    if minx > maxx:
+        # Crosses the antimeridian
+        return True
+    return minx <= bbox[2] and maxx >= bbox[0]
+
+
+def assets_within(ancestor: TileAssets, bbox: Sequence[float]) -> Optional[Assets]:
+    """Return the assets of an ancestor tile that may intersect `bbox`, in
+    search order, or None if the ancestor's search may have been cut short by
+    one of its limits, in which case they can't stand in for a search of
+    `bbox`."""
+    if not ancestor.complete:
+        return None
+    return [asset for asset in ancestor.assets if _intersects(asset, bbox)]
+
+
+class TileAssetsCache:
+    """Caches the assets a mosaic search returns for tiles, in process and in
+    redis.
+
+    A tile that isn't cached can be served from a cached ancestor tile up to
+    `parent_levels` zooms up, by keeping the ancestor's assets whose bbox
+    intersects the tile. Every asset a search of the tile would return is
+    among them, as long as the ancestor's search ran to completion, which
+    needs `skipcovered` to be disabled (see `search_complete`). Extra assets
+    that don't cover the tile are skipped when the tile is read, unless the
+    pixel selection reads past the first asset covering each pixel (see
+    `ancestors_render_alike`).
+
+    Redis entries are tagged like other entries built from the collection's
+    items, so they're deleted when the items change. In-process entries
+    expire after the TTL.
+
+    In-process entries are read and written from the threads tiles are read in.
+    """
+
+    def __init__(self, local_size: int, ttl: int, parent_levels: int) -> None:
+        self.ttl = ttl
+        self.parent_levels = parent_levels
+        self._local: Optional[TTLCache] = (
+            TTLCache(maxsize=local_size, ttl=ttl) if local_size and ttl else None
+        )
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_local(self, keys: Sequence[str]) -> List[Optional[TileAssets]]:
+        if self._local is None:
+            return [None] * len(keys)
+        with self._lock:
+            return [self._local.get(key) for key in keys]
+
+    def set_local(self, key: str, entry: TileAssets) -> None:
+        if self._local is None:
+            return
+        with self._lock:
+            self._local[key] = entry
+
+    async def get_redis(
+        self, r: Optional[Redis], keys: Sequence[str]
+    ) -> List[Optional[TileAssets]]:
+        if r is None or not keys:
+            return [None] * len(keys)
+        try:
+            stored: List[Optional[bytes]] = await r.mget(keys)
+        except Exception as e:
+            logger.warning(f"Error reading tile assets cache: {e}")
+            return [None] * len(keys)
+        return [None if s is None else TileAssets(*orjson.loads(s)) for s in stored]
+
+    async def set_redis(
+        self, r: Optional[Redis], key: str, entry: TileAssets, tags: Sequence[str]
+    ) -> None:
+        if r is None:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.set(key, orjson.dumps(tuple(entry)), self.ttl)
+                queue_cache_tags(
+                    pipe, key, tags, max(self.ttl, get_apis_config().redis_ttl)
+                )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error writing tile assets cache: {e}")
+
+
+@lru_cache
+def get_tile_assets_cache() -> TileAssetsCache:
+    settings = get_settings()
+    return TileAssetsCache(
+        local_size=settings.tile_assets_cache_local_size,
+        ttl=settings.tile_assets_cache_ttl,
+        parent_levels=settings.tile_assets_cache_parent_levels,
+    )
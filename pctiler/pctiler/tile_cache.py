@@ -0,0 +1,135 @@
+"""Cache for rendered raster tiles from the item and mosaic tile endpoints."""
+
+import hashlib
+import logging
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from cachetools import LRUCache
+from redis.asyncio import Redis
+
+from pccommon.config import get_apis_config
+from pccommon.constants import (
+    CACHE_KEY_RASTER_TILE,
+    CACHE_KEY_TILER_PREFIX,
+    QS_REQUEST_ENTITY,
+)
+from pctiler.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that don't affect the rendered tile
+IGNORED_QUERY_PARAMS = {QS_REQUEST_ENTITY, "subscription-key"}
+
+Headers = List[Tuple[str, str]]
+
+
+def raster_tile_cache_key(path: str, query_string: str) -> str:
+    """Return the cache key for a tile request.
+
+    The path identifies the item or mosaic search, tile matrix set, z/x/y,
+    scale and format. Query parameters, which hold the collection, item and
+    render parameters, are sorted by name, so equivalent requests share an
+    entry. The order of repeated parameters, e.g. assets, is kept.
+    """
+    params = sorted(
+        (
+            (k, v)
+            for k, v in parse_qsl(query_string, keep_blank_values=True)
+            if k not in IGNORED_QUERY_PARAMS
+        ),
+        key=lambda p: p[0],
+    )
+    digest = hashlib.sha256(f"{path}?{urlencode(params)}".encode()).hexdigest()
+    return f"{CACHE_KEY_TILER_PREFIX}{CACHE_KEY_RASTER_TILE}:{digest}"
+
+
+def encode_tile(headers: Headers, body: bytes) -> bytes:
+    return orjson.dumps(headers) + b"\n" + body
+
+
+def decode_tile(stored: bytes) -> Tuple[Headers, bytes]:
+    headers, body = stored.split(b"\n", 1)
+    return [(k, v) for k, v in orjson.loads(headers)], body
+
+
+def get_tile_cache_ttl(collection: Optional[str]) -> int:
+    """Seconds tiles of a collection are cached: the collection's
+    `tile_cache_ttl`, or the tiler's default."""
+    default_ttl = get_settings().raster_tile_cache_ttl
+    if not collection:
+        return default_ttl
+    registry = get_apis_config().get_collection_config_registry()
+    # Don't read the table from the event loop
+    if not registry.loaded:
+        return default_ttl
+    config = registry.get(collection)
+    if config is None or config.render_config.tile_cache_ttl is None:
+        return default_ttl
+    return config.render_config.tile_cache_ttl
+
+
+class RasterTileCache:
+    """Caches encoded (PNG/JPEG/WebP...) tiles with their response headers.
+
+    Entries are kept in an in-process LRU bounded by total size in bytes, and
+    in redis. Each entry expires after the TTL of the tile's collection, in
+    both tiers.
+
+    Only accessed from the event loop.
+    """
+
+    def __init__(self, local_max_bytes: int) -> None:
+        self._local: Optional[LRUCache] = (
+            LRUCache(maxsize=local_max_bytes, getsizeof=lambda e: len(e[1]))
+            if local_max_bytes
+            else None
+        )
+
+    async def get(self, cache_key: str, r: Optional[Redis]) -> Optional[bytes]:
+        if self._local is not None:
+            entry: Optional[Tuple[float, bytes]] = self._local.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+        if r is None:
+            return None
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.get(cache_key)
+                pipe.ttl(cache_key)
+                stored, ttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error reading raster tile cache: {e}")
+            return None
+        if stored is not None and self._local is not None and ttl > 0:
+            self._set_local(cache_key, stored, ttl)
+        return stored
+
+    async def set(
+        self, cache_key: str, stored: bytes, ttl: int, r: Optional[Redis]
+    ) -> None:
+        if self._local is not None:
+            self._set_local(cache_key, stored, ttl)
+        if r is None:
+            return
+        try:
+            await r.set(cache_key, stored, ttl)
+        except Exception as e:
+            logger.warning(f"Error writing raster tile cache: {e}")
+
+    def _set_local(self, cache_key: str, stored: bytes, ttl: int) -> None:
+        assert self._local is not None
+        try:
+            self._local[cache_key] = (time.monotonic() + ttl, stored)
+        except ValueError:
+            # Larger than the whole cache
+            pass
+
+
+@lru_cache
+def get_raster_tile_cache() -> RasterTileCache:
+    return RasterTileCache(get_settings().raster_tile_cache_local_mb * 1024 * 1024)
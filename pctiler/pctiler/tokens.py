@@ -0,0 +1,173 @@
+"""SAS tokens for signing asset hrefs, renewed in the background."""
+
+import logging
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+import urllib3
+from planetary_computer.sas import SASToken
+from planetary_computer.settings import Settings as PCSettings
+
+from pccommon.cdn import split_blob_href
+from pctiler.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails and other public assets are not signed
+PUBLIC_STORAGE_ACCOUNTS = {"ai4edatasetspublicassets"}
+
+# Tokens are not used with less than this many seconds left
+TOKEN_MIN_TTL_SECONDS = 60
+
+ContainerKey = Tuple[str, str]
+
+
+def fetch_token(storage_account: str, container: str) -> SASToken:
+    """Request a SAS token for a container from the Planetary Computer SAS API."""
+    pc_settings = PCSettings.get()
+    response = _get_session().get(
+        f"{pc_settings.sas_url}/{storage_account}/{container}",
+        headers=(
+            {"Ocp-Apim-Subscription-Key": pc_settings.subscription_key}
+            if pc_settings.subscription_key
+            else None
+        ),
+        timeout=get_settings().request_timeout,
+    )
+    response.raise_for_status()
+    return SASToken(**response.json())
+
+
+def _container_to_sign(href: str) -> Optional[ContainerKey]:
+    parts = split_blob_href(href)
+    if not parts:
+        return None
+    _, _, storage_account, container = parts
+    if storage_account in PUBLIC_STORAGE_ACCOUNTS or "?" in href:
+        return None
+    return storage_account, container
+
+
+@lru_cache
+def _get_session() -> requests.Session:
+    session = requests.Session()
+    retry = urllib3.util.retry.Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    session.mount("https://", requests.adapters.HTTPAdapter(max_retries=retry))
+    return session
+
+
+class SASTokenCache:
+    """SAS tokens per storage account and container, used to sign asset hrefs.
+
+    A token is requested the first time a container is signed for. After that,
+    a background thread renews each token `renew_before_seconds` before it
+    expires, so signing is a lookup and a string append. Concurrent requests
+    for the same container's token share a single call to the SAS API.
+    """
+
+    def __init__(
+        self,
+        renew_before_seconds: int,
+        fetch: Callable[[str, str], SASToken] = fetch_token,
+    ) -> None:
+        self.renew_before_seconds = renew_before_seconds
+        self._fetch = fetch
+        self._tokens: Dict[ContainerKey, SASToken] = {}
+        self._fetching: Dict[ContainerKey, "Future[SASToken]"] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sign(self, href: str) -> str:
+        """Sign an asset href, if it is for blob storage. Returns the href
+        unmodified otherwise, or if it is already signed."""
+        key = _container_to_sign(href)
+        if key is None:
+            return href
+        return f"{href}?{self.get_token(*key).token}"
+
+    def sign_cached(self, href: str) -> Optional[str]:
+        """Sign an href like `sign`, without requesting a token. Returns None if
+        a token needs to be requested, e.g. on the first use of a container,
+        so callers on the event loop can sign in a thread instead."""
+        key = _container_to_sign(href)
+        if key is None:
+            return href
+        token = self._tokens.get(key)
+        if token is None or token.ttl() <= TOKEN_MIN_TTL_SECONDS:
+            return None
+        return f"{href}?{token.token}"
+
+    def get_token(self, storage_account: str, container: str) -> SASToken:
+        key = (storage_account, container)
+        token = self._tokens.get(key)
+        if token is not None and token.ttl() > TOKEN_MIN_TTL_SECONDS:
+            return token
+        return self._renew(key)
+
+    def _renew(self, key: ContainerKey) -> SASToken:
+        """Request a new token, or wait for a request already in flight."""
+        with self._lock:
+            future = self._fetching.get(key)
+            owner = future is None
+            if future is None:
+                future = self._fetching[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            token = self._fetch(*key)
+            self._tokens[key] = token
+            future.set_result(token)
+            return token
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._fetching[key]
+
+    def renew_expiring(self) -> None:
+        """Renew the tokens that expire within `renew_before_seconds`."""
+        for key, token in list(self._tokens.items()):
+            if token.ttl() > self.renew_before_seconds:
+                continue
+            try:
+                self._renew(key)
+            except Exception as e:
+                # The current token is used until it expires
+                logger.error(f"Error renewing SAS token for {key[0]}/{key[1]}: {e}")
+
+    def start(self) -> None:
+        """Start renewing tokens in the background."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._renew_forever, name="sas-token-renewal", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _renew_forever(self) -> None:
+        # Check often enough that no token gets within the renewal window
+        # unnoticed
+        interval = max(1, self.renew_before_seconds // 4)
+        while not self._stop.wait(interval):
+            self.renew_expiring()
+
+
+@lru_cache
+def get_token_cache() -> SASTokenCache:
+    return SASTokenCache(get_settings().sas_token_renew_before_seconds)
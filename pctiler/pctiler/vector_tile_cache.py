@@ -0,0 +1,132 @@
+"""Cache for vector tiles proxied from blob storage."""
+
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+from cachetools import LRUCache
+from redis.asyncio import Redis
+
+from pccommon.constants import CACHE_KEY_TILER_PREFIX, CACHE_KEY_VECTOR_TILE
+from pccommon.inflight import InflightTasks
+from pctiler.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of tiles that don't exist. Tiles are gzipped, so never
+# start with a null byte.
+NOT_FOUND = b"\x00404"
+
+
+def vector_tile_cache_key(
+    collection: str, tileset_id: str, z: int, x: int, y: int
+) -> str:
+    return (
+        f"{CACHE_KEY_TILER_PREFIX}{CACHE_KEY_VECTOR_TILE}:"
+        f"{collection}:{tileset_id}:{z}:{x}:{y}"
+    )
+
+
+class VectorTileCache:
+    """Caches vector tiles exactly as stored (gzipped), and tiles that don't
+    exist.
+
+    Tiles are immutable, so they are cached for long periods in two tiers: an
+    in-process LRU bounded by total size in bytes, for tiles up to
+    `local_maxzoom`, which are few and requested most often; and redis for
+    all tiles. Tiles that don't exist are only cached in redis, for
+    `not_found_ttl` seconds, so that tiles added later are found. Concurrent
+    requests for the same uncached tile in this process share a single fetch.
+
+    Only accessed from the event loop.
+    """
+
+    def __init__(
+        self,
+        local_max_bytes: int,
+        local_maxzoom: int,
+        ttl: int,
+        not_found_ttl: int,
+    ) -> None:
+        self.local_maxzoom = local_maxzoom
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self._local: Optional[LRUCache] = (
+            LRUCache(maxsize=local_max_bytes, getsizeof=len)
+            if local_max_bytes
+            else None
+        )
+        self._inflight: InflightTasks[bytes] = InflightTasks()
+
+    @property
+    def enabled(self) -> bool:
+        return self._local is not None or self.ttl > 0
+
+    async def get_tile(
+        self,
+        cache_key: str,
+        z: int,
+        fetch: Callable[[], Awaitable[Optional[bytes]]],
+        r: Optional[Redis],
+    ) -> Optional[bytes]:
+        """Return the cached tile, or None if the tile doesn't exist. On a
+        miss, the tile is read with `fetch` and cached."""
+        local = self._local if z <= self.local_maxzoom else None
+        if local is not None:
+            stored: Optional[bytes] = local.get(cache_key)
+            if stored is not None:
+                return _tile(stored)
+
+        task = self._inflight.get_or_start(
+            cache_key, lambda: self._fill(cache_key, fetch, r)
+        )
+        stored = await asyncio.shield(task)
+
+        if local is not None and stored != NOT_FOUND:
+            try:
+                local[cache_key] = stored
+            except ValueError:
+                # Larger than the whole cache
+                pass
+        return _tile(stored)
+
+    async def _fill(
+        self,
+        cache_key: str,
+        fetch: Callable[[], Awaitable[Optional[bytes]]],
+        r: Optional[Redis],
+    ) -> bytes:
+        if r is not None and self.ttl:
+            try:
+                cached: Optional[bytes] = await r.get(cache_key)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                logger.warning(f"Error reading vector tile cache: {e}")
+
+        tile = await fetch()
+        stored = NOT_FOUND if tile is None else tile
+
+        ttl = self.not_found_ttl if tile is None else self.ttl
+        if r is not None and self.ttl and ttl:
+            try:
+                await r.set(cache_key, stored, ttl)
+            except Exception as e:
+                logger.warning(f"Error writing vector tile cache: {e}")
+        return stored
+
+
+def _tile(stored: bytes) -> Optional[bytes]:
+    return None if stored == NOT_FOUND else stored
+
+
+@lru_cache
+def get_vector_tile_cache() -> VectorTileCache:
+    settings = get_settings()
+    return VectorTileCache(
+        local_max_bytes=settings.vector_tile_cache_local_mb * 1024 * 1024,
+        local_maxzoom=settings.vector_tile_cache_local_maxzoom,
+        ttl=settings.vector_tile_cache_ttl,
+        not_found_ttl=settings.vector_tile_cache_not_found_ttl,
+    )
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence
 
 import pytest
 from httpx import ASGITransport, AsyncClient
@@ -7,6 +7,70 @@ from pytest import Config, Item, Parser
 from pccommon.redis import connect_to_redis
 
 
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis client methods used by the
+    tile caches."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.ttls: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        self.data[key] = value
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        return [self.data.get(key) for key in keys]
+
+    async def ttl(self, key: str) -> int:
+        if key not in self.data:
+            return -2
+        return self.ttls.get(key, -1)
+
+    async def eval(
+        self, script: str, numkeys: int, key: str, member: str, expires: str, now: str
+    ) -> None:
+        # The tag script: a sorted set of keys scored by expiry
+        tagged: Dict[bytes, float] = self.data.setdefault(key, {})
+        tagged[member.encode()] = float(expires)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return key in self.data
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands: List[Any] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        def _queue(*args: Any, **kwargs: Any) -> "FakePipeline":
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self) -> List[Any]:
+        return [
+            await getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+
+
 def pytest_addoption(parser: Parser) -> None:
     parser.addoption(
         "--no-integration",
@@ -31,6 +95,11 @@ def pytest_collection_modifyitems(config: Config, items: List[Item]) -> None:
                 item.add_marker(skip_integration)
 
 
+@pytest.fixture
+def redis() -> FakeRedis:
+    return FakeRedis()
+
+
 @pytest.fixture
 async def client() -> AsyncClient:
     from titiler.pgstac.db import close_db_connection, connect_to_db
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import List
+
+import numpy
+import pytest
+import rasterio
+from pytest import MonkeyPatch
+from rasterio.transform import from_bounds
+
+from pctiler import reader
+from pctiler.dataset_cache import DatasetCache
+from pctiler.reader import COGReader
+
+
+def write_cog(path: Path) -> str:
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=64,
+        height=64,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4326",
+        transform=from_bounds(0, 0, 1, 1, 64, 64),
+        tiled=True,
+    ) as dst:
+        dst.write(numpy.ones((1, 64, 64), dtype="uint8"))
+    return str(path)
+
+
+@pytest.fixture
+def hrefs(tmp_path: Path) -> List[str]:
+    return [write_cog(tmp_path / f"{i}.tif") for i in range(3)]
+
+
+def test_reuses_idle_datasets(hrefs: List[str]) -> None:
+    cache = DatasetCache(max_size=10, ttl=60)
+
+    first = cache.checkout(hrefs[0])
+    # In use, so a concurrent reader opens another
+    second = cache.checkout(hrefs[0])
+    assert second.dataset is not first.dataset
+
+    cache.checkin(hrefs[0], first)
+    assert cache.checkout(hrefs[0]).dataset is first.dataset
+
+
+def test_closes_least_recently_used(hrefs: List[str]) -> None:
+    cache = DatasetCache(max_size=2, ttl=60)
+    entries = [cache.checkout(href) for href in hrefs]
+    for href, entry in zip(hrefs, entries):
+        cache.checkin(href, entry)
+
+    assert entries[0].dataset.closed
+    assert not entries[1].dataset.closed
+    assert cache.checkout(hrefs[2]).dataset is entries[2].dataset
+
+
+def test_closes_expired_datasets(hrefs: List[str]) -> None:
+    cache = DatasetCache(max_size=10, ttl=60)
+    entry = cache.checkout(hrefs[0])
+    expired = entry._replace(expires=0)
+
+    cache.checkin(hrefs[0], expired)
+    assert entry.dataset.closed
+    assert cache.checkout(hrefs[0]).dataset is not entry.dataset
+
+
+def test_cog_reader_reuses_dataset(hrefs: List[str], monkeypatch: MonkeyPatch) -> None:
+    cache = DatasetCache(max_size=10, ttl=60)
+    monkeypatch.setattr(reader, "get_dataset_cache", lambda: cache)
+
+    with COGReader(hrefs[0]) as src:
+        dataset = src.dataset
+        assert src.tile(0, 0, 0).count == 1
+    assert not dataset.closed
+
+    with COGReader(hrefs[0]) as src:
+        assert src.dataset is dataset
+
+
+def test_cog_reader_without_cache(hrefs: List[str], monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        reader, "get_dataset_cache", lambda: DatasetCache(max_size=0, ttl=60)
+    )
+
+    with COGReader(hrefs[0]) as src:
+        dataset = src.dataset
+    assert dataset.closed
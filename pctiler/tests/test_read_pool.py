@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Any, List
+
+import numpy
+from rio_tiler.models import ImageData
+from rio_tiler.mosaic import mosaic_reader
+
+from pctiler.read_pool import ReadPool
+
+
+class Reads:
+    def __init__(self, delay: float = 0.01) -> None:
+        self.delay = delay
+        self.read: List[str] = []
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, asset: str, *args: Any, **kwargs: Any) -> ImageData:
+        with self._lock:
+            self.read.append(asset)
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(self.delay)
+        with self._lock:
+            self.concurrent -= 1
+        return ImageData(numpy.ma.ones((1, 4, 4)))
+
+
+def wait_for_idle(pool: ReadPool) -> None:
+    for _ in range(100):
+        if pool.stats()["collections"] == {}:
+            return
+        time.sleep(0.01)
+
+
+def test_reads_in_order_within_window() -> None:
+    pool, read = ReadPool(max_workers=8), Reads()
+    assets = [f"item-{i}" for i in range(6)]
+    reads = pool.reads(read, assets, "naip", limit=2)
+
+    results = [reads(asset, 0, 0, 0) for asset in assets]
+    reads.cancel()
+
+    assert len(results) == 6
+    assert read.read == assets
+    assert read.max_concurrent <= 2
+
+
+def test_stops_reading_once_tile_is_filled() -> None:
+    pool, read = ReadPool(max_workers=2), Reads(delay=0.05)
+    assets = [f"item-{i}" for i in range(20)]
+    reads = pool.reads(read, assets, "naip", limit=None)
+    try:
+        # Every asset fills the tile, so the first one is enough
+        img, used = mosaic_reader(assets, reads, 0, 0, 0, threads=1)
+    finally:
+        reads.cancel()
+
+    assert used == ["item-0"]
+    wait_for_idle(pool)
+    # Only the assets read ahead were read
+    assert len(read.read) <= 2
+
+
+def test_collection_limit_across_tiles() -> None:
+    pool, read = ReadPool(max_workers=8), Reads()
+
+    def tile(i: int) -> None:
+        assets = [f"tile-{i}-item-{j}" for j in range(4)]
+        reads = pool.reads(read, assets, "naip", limit=3)
+        try:
+            for asset in assets:
+                reads(asset)
+        finally:
+            reads.cancel()
+
+    threads = [threading.Thread(target=tile, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(read.read) == 16
+    assert read.max_concurrent <= 3
+
+
+def test_stats() -> None:
+    pool = ReadPool(max_workers=1)
+    release = threading.Event()
+    pool.submit("naip", release.wait)
+    pool.submit("naip", release.wait)
+    time.sleep(0.05)
+
+    assert pool.stats() == {
+        "max_workers": 1,
+        "queued": 1,
+        "active": 1,
+        "collections": {"naip": 2},
+    }
+    release.set()
+    wait_for_idle(pool)
+    assert pool.stats() == {
+        "max_workers": 1,
+        "queued": 0,
+        "active": 0,
+        "collections": {},
+    }
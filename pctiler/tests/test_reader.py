@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy
+import pytest
+import rasterio
+from planetary_computer.sas import SASToken
+from pytest import MonkeyPatch
+from rasterio.enums import Resampling
+from rasterio.transform import from_bounds
+
+from pccommon.config.collections import DefaultRenderConfig, ReadTuning
+from pctiler import reader
+from pctiler.dataset_cache import DatasetCache
+from pctiler.reader import AssetUrlResolver, COGReader
+from pctiler.tokens import SASTokenCache
+
+HREF = "https://naipeuwest.blob.core.windows.net/naip/v002/al/image.tif"
+CDN_HREF = "https://naipeuwest.blob.core.windows.net/naip-cdn/v002/al/image.tif"
+
+
+class Lookups:
+    def __init__(self) -> None:
+        self.render_configs: List[str] = []
+        self.cdn_hosts: List[Tuple[str, str]] = []
+        self.tokens: List[Tuple[str, str]] = []
+
+    def get_render_config(self, collection: str) -> DefaultRenderConfig:
+        self.render_configs.append(collection)
+        return DefaultRenderConfig(
+            render_params={}, minzoom=0, requires_token=collection != "public"
+        )
+
+    def cdn_host_lookup(self) -> Callable[[str, str], Optional[str]]:
+        def get_cdn_host(storage_account: str, container: str) -> Optional[str]:
+            self.cdn_hosts.append((storage_account, container))
+            if container == "naip-cdn":
+                return f"{storage_account}.azureedge.net"
+            return None
+
+        return get_cdn_host
+
+    def fetch_token(self, storage_account: str, container: str) -> SASToken:
+        self.tokens.append((storage_account, container))
+        return SASToken(
+            token="sig=1", expiry=datetime.now(timezone.utc) + timedelta(hours=1)
+        )
+
+
+@pytest.fixture
+def lookups(monkeypatch: MonkeyPatch) -> Lookups:
+    lookups = Lookups()
+    monkeypatch.setattr(reader, "get_render_config", lookups.get_render_config)
+    monkeypatch.setattr(reader.BlobCDN, "cdn_host_lookup", lookups.cdn_host_lookup)
+    token_cache = SASTokenCache(renew_before_seconds=0, fetch=lookups.fetch_token)
+    monkeypatch.setattr(reader, "get_token_cache", lambda: token_cache)
+    return lookups
+
+
+def test_resolves_once_per_container(lookups: Lookups) -> None:
+    resolve = AssetUrlResolver("naip")
+    hrefs = [HREF, HREF.replace("image", "other"), CDN_HREF]
+
+    assert [resolve(href) for href in hrefs * 3] == [
+        f"{HREF}?sig=1",
+        f"{HREF.replace('image', 'other')}?sig=1",
+        CDN_HREF.replace("blob.core.windows.net", "azureedge.net"),
+    ] * 3
+    assert lookups.render_configs == ["naip"]
+    assert lookups.cdn_hosts == [("naipeuwest", "naip"), ("naipeuwest", "naip-cdn")]
+    assert lookups.tokens == [("naipeuwest", "naip")]
+
+
+def test_skips_other_hrefs(lookups: Lookups) -> None:
+    resolve = AssetUrlResolver("naip")
+    signed = f"{HREF}?already=signed"
+    public = "https://ai4edatasetspublicassets.blob.core.windows.net/assets/a.png"
+    other = "https://example.com/a.tif"
+
+    assert resolve(signed) == signed
+    assert resolve(public) == public
+    assert resolve(other) == other
+    assert lookups.tokens == []
+
+
+def test_requires_token_per_item_collection(lookups: Lookups) -> None:
+    resolve = AssetUrlResolver("naip")
+
+    assert resolve(HREF, "public") == HREF
+    assert resolve(HREF, "public") == HREF
+    assert resolve(HREF) == f"{HREF}?sig=1"
+    assert lookups.render_configs == ["naip", "public"]
+
+
+def test_no_collection(lookups: Lookups) -> None:
+    assert AssetUrlResolver(None)(HREF) == HREF
+    assert lookups.render_configs == []
+    assert lookups.tokens == []
+
+
+def test_read_tuning(lookups: Lookups, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        reader,
+        "get_render_config",
+        lambda _: DefaultRenderConfig(
+            render_params={},
+            minzoom=0,
+            read_tuning=ReadTuning(http_multiplex=False, overview_bias=2),
+        ),
+    )
+    resolve = AssetUrlResolver("naip")
+
+    assert resolve.gdal_env == {"GDAL_HTTP_MULTIPLEX": "NO"}
+    assert resolve.reader_options == {"overview_bias": 2}
+    assert AssetUrlResolver(None).gdal_env == {}
+
+
+def test_overview_bias(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        reader, "get_dataset_cache", lambda: DatasetCache(max_size=0, ttl=60)
+    )
+    path = str(tmp_path / "cog.tif")
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=1024,
+        height=1024,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4326",
+        transform=from_bounds(-180, -85, 180, 85, 1024, 1024),
+        tiled=True,
+    ) as dst:
+        dst.write(numpy.ones((1, 1024, 1024), dtype="uint8"))
+        dst.build_overviews([2, 4], Resampling.nearest)
+
+    with COGReader(path) as src:
+        full = src.tile(0, 0, 1)
+    with COGReader(path, overview_bias=2) as src:
+        biased = src.tile(0, 0, 1)
+        buffered = src.tile(0, 0, 1, buffer=1)
+
+    assert full.width == biased.width == 256
+    assert full.height == biased.height == 256
+    assert buffered.width == 258
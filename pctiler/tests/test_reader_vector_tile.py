@@ -0,0 +1,100 @@
+import gzip
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from pccommon.config.collections import VectorTileset
+from pctiler.endpoints.vector_tiles import _stream_upstream
+from pctiler.reader_vector_tile import VectorTileReader, settings
+
+PBF = gzip.compress(b"pbf")
+
+
+def make_reader(handler: Any) -> VectorTileReader:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    app = SimpleNamespace(
+        state=SimpleNamespace(vector_tile_client=client, service_name="tiler")
+    )
+    request = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "query_string": b"",
+            "headers": [],
+            "app": app,
+        }
+    )
+    return VectorTileReader("parcels", VectorTileset(id="parcels"), request)
+
+
+@pytest.fixture(autouse=True)
+def vector_tile_url(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "vector_tile_sa_base_url", "https://example.com")
+
+
+@pytest.mark.asyncio
+async def test_get_tile_returns_stored_bytes() -> None:
+    reader = make_reader(
+        lambda request: httpx.Response(
+            200, stream=httpx.ByteStream(PBF), headers={"content-encoding": "gzip"}
+        )
+    )
+    assert await reader.get_tile(1, 2, 3) == PBF
+
+
+@pytest.mark.asyncio
+async def test_get_tile_not_found() -> None:
+    reader = make_reader(lambda request: httpx.Response(404))
+    assert await reader.get_tile(1, 2, 3) is None
+
+
+@pytest.mark.asyncio
+async def test_get_tile_retries_server_errors() -> None:
+    statuses: List[int] = [503, 200]
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(statuses.pop(0), stream=httpx.ByteStream(PBF))
+
+    reader = make_reader(_handler)
+    assert await reader.get_tile(1, 2, 3) == PBF
+    assert statuses == []
+
+
+@pytest.mark.asyncio
+async def test_get_tile_retries_connect_errors_once_each() -> None:
+    attempts: List[httpx.Request] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        raise httpx.ConnectError("refused", request=request)
+
+    reader = make_reader(_handler)
+    with pytest.raises(httpx.ConnectError):
+        await reader.get_tile(1, 2, 3)
+    assert len(attempts) == settings.vector_tile_retries + 1
+
+
+@pytest.mark.asyncio
+async def test_stream_closes_upstream_on_error() -> None:
+    closed: List[bool] = []
+
+    class FailingStream(httpx.AsyncByteStream):
+        async def __aiter__(self) -> AsyncIterator[bytes]:
+            yield PBF[:2]
+            raise httpx.ReadError("reset")
+
+        async def aclose(self) -> None:
+            closed.append(True)
+
+    reader = make_reader(lambda request: httpx.Response(200, stream=FailingStream()))
+    response = await reader.open_tile(1, 2, 3)
+    assert response is not None
+
+    with pytest.raises(httpx.ReadError):
+        async for _ in _stream_upstream(response):
+            pass
+    assert closed == [True]
@@ -0,0 +1,102 @@
+from typing import Any, Dict, List
+
+import morecantile
+import pytest
+from rio_tiler.mosaic.methods import defaults
+
+from pctiler.tile_assets_cache import (
+    TileAssets,
+    TileAssetsCache,
+    ancestor_tiles,
+    ancestors_render_alike,
+    assets_within,
+    search_complete,
+    tile_assets_cache_key,
+)
+
+from .conftest import FakeRedis
+
+TMS = morecantile.tms.get("WebMercatorQuad")
+
+
+def item(id: str, bbox: List[float]) -> Dict[str, Any]:
+    return {"id": id, "bbox": bbox, "assets": {}}
+
+
+def test_ancestor_tiles() -> None:
+    assert ancestor_tiles(TMS, morecantile.Tile(10, 12, 5), 3) == [
+        morecantile.Tile(5, 6, 4),
+        morecantile.Tile(2, 3, 3),
+        morecantile.Tile(1, 1, 2),
+    ]
+    assert ancestor_tiles(TMS, morecantile.Tile(1, 0, 1), 3) == [
+        morecantile.Tile(0, 0, 0)
+    ]
+
+
+def test_cache_key_includes_search_params() -> None:
+    tile = morecantile.Tile(1, 2, 3)
+    key = tile_assets_cache_key("abc", "naip", TMS.id, tile, items_limit=10)
+    assert key != tile_assets_cache_key("abc", "naip", TMS.id, tile, items_limit=5)
+    assert key == tile_assets_cache_key("abc", "naip", TMS.id, tile, items_limit=10)
+
+
+def test_assets_within() -> None:
+    west = item("west", [-10, 0, -5, 5])
+    east = item("east", [5, 0, 10, 5])
+    antimeridian = item("antimeridian", [170, 0, -170, 5])
+    ancestor = TileAssets([west, east, antimeridian], complete=True)
+
+    assert assets_within(ancestor, [-8, 1, -6, 2]) == [west, antimeridian]
+    assert assets_within(ancestor, [-8, 10, -6, 12]) == []
+    # The ancestor's search may have stopped at one of its limits
+    assert assets_within(ancestor._replace(complete=False), [-8, 1, -6, 2]) is None
+
+
+def test_search_complete() -> None:
+    assets = [item("a", [0, 0, 1, 1]), item("b", [0, 0, 1, 1])]
+    limits: Dict[str, Any] = dict(
+        scan_limit=10, items_limit=10, time_limit=5, skipcovered=False
+    )
+
+    assert search_complete(assets, 1, **limits)
+    assert not search_complete(assets, 1, **{**limits, "items_limit": 2})
+    assert not search_complete(assets, 1, **{**limits, "scan_limit": 2})
+    assert not search_complete(assets, 5, **limits)
+    # Skipped items count towards the scan limit without being returned
+    assert not search_complete(assets, 1, **{**limits, "skipcovered": True})
+    assert not search_complete(assets, 1, **{**limits, "skipcovered": None})
+
+
+def test_ancestors_render_alike() -> None:
+    assert ancestors_render_alike()
+    assert ancestors_render_alike(defaults.FirstMethod())
+    # Assets past the point the tile is covered change the mean
+    assert not ancestors_render_alike(defaults.MeanMethod())
+    assert not ancestors_render_alike(defaults.MeanMethod(), exitwhenfull=True)
+    assert ancestors_render_alike(defaults.MeanMethod(), exitwhenfull=False)
+
+
+def test_local_cache() -> None:
+    cache = TileAssetsCache(local_size=10, ttl=60, parent_levels=3)
+    entry = TileAssets([item("a", [0, 0, 1, 1])], complete=True)
+    cache.set_local("k", entry)
+    assert cache.get_local(["k", "other"]) == [entry, None]
+
+    disabled = TileAssetsCache(local_size=0, ttl=60, parent_levels=3)
+    disabled.set_local("k", entry)
+    assert disabled.get_local(["k"]) == [None]
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_tagged(redis: FakeRedis) -> None:
+    cache = TileAssetsCache(local_size=10, ttl=60, parent_levels=3)
+    entry = TileAssets([item("a", [0, 0, 1, 1])], complete=False)
+
+    await cache.set_redis(redis, "k", entry, ["items:naip"])  # type: ignore
+    assert await cache.get_redis(redis, ["k", "other"]) == [  # type: ignore
+        entry,
+        None,
+    ]
+    assert set(redis.data["ztag::items:naip"]) == {b"k"}
+    assert await cache.get_redis(None, ["k"]) == [None]
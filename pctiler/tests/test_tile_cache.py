@@ -0,0 +1,71 @@
+from typing import Optional
+
+import pytest
+
+from pctiler.tile_cache import (
+    RasterTileCache,
+    decode_tile,
+    encode_tile,
+    raster_tile_cache_key,
+)
+
+from .conftest import FakeRedis
+
+PNG = b"\x89PNG\r\n\x1a\n\x00tile"
+HEADERS = [("content-type", "image/png"), ("cache-control", "max-age=3600")]
+
+
+def test_cache_key_ignores_query_order() -> None:
+    path = "/data/mosaic/abc/tiles/WebMercatorQuad/3/1/2@1x"
+    assert raster_tile_cache_key(
+        path, "collection=naip&assets=image&rescale=0,255"
+    ) == raster_tile_cache_key(
+        path, "rescale=0,255&assets=image&collection=naip&subscription-key=secret"
+    )
+    # Asset order changes the rendered tile
+    assert raster_tile_cache_key(
+        path, "assets=B04&assets=B03"
+    ) != raster_tile_cache_key(path, "assets=B03&assets=B04")
+    assert raster_tile_cache_key(path, "assets=image") != raster_tile_cache_key(
+        path.replace("3/1/2", "3/1/3"), "assets=image"
+    )
+
+
+def test_encode_decode() -> None:
+    assert decode_tile(encode_tile(HEADERS, PNG)) == (HEADERS, PNG)
+
+
+@pytest.mark.asyncio
+async def test_tiles_cached_in_both_tiers(redis: FakeRedis) -> None:
+    cache = RasterTileCache(1024)
+    stored = encode_tile(HEADERS, PNG)
+
+    assert await cache.get("k", redis) is None  # type: ignore
+    await cache.set("k", stored, 60, redis)  # type: ignore
+    assert redis.data == {"k": stored}
+    assert redis.ttls == {"k": 60}
+
+    redis.data.clear()
+    assert await cache.get("k", redis) == stored  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_redis_hits_fill_local_tier(redis: FakeRedis) -> None:
+    cache = RasterTileCache(1024)
+    stored = encode_tile(HEADERS, PNG)
+    await RasterTileCache(0).set("k", stored, 60, redis)  # type: ignore
+
+    assert await cache.get("k", redis) == stored  # type: ignore
+    redis.data.clear()
+    assert await cache.get("k", redis) == stored  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_without_redis() -> None:
+    cache = RasterTileCache(1024)
+    stored = encode_tile(HEADERS, PNG)
+    await cache.set("k", stored, 60, None)
+
+    result: Optional[bytes] = await cache.get("k", None)
+    assert result == stored
+    assert await RasterTileCache(0).get("k", None) is None
@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from planetary_computer.sas import SASToken
+
+from pctiler.tokens import SASTokenCache
+
+HREF = "https://naipeuwest.blob.core.windows.net/naip/v002/al/image.tif"
+
+
+class FakeTokenService:
+    def __init__(self, ttl: timedelta = timedelta(hours=1)) -> None:
+        self.ttl = ttl
+        self.calls: List[str] = []
+
+    def fetch(self, storage_account: str, container: str) -> SASToken:
+        self.calls.append(f"{storage_account}/{container}")
+        # Give concurrent callers time to pile up
+        time.sleep(0.05)
+        return SASToken(
+            token=f"sig={len(self.calls)}",
+            expiry=datetime.now(timezone.utc) + self.ttl,
+        )
+
+
+def test_sign_reuses_token() -> None:
+    service = FakeTokenService()
+    cache = SASTokenCache(renew_before_seconds=600, fetch=service.fetch)
+
+    assert cache.sign(HREF) == f"{HREF}?sig=1"
+    assert cache.sign(HREF) == f"{HREF}?sig=1"
+    assert service.calls == ["naipeuwest/naip"]
+
+
+def test_sign_skips_other_hrefs() -> None:
+    service = FakeTokenService()
+    cache = SASTokenCache(renew_before_seconds=600, fetch=service.fetch)
+
+    for href in [
+        "https://example.com/image.tif",
+        "https://naipeuwest.azureedge.net/naip/image.tif",
+        f"{HREF}?st=2020-01-01",
+        "https://ai4edatasetspublicassets.blob.core.windows.net/assets/a.png",
+    ]:
+        assert cache.sign(href) == href
+    assert service.calls == []
+
+
+def test_concurrent_requests_share_fetch() -> None:
+    service = FakeTokenService()
+    cache = SASTokenCache(renew_before_seconds=600, fetch=service.fetch)
+
+    signed: List[str] = []
+    threads = [
+        threading.Thread(target=lambda: signed.append(cache.sign(HREF)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(service.calls) == 1
+    assert set(signed) == {f"{HREF}?sig=1"}
+
+
+def test_renew_expiring() -> None:
+    service = FakeTokenService(ttl=timedelta(minutes=5))
+    cache = SASTokenCache(renew_before_seconds=600, fetch=service.fetch)
+    cache.sign(HREF)
+
+    cache.renew_expiring()
+    assert len(service.calls) == 2
+    assert cache.sign(HREF) == f"{HREF}?sig=2"
+
+    service.ttl = timedelta(hours=1)
+    cache.renew_expiring()
+    cache.renew_expiring()
+    assert len(service.calls) == 3
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Any, List, Optional
+
+import pytest
+
+from pctiler.vector_tile_cache import NOT_FOUND, VectorTileCache
+
+from .conftest import FakeRedis
+
+PBF = b"\x1f\x8b tile"
+
+
+class Upstream:
+    def __init__(self, tile: Optional[bytes]) -> None:
+        self.tile = tile
+        self.calls = 0
+
+    async def fetch(self) -> Optional[bytes]:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.tile
+
+
+def make_cache(**kwargs: Any) -> VectorTileCache:
+    options = dict(local_max_bytes=1024, local_maxzoom=8, ttl=60, not_found_ttl=10)
+    return VectorTileCache(**{**options, **kwargs})  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_tiles_cached_as_stored(redis: FakeRedis) -> None:
+    cache, upstream = make_cache(), Upstream(PBF)
+
+    assert await cache.get_tile("k", 10, upstream.fetch, redis) == PBF  # type: ignore
+    assert await cache.get_tile("k", 10, upstream.fetch, redis) == PBF  # type: ignore
+    assert upstream.calls == 1
+    assert redis.data == {"k": PBF}
+    assert redis.ttls == {"k": 60}
+
+
+@pytest.mark.asyncio
+async def test_low_zoom_tiles_cached_locally(redis: FakeRedis) -> None:
+    cache, upstream = make_cache(), Upstream(PBF)
+
+    await cache.get_tile("k", 2, upstream.fetch, redis)  # type: ignore
+    redis.data.clear()
+    assert await cache.get_tile("k", 2, upstream.fetch, redis) == PBF  # type: ignore
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_tiles_cached(redis: FakeRedis) -> None:
+    cache, upstream = make_cache(), Upstream(None)
+
+    assert await cache.get_tile("k", 10, upstream.fetch, redis) is None  # type: ignore
+    assert await cache.get_tile("k", 10, upstream.fetch, redis) is None  # type: ignore
+    assert upstream.calls == 1
+    assert redis.data == {"k": NOT_FOUND}
+    assert redis.ttls == {"k": 10}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_fetch(redis: FakeRedis) -> None:
+    cache, upstream = make_cache(), Upstream(PBF)
+
+    results: List[Optional[bytes]] = await asyncio.gather(
+        *[cache.get_tile("k", 10, upstream.fetch, redis) for _ in range(5)]  # type: ignore
+    )
+    assert results == [PBF] * 5
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_tiles_not_cached_locally(redis: FakeRedis) -> None:
+    cache, upstream = make_cache(), Upstream(None)
+
+    assert await cache.get_tile("k", 2, upstream.fetch, redis) is None  # type: ignore
+    redis.data.clear()
+    upstream.tile = PBF
+    assert await cache.get_tile("k", 2, upstream.fetch, redis) == PBF  # type: ignore
+    assert upstream.calls == 2
@@ -0,0 +1,149 @@
+-- Notify the STAC API of item and collection changes, so that cached responses
+-- can be invalidated. Installed in the development database by scripts/migrate
+-- after the pgstac migrations, see docs/01-deployment.md for deployed databases,
+-- and enabled in the API by setting PCAPIS_CACHE_INVALIDATION_CHANNEL to the
+-- channel changes are notified on.
+--
+-- The channel is read from the cache_invalidation_channel pgstac setting, and
+-- is "pgstac_cache" if it isn't set. To use another channel:
+--
+--   INSERT INTO pgstac.pgstac_settings (name, value)
+--   VALUES ('cache_invalidation_channel', '<channel>')
+--   ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;
+--
+-- Triggers run once per statement, and send one notification per changed
+-- collection. Item notifications list the ids of the changed items, split over
+-- several notifications when they don't fit in one payload. Each notification
+-- carries the id of the transaction that sent it, so that API workers can tell
+-- notifications apart.
+
+CREATE OR REPLACE FUNCTION pgstac.cache_invalidation_channel() RETURNS text AS $$
+    SELECT coalesce(pgstac.get_setting('cache_invalidation_channel'), 'pgstac_cache');
+$$ LANGUAGE SQL STABLE;
+
+CREATE OR REPLACE FUNCTION pgstac.notify_cache_items(
+    channel text, _collection text, ids text[]
+) RETURNS void AS $$
+DECLARE
+    -- Notification payloads must be shorter than 8000 bytes
+    max_size CONSTANT int := 7000;
+    chunk text[] := '{}';
+    size int := 0;
+    _id text;
+BEGIN
+    FOREACH _id IN ARRAY ids LOOP
+        IF size > 0 AND size + octet_length(_id) > max_size THEN
+            PERFORM pg_notify(
+                channel,
+                json_build_object(
+                    'txid', txid_current(), 'collection', _collection, 'items', chunk
+                )::text
+            );
+            chunk := '{}';
+            size := 0;
+        END IF;
+        chunk := chunk || _id;
+        size := size + octet_length(_id) + 3;
+    END LOOP;
+    IF size > 0 THEN
+        PERFORM pg_notify(
+            channel,
+            json_build_object(
+                'txid', txid_current(), 'collection', _collection, 'items', chunk
+            )::text
+        );
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pgstac.notify_cache_items_change() RETURNS trigger AS $$
+DECLARE
+    channel text := pgstac.cache_invalidation_channel();
+BEGIN
+    -- Transition tables only exist for the trigger's own event
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pgstac.notify_cache_items(channel, collection, array_agg(DISTINCT id))
+        FROM new_items GROUP BY collection;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pgstac.notify_cache_items(channel, collection, array_agg(DISTINCT id))
+        FROM old_items GROUP BY collection;
+    ELSE
+        PERFORM pgstac.notify_cache_items(channel, collection, array_agg(DISTINCT id))
+        FROM (
+            SELECT collection, id FROM old_items
+            UNION
+            SELECT collection, id FROM new_items
+        ) changed
+        GROUP BY collection;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pgstac.notify_cache_collections_change() RETURNS trigger AS $$
+DECLARE
+    channel text := pgstac.cache_invalidation_channel();
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify(
+            channel, json_build_object('txid', txid_current(), 'collection', id)::text
+        )
+        FROM (SELECT DISTINCT id FROM new_collections) changed;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify(
+            channel, json_build_object('txid', txid_current(), 'collection', id)::text
+        )
+        FROM (SELECT DISTINCT id FROM old_collections) changed;
+    ELSE
+        PERFORM pg_notify(
+            channel, json_build_object('txid', txid_current(), 'collection', id)::text
+        )
+        FROM (
+            SELECT id FROM old_collections UNION SELECT id FROM new_collections
+        ) changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row level triggers installed by earlier versions of this script
+DROP TRIGGER IF EXISTS notify_cache_item_change ON pgstac.items;
+DROP TRIGGER IF EXISTS notify_cache_collection_change ON pgstac.collections;
+DROP FUNCTION IF EXISTS pgstac.notify_cache_item_change();
+DROP FUNCTION IF EXISTS pgstac.notify_cache_collection_change();
+
+DROP TRIGGER IF EXISTS notify_cache_items_insert ON pgstac.items;
+CREATE TRIGGER notify_cache_items_insert
+    AFTER INSERT ON pgstac.items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_items_change();
+
+DROP TRIGGER IF EXISTS notify_cache_items_update ON pgstac.items;
+CREATE TRIGGER notify_cache_items_update
+    AFTER UPDATE ON pgstac.items
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_items_change();
+
+DROP TRIGGER IF EXISTS notify_cache_items_delete ON pgstac.items;
+CREATE TRIGGER notify_cache_items_delete
+    AFTER DELETE ON pgstac.items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_items_change();
+
+DROP TRIGGER IF EXISTS notify_cache_collections_insert ON pgstac.collections;
+CREATE TRIGGER notify_cache_collections_insert
+    AFTER INSERT ON pgstac.collections
+    REFERENCING NEW TABLE AS new_collections
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_collections_change();
+
+DROP TRIGGER IF EXISTS notify_cache_collections_update ON pgstac.collections;
+CREATE TRIGGER notify_cache_collections_update
+    AFTER UPDATE ON pgstac.collections
+    REFERENCING OLD TABLE AS old_collections NEW TABLE AS new_collections
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_collections_change();
+
+DROP TRIGGER IF EXISTS notify_cache_collections_delete ON pgstac.collections;
+CREATE TRIGGER notify_cache_collections_delete
+    AFTER DELETE ON pgstac.collections
+    REFERENCING OLD TABLE AS old_collections
+    FOR EACH STATEMENT EXECUTE FUNCTION pgstac.notify_cache_collections_change();